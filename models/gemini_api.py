@@ -4,8 +4,8 @@
 # This source code is licensed under the license found in the
 # LICENSE file in the root directory of this source tree.
 
+import asyncio
 import io
-import json
 import os
 import pathlib
 import re
@@ -17,6 +17,11 @@ from accelerate import Accelerator, DistributedType
 from lmms_eval.api.instance import Instance
 from lmms_eval.api.model import lmms
 from lmms_eval.api.registry import register_model
+from lmms_eval.models.gemini_batch import BATCH_WINDOW, SUCCEEDED, TERMINAL_STATES, build_request, parse_results, write_batch_file
+from lmms_eval.models.gemini_engine import RequestEngine
+from lmms_eval.models.gemini_store import ResponseStore
+from lmms_eval.models.gemini_uploads import UploadCache, wait_until_active
+from lmms_eval.models.gemini_video import VideoDownscaler
 from loguru import logger as eval_logger
 from PIL import Image
 from tqdm import tqdm
@@ -25,7 +30,6 @@ try:
     from google import genai as genai_api
     from google.genai.types import SafetySetting, HarmBlockThreshold, HarmCategory
 
-    NUM_SECONDS_TO_SLEEP = 30
     GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
     genai = genai_api.Client(api_key=GOOGLE_API_KEY)
 
@@ -41,6 +45,10 @@ except Exception as e:
     )
 
 
+def get_uuid(task, split, doc_id):
+    return f"{task}___{split}___{doc_id}"
+
+
 @register_model("gemini_api")
 class GeminiAPI(lmms):
     def __init__(
@@ -51,6 +59,28 @@ class GeminiAPI(lmms):
         continual_mode: bool = True,
         response_persistent_folder: str = "./logs/gemini_persistent_folder",
         interleave: bool = False,
+        # Skip the second video of an mvp pair once the first is answered wrong
+        pair_early_exit: bool = False,
+        # Stop each mvp task once its pair_accuracy interval is narrow enough
+        adaptive_stop: bool = False,
+        # Requests in flight at once and overall rate limit (0: none), split across processes
+        num_concurrent: int = 8,
+        requests_per_minute: float = 0,
+        max_retries: int = 5,
+        # Reuse uploads of identical videos until they expire, uploading the
+        # videos of the next `preupload` requests ahead of time
+        upload_cache: bool = True,
+        preupload: int = 4,
+        # Re-encode videos above these limits before upload (None: no limit),
+        # e.g. max_pixels=151200,max_frames=16 as for the open models
+        max_pixels: int = None,
+        max_fps: float = None,
+        max_frames: int = None,
+        # Submit all requests as one Batch API job and poll it for the results
+        batch_mode: bool = False,
+        batch_poll_interval: float = 30,
+        # Alternative API endpoint, e.g. a local stand-in for testing
+        base_url: str = None,
         # We will cache the Gemini API response in this path and use it for future requests
         **kwargs,
     ) -> None:
@@ -58,32 +88,30 @@ class GeminiAPI(lmms):
         self.model_version = model_version
         self.timeout = timeout
         self.model = genai
+        if base_url is not None:
+            self.model = genai_api.Client(
+                api_key=os.getenv("GOOGLE_API_KEY"),
+                http_options=genai_api.types.HttpOptions(base_url=base_url),
+            )
         self.continual_mode = continual_mode
-        self.response_persistent_file = ""
+        self.response_persistent_folder = response_persistent_folder
+        self.batch_mode = batch_mode
+        self.batch_poll_interval = batch_poll_interval
+        if batch_mode and (pair_early_exit or adaptive_stop):
+            raise ValueError("pair_early_exit and adaptive_stop need answers as they come, they cannot be used with batch_mode")
         self.interleave = interleave
-        # if self.continual_mode and response_persistent_folder is None:
-        #     raise ValueError("Continual mode requires a persistent path for the response. We will cache the Gemini API response in this path and use it for future requests. Please provide a valid path.")
-        if self.continual_mode:
-            self.response_persistent_folder = response_persistent_folder
-            if not os.path.exists(self.response_persistent_folder):
-                os.makedirs(self.response_persistent_folder)
-            self.response_persistent_file = os.path.join(
-                self.response_persistent_folder, f"{self.model_version}_response.json"
-            )
+        self.pair_early_exit = None
+        if pair_early_exit:
+            from lmms_eval.tasks.mvp.early_exit import PairEarlyExit
 
-        if os.path.exists(self.response_persistent_file):
-            with open(self.response_persistent_file, "r") as f:
-                self.response_cache = json.load(f)
-            self.cache_mode = "resume"
-        else:
-            self.response_cache = {}
-            self.cache_mode = "start"
+            self.pair_early_exit = PairEarlyExit()
+        self.adaptive_stop = None
+        if adaptive_stop:
+            from lmms_eval.tasks.mvp.adaptive import get_adaptive_stop
 
+            self.adaptive_stop = get_adaptive_stop()
         accelerator = Accelerator()
         if accelerator.num_processes > 1:
-            assert (
-                self.continual_mode is False
-            ), "Continual mode is not supported with distributed inference."
             assert accelerator.distributed_type in [
                 DistributedType.FSDP,
                 DistributedType.MULTI_GPU,
@@ -103,14 +131,35 @@ class GeminiAPI(lmms):
 
         self.device = self.accelerator.device
 
-        # self.modality = modality
+        # Append-only per-process response files with a merged read view, so
+        # continual mode also works with several processes
+        self.response_store = None
+        self.cache_mode = "start"
+        if self.continual_mode:
+            self.response_store = ResponseStore(
+                response_persistent_folder, self.model_version, rank=self.accelerator.process_index
+            )
+            if len(self.response_store) > 0:
+                self.cache_mode = "resume"
 
-        self.video_pool = []
+        self.engine = RequestEngine(
+            concurrency=num_concurrent,
+            requests_per_second=requests_per_minute / 60 / self._world_size,
+            max_retries=max_retries,
+        )
+        self.upload_cache = None
+        self.preupload = preupload
+        if upload_cache:
+            os.makedirs(response_persistent_folder, exist_ok=True)
+            self.upload_cache = UploadCache(os.path.join(response_persistent_folder, "gemini_uploads.jsonl"))
+        self.downscaler = VideoDownscaler(
+            os.path.join(response_persistent_folder, "downscaled"),
+            max_pixels=max_pixels,
+            max_fps=max_fps,
+            max_frames=max_frames,
+        )
 
-    def free_video(self):
-        for video in self.video_pool:
-            video.delete()
-        self.video_pool = []
+        # self.modality = modality
 
     def flatten(self, input):
         new_list = []
@@ -131,29 +180,11 @@ class GeminiAPI(lmms):
 
         return img_size
 
-    def encode_video(self, video_path):
-        uploaded_obj = self.model.files.upload(file=video_path)
-        time.sleep(5)
-        self.video_pool.append(uploaded_obj)
-        return uploaded_obj
-
     def encode_audio(self, audio):
         audio_io = io.BytesIO()
         sf.write(audio_io, audio["array"], audio["sampling_rate"], format="WAV")
         return self.model.files.upload(file=audio_io, mime_type="audio/wav")
 
-    def convert_modality(self, images):
-        for idx, img in enumerate(images):
-            if isinstance(img, dict) and "sampling_rate" in img:  # audio
-                audio = self.encode_audio(img)
-                images[idx] = audio
-            elif isinstance(img, str):  # video
-                try:
-                    images[idx] = self.encode_video(img)
-                except Exception as e:
-                    eval_logger.error(f"Error converting video: {str(e)}")
-        return images
-
     def construct_interleaved_input(self, content, media):
         pattern = r"<media_(\d+)>"
         parts = re.split(pattern, content)
@@ -168,95 +199,300 @@ class GeminiAPI(lmms):
 
         return result
 
-    def generate_until(self, requests) -> List[str]:
-        res = []
-        pbar = tqdm(
-            total=len(requests), disable=(self.rank != 0), desc="Model Responding"
+    def generation_config(self, gen_kwargs):
+        if "max_new_tokens" not in gen_kwargs:
+            gen_kwargs["max_new_tokens"] = 1024
+        if "temperature" not in gen_kwargs:
+            gen_kwargs["temperature"] = 0
+
+        return genai_api.types.GenerateContentConfig(
+            max_output_tokens=gen_kwargs["max_new_tokens"],
+            temperature=gen_kwargs["temperature"],
+            safety_settings=[
+                SafetySetting(category=HarmCategory.HARM_CATEGORY_DANGEROUS_CONTENT,threshold=HarmBlockThreshold.BLOCK_NONE),
+                SafetySetting(category=HarmCategory.HARM_CATEGORY_HATE_SPEECH, threshold=HarmBlockThreshold.BLOCK_NONE),
+                SafetySetting(category=HarmCategory.HARM_CATEGORY_HARASSMENT, threshold=HarmBlockThreshold.BLOCK_NONE),
+                SafetySetting(category=HarmCategory.HARM_CATEGORY_SEXUALLY_EXPLICIT, threshold=HarmBlockThreshold.BLOCK_NONE),
+            ],
         )
 
-        def get_uuid(task, split, doc_id):
-            return f"{task}___{split}___{doc_id}"
+    async def fetch_file(self, name):
+        return await self.engine.call(lambda: self.model.aio.files.get(name=name), "files.get")
 
-        for contexts, gen_kwargs, doc_to_visual, doc_id, task, split in [
-            reg.args for reg in requests
-        ]:
-            if self.continual_mode and self.cache_mode == "resume":
-                doc_uuid = get_uuid(task, split, doc_id)
-                if doc_uuid in self.response_cache:
-                    content = self.response_cache[doc_uuid]
-                    if content:
-                        res.append(content)
-                        pbar.update(1)
-                        continue
-
-            if "max_new_tokens" not in gen_kwargs:
-                gen_kwargs["max_new_tokens"] = 1024
-            if "temperature" not in gen_kwargs:
-                gen_kwargs["temperature"] = 0
-
-            config = genai_api.types.GenerateContentConfig(
-                max_output_tokens=gen_kwargs["max_new_tokens"],
-                temperature=gen_kwargs["temperature"],
-                safety_settings=[
-                    SafetySetting(category=HarmCategory.HARM_CATEGORY_DANGEROUS_CONTENT,threshold=HarmBlockThreshold.BLOCK_NONE),
-                    SafetySetting(category=HarmCategory.HARM_CATEGORY_HATE_SPEECH, threshold=HarmBlockThreshold.BLOCK_NONE),
-                    SafetySetting(category=HarmCategory.HARM_CATEGORY_HARASSMENT, threshold=HarmBlockThreshold.BLOCK_NONE),
-                    SafetySetting(category=HarmCategory.HARM_CATEGORY_SEXUALLY_EXPLICIT, threshold=HarmBlockThreshold.BLOCK_NONE),
-                ],
-            )
+    async def encode_video_async(self, video_path):
+        uploaded_obj = await self.engine.call(
+            lambda: self.model.aio.files.upload(file=video_path), "upload"
+        )
+        # Ready once the service has processed the video
+        return await wait_until_active(uploaded_obj, self.fetch_file)
+
+    async def local_video(self, video_path):
+        """Path of the file to upload for `video_path`, downscaled if limits are set."""
+        if not self.downscaler.enabled:
+            return video_path
+        return await asyncio.to_thread(self.downscaler, video_path)
+
+    async def cached_video(self, video_path, min_lifetime=0):
+        video_path = await self.local_video(video_path)
+        entry = await self.upload_cache.get(video_path, self.encode_video_async, self.fetch_file, min_lifetime)
+        return genai_api.types.Part.from_uri(file_uri=entry["uri"], mime_type=entry["mime_type"])
+
+    async def convert_modality_async(self, visuals, uploaded, min_lifetime=0):
+        for idx, visual in enumerate(visuals):
+            if isinstance(visual, dict) and "sampling_rate" in visual:  # audio
+                visuals[idx] = await asyncio.to_thread(self.encode_audio, visual)
+            elif isinstance(visual, str):  # video
+                try:
+                    if self.upload_cache is not None:
+                        visuals[idx] = await self.cached_video(visual, min_lifetime)
+                    else:
+                        visuals[idx] = await self.encode_video_async(await self.local_video(visual))
+                        uploaded.append(visuals[idx])
+                except Exception as e:
+                    eval_logger.error(f"Error converting video: {str(e)}")
+        return visuals
 
-            visuals = [doc_to_visual(self.task_dict[task][split][doc_id])]
-            visuals = self.flatten(visuals)
-            visuals = self.convert_modality(visuals)
+    async def preupload_visuals(self, doc_to_visual, doc):
+        """Resolve and upload the visuals of an upcoming request ahead of time."""
+        visuals = await asyncio.to_thread(doc_to_visual, doc)
+        for visual in self.flatten([visuals]):
+            if isinstance(visual, str):
+                try:
+                    await self.cached_video(visual)
+                except Exception as e:
+                    eval_logger.debug(f"Pre-upload of {visual} failed: {str(e)}")
+        return visuals
+
+    async def delete_uploads(self, uploaded):
+        for uploaded_obj in uploaded:
+            try:
+                await self.model.aio.files.delete(name=uploaded_obj.name)
+            except Exception as e:
+                eval_logger.debug(f"Could not delete {uploaded_obj.name}: {str(e)}")
+
+    async def generate_one(self, contexts, gen_kwargs, doc_to_visual, doc, visuals_task=None):
+        config = self.generation_config(gen_kwargs)
+        uploaded = []
+        try:
+            if visuals_task is not None:
+                visuals = await visuals_task
+            else:
+                visuals = await asyncio.to_thread(doc_to_visual, doc)
+            visuals = await self.convert_modality_async(self.flatten([visuals]), uploaded)
 
             if self.interleave:
                 message = self.construct_interleaved_input(contexts, visuals)
             else:
                 message = [contexts] + visuals
 
-            for attempt in range(5):
-                try:
-                    content = self.model.models.generate_content(
-                        model=self.model_version,
-                        contents=message,
-                        config=config,
-                    )
-                    content = content.text
-                    break
-                except Exception as e:
-                    eval_logger.info(
-                        f"Attempt {attempt + 1} failed with error: {str(e)}"
-                    )
-                    if isinstance(e, ValueError):
-                        try:
-                            eval_logger.info(
-                                f"Prompt feed_back: {content.prompt_feedback}"
-                            )
-                            content = ""
-                            break
-                        except Exception:
-                            pass
-                    if (
-                        attempt < 5 - 1
-                    ):  # If we have retries left, sleep and then continue to next attempt
-                        time.sleep(NUM_SECONDS_TO_SLEEP)
-                    else:  # If this was the last attempt, log and return empty
-                        eval_logger.error(
-                            f"All 5 attempts failed. Last error message: {str(e)}"
-                        )
-                        content = ""
-            res.append(content)
+            response = await self.engine.call(
+                lambda: self.model.aio.models.generate_content(
+                    model=self.model_version,
+                    contents=message,
+                    config=config,
+                ),
+                "generate_content",
+            )
+            try:
+                return response.text
+            except ValueError:
+                eval_logger.info(f"Prompt feed_back: {response.prompt_feedback}")
+                return ""
+        except Exception as e:
+            eval_logger.error(f"All attempts failed. Last error message: {str(e)}")
+            return ""
+        finally:
+            await self.delete_uploads(uploaded)
+
+    def request_chains(self, requests) -> List[List[int]]:
+        """Requests that must run one after the other: consecutive videos of the same
+        pair when the answer to one decides whether the other is run."""
+        if self.pair_early_exit is None and self.adaptive_stop is None:
+            return [[idx] for idx in range(len(requests))]
+        chains, last_key = [], None
+        for idx, (_, _, _, doc_id, task, split) in enumerate(reg.args for reg in requests):
+            video_id = self.task_dict[task][split][doc_id]["video_id"]
+            key = (task, split, video_id.rsplit("_", 1)[0])
+            if key == last_key:
+                chains[-1].append(idx)
+            else:
+                chains.append([idx])
+            last_key = key
+        return chains
+
+    def run_batch_job(self, batch_requests):
+        """Submit {key: request} as a batch job, wait for it and return {key: response text}."""
+        path = os.path.join(
+            self.response_persistent_folder,
+            f"{self.model_version}_batch.rank{self.accelerator.process_index}.{int(time.time())}.jsonl",
+        )
+        os.makedirs(self.response_persistent_folder, exist_ok=True)
+        write_batch_file(path, batch_requests)
+        batch_file = self.model.files.upload(
+            file=path,
+            config=genai_api.types.UploadFileConfig(display_name=os.path.basename(path), mime_type="jsonl"),
+        )
+        job = self.model.batches.create(
+            model=self.model_version,
+            src=batch_file.name,
+            config={"display_name": os.path.basename(path)},
+        )
+        eval_logger.info(f"Submitted batch job {job.name} with {len(batch_requests)} requests")
+        while job.state.name not in TERMINAL_STATES:
+            time.sleep(self.batch_poll_interval)
+            job = self.model.batches.get(name=job.name)
+        if job.state.name != SUCCEEDED:
+            eval_logger.error(f"Batch job {job.name} ended in {job.state.name}: {job.error}")
+            return {}
+        return parse_results(self.model.files.download(file=job.dest.file_name))
+
+    def generate_until_batch(self, requests) -> List[str]:
+        res = [None] * len(requests)
+        batch_requests = {}
+        uploaded = []
+
+        async def prepare(idx):
+            contexts, gen_kwargs, doc_to_visual, doc_id, task, split = requests[idx].args
+            doc_uuid = get_uuid(task, split, doc_id)
+            if self.continual_mode and self.cache_mode == "resume":
+                content = self.response_store.get(doc_uuid)
+                if content:
+                    res[idx] = content
+                    return
+            doc = self.task_dict[task][split][doc_id]
+            config = self.generation_config(gen_kwargs)
+            try:
+                visuals = await asyncio.to_thread(doc_to_visual, doc)
+                # Cached uploads must outlive the job, which may wait up to BATCH_WINDOW
+                visuals = await self.convert_modality_async(self.flatten([visuals]), uploaded, BATCH_WINDOW)
+                if self.interleave:
+                    message = self.construct_interleaved_input(contexts, visuals)
+                else:
+                    message = [contexts] + visuals
+                batch_requests[doc_uuid] = build_request(
+                    message, config.max_output_tokens, config.temperature, config.safety_settings
+                )
+            except Exception as e:
+                eval_logger.error(f"Could not prepare {doc_uuid} for the batch job: {str(e)}")
+                res[idx] = ""
+
+        # Videos are uploaded concurrently, then everything goes in one job
+        self.engine.run([[idx] for idx in range(len(requests))], prepare)
+        results = self.run_batch_job(batch_requests) if batch_requests else {}
+        for idx, (_, _, _, doc_id, task, split) in enumerate(reg.args for reg in requests):
+            if res[idx] is not None:
+                continue
+            doc_uuid = get_uuid(task, split, doc_id)
+            res[idx] = results.get(doc_uuid, "")
+            if self.continual_mode is True:  # Cache the response
+                self.response_store.put(doc_uuid, res[idx])
+        if uploaded:
+            self.engine.run_until_complete(self.delete_uploads(uploaded))
+        eval_logger.info(f"Batch job answered {sum(1 for r in results.values() if r)} of {len(batch_requests)} requests")
+        return res
+
+    def generate_until(self, requests) -> List[str]:
+        if self.batch_mode:
+            return self.generate_until_batch(requests)
+
+        res = [None] * len(requests)
+        pbar = tqdm(
+            total=len(requests), disable=(self.rank != 0), desc="Model Responding"
+        )
+
+        def record(idx, task, doc, content):
+            res[idx] = content
             pbar.update(1)
+            if self.pair_early_exit is not None:
+                self.pair_early_exit.record(doc, content)
+            if self.adaptive_stop is not None:
+                self.adaptive_stop.record(task, doc, content)
 
-            self.free_video()
+        def cached_response(task, split, doc_id):
+            if self.continual_mode and self.cache_mode == "resume":
+                return self.response_store.get(get_uuid(task, split, doc_id))
+            return None
+
+        chains = self.request_chains(requests)
+        # The second video of a pair may be skipped after the first answer
+        speculative = set() if self.pair_early_exit is None else {idx for chain in chains for idx in chain[1:]}
+
+        def will_generate(idx):
+            """Whether request `idx` reaches the API, as far as is known before it runs."""
+            _, _, _, doc_id, task, split = requests[idx].args
+            doc = self.task_dict[task][split][doc_id]
+            if idx in speculative:
+                return False
+            if self.adaptive_stop is not None and self.adaptive_stop.is_stopped(task, doc):
+                return False
+            return not cached_response(task, split, doc_id)
+
+        # Visuals of the next `preupload` requests that will generate are resolved
+        # and uploaded while the current ones run, keyed by request index
+        preuploads = {}
+        scheduled = set()
+
+        def schedule_preuploads(idx):
+            for ahead in range(idx + 1, min(idx + 1 + self.preupload, len(requests))):
+                if ahead not in scheduled:
+                    scheduled.add(ahead)
+                    if will_generate(ahead):
+                        _, _, doc_to_visual, doc_id, task, split = requests[ahead].args
+                        doc = self.task_dict[task][split][doc_id]
+                        preuploads[ahead] = asyncio.ensure_future(self.preupload_visuals(doc_to_visual, doc))
+
+        async def run_one(idx):
+            contexts, gen_kwargs, doc_to_visual, doc_id, task, split = requests[idx].args
+            doc = self.task_dict[task][split][doc_id]
+            if self.adaptive_stop is not None and self.adaptive_stop.should_stop(task, doc):
+                res[idx] = self.adaptive_stop.stopped_prediction
+                pbar.update(1)
+                return
+            if self.pair_early_exit is not None and self.pair_early_exit.should_skip(doc):
+                res[idx] = self.pair_early_exit.skipped_prediction
+                pbar.update(1)
+                if self.adaptive_stop is not None:
+                    self.adaptive_stop.record(task, doc, self.pair_early_exit.skipped_prediction)
+                return
+
+            content = cached_response(task, split, doc_id)
+            if content:
+                record(idx, task, doc, content)
+                return
+
+            if self.upload_cache is not None and self.preupload > 0:
+                schedule_preuploads(idx)
+            content = await self.generate_one(
+                contexts, gen_kwargs, doc_to_visual, doc, preuploads.pop(idx, None)
+            )
+            record(idx, task, doc, content)
 
             if self.continual_mode is True:  # Cache the response
-                doc_uuid = get_uuid(task, split, doc_id)
-                self.response_cache[doc_uuid] = content
-                with open(self.response_persistent_file, "w") as f:
-                    json.dump(self.response_cache, f)
-
+                self.response_store.put(get_uuid(task, split, doc_id), content)
+
+        async def cancel_preuploads():
+            # Requests skipped after their pre-upload was scheduled
+            for future in preuploads.values():
+                future.cancel()
+            await asyncio.gather(*preuploads.values(), return_exceptions=True)
+            preuploads.clear()
+
+        try:
+            self.engine.run(chains, run_one)
+        finally:
+            self.engine.run_until_complete(cancel_preuploads())
         pbar.close()
+        eval_logger.info(f"Gemini API calls: {self.engine.stats}")
+        if self.upload_cache is not None:
+            eval_logger.info(f"Gemini upload cache: {self.upload_cache.stats}")
+        if self.downscaler.enabled:
+            eval_logger.info(f"Gemini video downscaling: {self.downscaler.stats}")
+        if self.pair_early_exit is not None:
+            eval_logger.info(
+                f"Pair early exit skipped {self.pair_early_exit.skipped} of {len(requests)} requests"
+            )
+        if self.adaptive_stop is not None:
+            self.adaptive_stop.log_summary()
         return res
 
     def generate_until_multi_round(self, requests) -> List[str]:
@@ -0,0 +1,71 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+# All rights reserved.
+#
+# This source code is licensed under the license found in the
+# LICENSE file in the root directory of this source tree.
+
+import json
+from typing import Dict, List
+
+# Batch job files of the Gemini Batch API.
+#
+# Every request becomes one line {"key": "task___split___doc_id", "request":
+# GenerateContentRequest} of a JSONL file that is uploaded and submitted as a
+# batch job. The job writes a JSONL file of {"key", "response"} or {"key",
+# "error"} lines, mapped back to the requests by key.
+
+# A job can stay queued or running this long, the files it references must
+# outlive it
+BATCH_WINDOW = 24 * 3600
+
+SUCCEEDED = "JOB_STATE_SUCCEEDED"
+TERMINAL_STATES = {SUCCEEDED, "JOB_STATE_FAILED", "JOB_STATE_CANCELLED", "JOB_STATE_EXPIRED"}
+
+
+def part_to_json(item) -> dict:
+    """REST form of a content item built by the wrapper: text, an uploaded File or a file Part."""
+    if isinstance(item, str):
+        return {"text": item}
+    file_data = getattr(item, "file_data", None)
+    if file_data is not None:
+        return {"fileData": {"fileUri": file_data.file_uri, "mimeType": file_data.mime_type}}
+    if getattr(item, "uri", None) is not None:
+        return {"fileData": {"fileUri": item.uri, "mimeType": item.mime_type}}
+    raise TypeError(f"{type(item).__name__} inputs are not supported in batch mode, only text and videos")
+
+
+def build_request(message: List, max_output_tokens: int, temperature: float, safety_settings) -> dict:
+    return {
+        "contents": [{"role": "user", "parts": [part_to_json(item) for item in message]}],
+        "generationConfig": {"maxOutputTokens": max_output_tokens, "temperature": temperature},
+        "safetySettings": [
+            {"category": str(getattr(s.category, "value", s.category)), "threshold": str(getattr(s.threshold, "value", s.threshold))}
+            for s in safety_settings
+        ],
+    }
+
+
+def write_batch_file(path: str, requests: Dict[str, dict]):
+    with open(path, "w") as f:
+        for key, request in requests.items():
+            f.write(json.dumps({"key": key, "request": request}) + "\n")
+
+
+def response_text(response: dict) -> str:
+    """Text of the first candidate, empty when the prompt or answer was blocked."""
+    candidates = response.get("candidates") or []
+    if not candidates:
+        return ""
+    parts = (candidates[0].get("content") or {}).get("parts") or []
+    return "".join(part.get("text", "") for part in parts)
+
+
+def parse_results(data: bytes) -> Dict[str, str]:
+    """{key: response text} of a batch result file, errors give empty responses."""
+    results = {}
+    for line in data.decode().splitlines():
+        if not line.strip():
+            continue
+        record = json.loads(line)
+        results[record["key"]] = response_text(record["response"]) if "response" in record else ""
+    return results
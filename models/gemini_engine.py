@@ -0,0 +1,190 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+# All rights reserved.
+#
+# This source code is licensed under the license found in the
+# LICENSE file in the root directory of this source tree.
+
+import asyncio
+import random
+import re
+import time
+from typing import Awaitable, Callable, List, Optional
+
+from loguru import logger as eval_logger
+
+# Bounded-concurrency request engine for the API model wrappers (gemini_api.py).
+#
+# Requests are grouped in chains that run one after the other (both videos of an
+# mvp pair when a wrapper decides the second one from the first answer) while
+# up to `concurrency` chains are in flight. Every API call goes through a token
+# bucket and is retried with full-jitter exponential backoff; a retry-after
+# hint from the server pauses the whole bucket and halves its rate, which then
+# recovers additively with every successful call.
+
+RETRYABLE_CODES = {408, 429, 500, 502, 503, 504}
+
+# Transient failures without an HTTP status: connection and timeout errors of
+# the HTTP clients the SDK runs on. Anything else is a bug or a bad request and
+# fails right away.
+TRANSIENT_ERRORS = [ConnectionError, TimeoutError, asyncio.TimeoutError]
+try:
+    import httpx
+
+    TRANSIENT_ERRORS += [httpx.TimeoutException, httpx.NetworkError, httpx.RemoteProtocolError]
+except ImportError:
+    pass
+try:
+    import aiohttp
+
+    TRANSIENT_ERRORS += [aiohttp.ClientConnectionError]
+except ImportError:
+    pass
+TRANSIENT_ERRORS = tuple(TRANSIENT_ERRORS)
+
+
+class TokenBucket:
+    """Adaptive token bucket shared by the coroutines of one event loop."""
+
+    def __init__(self, rate: float, burst: Optional[float] = None):
+        # rate in requests per second, 0 disables the limit
+        self.max_rate = rate
+        self.rate = rate
+        self.capacity = burst if burst is not None else max(rate, 1.0)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self.lock = asyncio.Lock()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self):
+        if self.max_rate <= 0 and self.paused_until == 0.0:
+            return
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                if now < self.paused_until:
+                    await asyncio.sleep(self.paused_until - now)
+                    continue
+                if self.max_rate <= 0:
+                    return
+                self._refill(now)
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                # Short waits so that a recovering rate is picked up
+                await asyncio.sleep(min((1 - self.tokens) / self.rate, 0.25))
+
+    def throttle(self, delay: float):
+        """The server asked to slow down: pause for `delay` seconds and halve the rate,
+        once for all the requests rejected while paused."""
+        now = time.monotonic()
+        if self.max_rate > 0 and now >= self.paused_until:
+            self.rate = max(self.rate / 2, self.max_rate / 64)
+        self.paused_until = max(self.paused_until, now + delay)
+
+    def recover(self):
+        if self.max_rate > 0 and self.rate < self.max_rate:
+            self.rate = min(self.max_rate, self.rate + self.max_rate / 64)
+
+
+def status_code(error: Exception) -> Optional[int]:
+    code = getattr(error, "code", None)
+    if isinstance(code, int):
+        return code
+    response = getattr(error, "response", None)
+    code = getattr(response, "status_code", None)
+    return code if isinstance(code, int) else None
+
+
+def retry_after(error: Exception) -> Optional[float]:
+    """Seconds to wait as requested by the server, from the Retry-After header or a RetryInfo detail."""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    value = headers.get("retry-after") or headers.get("Retry-After")
+    if value is not None:
+        try:
+            return float(value)
+        except ValueError:
+            pass
+    # google.rpc.RetryInfo, e.g. {"retryDelay": "17s"}
+    match = re.search(r"retryDelay\W+(\d+(?:\.\d+)?)s", str(getattr(error, "details", None) or error))
+    return float(match.group(1)) if match else None
+
+
+def is_retryable(error: Exception) -> bool:
+    code = status_code(error)
+    if code is not None:
+        return code in RETRYABLE_CODES
+    return isinstance(error, TRANSIENT_ERRORS)
+
+
+def backoff_delay(attempt: int, base: float, cap: float) -> float:
+    """Full jitter: uniform in [0, min(cap, base * 2 ** attempt)]."""
+    return random.uniform(0, min(cap, base * 2**attempt))
+
+
+class RequestEngine:
+    def __init__(
+        self,
+        concurrency: int = 8,
+        requests_per_second: float = 0,
+        max_retries: int = 5,
+        base_delay: float = 1.0,
+        max_delay: float = 60.0,
+    ):
+        self.concurrency = max(concurrency, 1)
+        self.requests_per_second = requests_per_second
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.stats = {"calls": 0, "retries": 0, "throttled": 0, "failures": 0}
+        self.bucket = None
+        # Kept across runs: the async HTTP client's connections are bound to it
+        self.loop = None
+
+    async def call(self, make_call: Callable[[], Awaitable], description: str = "request"):
+        """Await `make_call()` under the rate limit, retrying transient errors."""
+        for attempt in range(self.max_retries):
+            await self.bucket.acquire()
+            self.stats["calls"] += 1
+            try:
+                result = await make_call()
+                self.bucket.recover()
+                return result
+            except Exception as e:
+                if not is_retryable(e) or attempt == self.max_retries - 1:
+                    self.stats["failures"] += 1
+                    raise
+                self.stats["retries"] += 1
+                delay = retry_after(e)
+                if delay is not None or status_code(e) == 429:
+                    self.stats["throttled"] += 1
+                    delay = delay if delay is not None else backoff_delay(attempt, self.base_delay, self.max_delay)
+                    self.bucket.throttle(delay)
+                else:
+                    delay = backoff_delay(attempt, self.base_delay, self.max_delay)
+                eval_logger.info(f"Attempt {attempt + 1} of {description} failed with error: {str(e)}, retrying in {delay:.1f}s")
+                await asyncio.sleep(delay)
+
+    async def _run(self, chains: List[List[int]], run_one: Callable[[int], Awaitable]):
+        self.bucket = TokenBucket(self.requests_per_second)
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def run_chain(chain):
+            async with semaphore:
+                for idx in chain:
+                    await run_one(idx)
+
+        await asyncio.gather(*(run_chain(chain) for chain in chains))
+
+    def run_until_complete(self, coroutine: Awaitable):
+        if self.loop is None or self.loop.is_closed():
+            self.loop = asyncio.new_event_loop()
+        return self.loop.run_until_complete(coroutine)
+
+    def run(self, chains: List[List[int]], run_one: Callable[[int], Awaitable]):
+        """Run `run_one(idx)` for every index, chains in parallel, each chain in order."""
+        self.run_until_complete(self._run(chains, run_one))
@@ -0,0 +1,78 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+# All rights reserved.
+#
+# This source code is licensed under the license found in the
+# LICENSE file in the root directory of this source tree.
+
+import atexit
+import glob
+import json
+import os
+from typing import Dict, Optional
+
+from loguru import logger as eval_logger
+
+# Response store of the API model wrappers in continual mode.
+#
+# Each process appends one JSON line per response to its own file,
+# `{model_version}_response.rank{rank}.jsonl`, so writes are O(1), never race
+# between ranks and a crash can at worst leave a torn last line, which is
+# skipped on read. Reads go through a merged view of every rank's file plus the
+# legacy `{model_version}_response.json` of earlier runs, so a run resumes with
+# any number of processes regardless of how the cached responses were split.
+# Every put is flushed, and the file is closed at exit if `close` was not called.
+
+
+class ResponseStore:
+    def __init__(self, folder: str, model_version: str, rank: int = 0):
+        self.folder = folder
+        self.model_version = model_version
+        os.makedirs(folder, exist_ok=True)
+        self.path = os.path.join(folder, f"{model_version}_response.rank{rank}.jsonl")
+        self.responses: Dict[str, str] = self._read_all()
+        self.file = open(self.path, "a")
+        if self.file.tell() > 0:
+            with open(self.path, "rb") as f:
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b"\n":
+                    # Terminate a torn last line so the next response starts a new one
+                    self.file.write("\n")
+                    self.file.flush()
+        atexit.register(self.close)
+
+    def _read_all(self) -> Dict[str, str]:
+        responses = {}
+        legacy_path = os.path.join(self.folder, f"{self.model_version}_response.json")
+        if os.path.exists(legacy_path):
+            with open(legacy_path, "r") as f:
+                responses.update(json.load(f))
+        torn = 0
+        for path in sorted(glob.glob(os.path.join(self.folder, f"{self.model_version}_response.rank*.jsonl"))):
+            with open(path, "r") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        torn += 1
+                        continue
+                    responses[record["key"]] = record["response"]
+        if torn:
+            eval_logger.warning(f"Skipped {torn} partially written responses in {self.folder}")
+        return responses
+
+    def __len__(self):
+        return len(self.responses)
+
+    def get(self, key: str) -> Optional[str]:
+        return self.responses.get(key)
+
+    def put(self, key: str, response: str):
+        self.responses[key] = response
+        # A single write of a whole line per response
+        self.file.write(json.dumps({"key": key, "response": response}) + "\n")
+        self.file.flush()
+
+    def close(self):
+        if not self.file.closed:
+            self.file.close()
+            atexit.unregister(self.close)
@@ -0,0 +1,207 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+# All rights reserved.
+#
+# This source code is licensed under the license found in the
+# LICENSE file in the root directory of this source tree.
+
+import asyncio
+import fcntl
+import functools
+import hashlib
+import json
+import os
+import time
+from contextlib import contextmanager
+from typing import Awaitable, Callable, Dict, Optional
+
+from loguru import logger as eval_logger
+
+# Content-addressed cache of the files uploaded to the Gemini Files API.
+#
+# Uploads are keyed by the sha256 of the video, so a video asked about by
+# several questions, tasks or reruns is sent once and reused until the service
+# expires it (48h). Entries are appended to a JSONL ledger shared by all
+# processes, each process reads what the others appended since its last
+# lookup; expired entries are evicted and the ledger is compacted at startup.
+# Entries not checked for `revalidate_after` seconds are looked up again before
+# use, in case the file was deleted on the service side. Callers that reference
+# a file long after the lookup (batch jobs) ask for a `min_lifetime`, and
+# entries expiring sooner are uploaded again. Concurrent requests for the same
+# video share a single upload.
+
+# Files API retention, minus a margin for requests in flight
+DEFAULT_TTL = 47 * 3600
+
+
+@functools.lru_cache(maxsize=65536)
+def _digest(path: str, mtime_ns: int, size: int) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def file_digest(path: str) -> str:
+    """sha256 of a file, hashed again only when its mtime or size changes."""
+    st = os.stat(path)
+    return _digest(os.path.abspath(path), st.st_mtime_ns, st.st_size)
+
+
+def state_name(uploaded) -> str:
+    state = getattr(uploaded, "state", None)
+    return str(getattr(state, "name", state) or "ACTIVE").upper()
+
+
+class UploadCache:
+    def __init__(self, ledger_path: str, ttl: float = DEFAULT_TTL, revalidate_after: float = 3600):
+        self.ledger_path = ledger_path
+        self.lock_path = f"{ledger_path}.lock"
+        self.ttl = ttl
+        self.revalidate_after = revalidate_after
+        self.entries: Dict[str, dict] = {}
+        self.offset = 0
+        self.inode = None
+        self.in_flight: Dict[str, asyncio.Task] = {}
+        self.stats = {"hits": 0, "uploads": 0, "revalidated": 0, "evicted": 0, "expiring": 0}
+        os.makedirs(os.path.dirname(os.path.abspath(ledger_path)), exist_ok=True)
+        self._compact()
+
+    @contextmanager
+    def _locked(self):
+        with open(self.lock_path, "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _load(self):
+        """Read the ledger lines appended (by any process) since the last call."""
+        if not os.path.exists(self.ledger_path):
+            return
+        inode = os.stat(self.ledger_path).st_ino
+        if inode != self.inode:
+            # Compacted by another process
+            self.entries, self.offset, self.inode = {}, 0, inode
+        with open(self.ledger_path, "rb") as f:
+            f.seek(self.offset)
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break  # partially written, read it next time
+                self.offset += len(line)
+                record = json.loads(line)
+                if record.get("deleted"):
+                    self.entries.pop(record["digest"], None)
+                else:
+                    self.entries[record["digest"]] = record
+
+    def _append(self, record: dict):
+        with self._locked(), open(self.ledger_path, "a") as f:
+            f.write(json.dumps(record) + "\n")
+
+    def _compact(self):
+        """Drop expired and deleted entries from the ledger."""
+        with self._locked():
+            self._load()
+            now = time.time()
+            expired = [d for d, entry in self.entries.items() if entry["expires"] <= now]
+            for digest in expired:
+                del self.entries[digest]
+            self.stats["evicted"] += len(expired)
+            tmp_path = f"{self.ledger_path}.{os.getpid()}"
+            with open(tmp_path, "w") as f:
+                for entry in self.entries.values():
+                    f.write(json.dumps(entry) + "\n")
+            os.replace(tmp_path, self.ledger_path)
+            self.inode = os.stat(self.ledger_path).st_ino
+            self.offset = os.path.getsize(self.ledger_path)
+
+    def _lookup(self, digest: str) -> Optional[dict]:
+        self._load()
+        entry = self.entries.get(digest)
+        if entry is not None and entry["expires"] <= time.time():
+            self.stats["evicted"] += 1
+            self._forget(digest)
+            return None
+        return entry
+
+    def _store(self, digest: str, uploaded) -> dict:
+        expires = time.time() + self.ttl
+        expiration_time = getattr(uploaded, "expiration_time", None)
+        if expiration_time is not None:
+            expires = min(expires, expiration_time.timestamp() - 3600)
+        entry = {
+            "digest": digest,
+            "name": uploaded.name,
+            "uri": uploaded.uri,
+            "mime_type": uploaded.mime_type,
+            "expires": expires,
+            "checked": time.time(),
+        }
+        self._append(entry)
+        self.entries[digest] = entry
+        return entry
+
+    def _forget(self, digest: str):
+        self._append({"digest": digest, "deleted": True})
+        self.entries.pop(digest, None)
+
+    async def get(
+        self,
+        path: str,
+        upload: Callable[[str], Awaitable],
+        fetch: Callable[[str], Awaitable],
+        min_lifetime: float = 0,
+    ) -> dict:
+        """Cache entry of `path`, uploading it with `upload(path)` (which must return
+        an ACTIVE file) unless a valid upload that lives at least `min_lifetime`
+        more seconds exists; `fetch(name)` revalidates."""
+        digest = await asyncio.to_thread(file_digest, path)
+        task = self.in_flight.get(digest)
+        if task is None:
+            task = asyncio.ensure_future(self._resolve(digest, path, upload, fetch, min_lifetime))
+            self.in_flight[digest] = task
+            task.add_done_callback(lambda _: self.in_flight.pop(digest, None))
+        return await task
+
+    async def _resolve(self, digest, path, upload, fetch, min_lifetime) -> dict:
+        entry = self._lookup(digest)
+        if entry is not None and entry["expires"] - time.time() < min_lifetime:
+            self.stats["expiring"] += 1
+            entry = None
+        if entry is not None and time.time() - entry["checked"] > self.revalidate_after:
+            self.stats["revalidated"] += 1
+            try:
+                remote = await fetch(entry["name"])
+                valid = state_name(remote) == "ACTIVE"
+            except Exception:
+                valid = False
+            if valid:
+                entry = dict(entry, checked=time.time())
+                self._append(entry)
+                self.entries[digest] = entry
+            else:
+                eval_logger.debug(f"Cached upload {entry['name']} of {path} is gone, uploading again")
+                self._forget(digest)
+                entry = None
+        if entry is not None:
+            self.stats["hits"] += 1
+            return entry
+        self.stats["uploads"] += 1
+        return self._store(digest, await upload(path))
+
+
+async def wait_until_active(uploaded, fetch: Callable[[str], Awaitable], timeout: float = 600, max_interval: float = 5.0):
+    """Poll an uploaded file until the service has processed it."""
+    interval = 0.5
+    deadline = time.monotonic() + timeout
+    while state_name(uploaded) == "PROCESSING":
+        if time.monotonic() > deadline:
+            raise TimeoutError(f"{uploaded.name} still processing after {timeout}s")
+        await asyncio.sleep(interval)
+        interval = min(interval * 2, max_interval)
+        uploaded = await fetch(uploaded.name)
+    if state_name(uploaded) == "FAILED":
+        raise RuntimeError(f"Processing of {uploaded.name} failed")
+    return uploaded
@@ -0,0 +1,167 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+# All rights reserved.
+#
+# This source code is licensed under the license found in the
+# LICENSE file in the root directory of this source tree.
+
+import hashlib
+import json
+import math
+import os
+import subprocess
+import tempfile
+from typing import Optional
+
+from lmms_eval.models.gemini_uploads import file_digest
+from loguru import logger as eval_logger
+
+# Client-side downscaling of the videos sent to the API model wrappers.
+#
+# The service resamples every video it receives, so uploading full resolution
+# and frame rate only costs upload bytes and processing time. Videos larger
+# than `max_pixels` per frame, faster than `max_fps` or longer than
+# `max_frames` frames are re-encoded with ffmpeg before upload, the same budget
+# as `max_pixels` / `max_num_frames` of the open models. Results are cached on
+# disk as `{sha256 of the source}_{settings hash}.mp4`, so every video is
+# transcoded once per setting and, being the same file, hits the upload cache.
+#
+# ffmpeg and ffprobe are looked up on the PATH, or at FFMPEG_BINARY and
+# FFPROBE_BINARY.
+
+
+def ffmpeg_binary() -> str:
+    return os.getenv("FFMPEG_BINARY", "ffmpeg")
+
+
+def ffprobe_binary() -> str:
+    return os.getenv("FFPROBE_BINARY", "ffprobe")
+
+
+def probe(path: str) -> dict:
+    """width, height, fps and duration (None if unknown) of the first video stream."""
+    cmd = [
+        ffprobe_binary(), "-v", "error",
+        "-select_streams", "v:0",
+        "-show_entries", "stream=width,height,avg_frame_rate,nb_frames:format=duration",
+        "-of", "json",
+        path,
+    ]
+    info = json.loads(subprocess.run(cmd, check=True, capture_output=True, text=True).stdout)
+    stream = info["streams"][0]
+    num, _, den = stream.get("avg_frame_rate", "0/0").partition("/")
+    fps = float(num) / float(den) if den and float(den) > 0 else None
+    duration = info.get("format", {}).get("duration")
+    duration = float(duration) if duration not in (None, "N/A") else None
+    if duration is None and fps and str(stream.get("nb_frames", "")).isdigit():
+        duration = int(stream["nb_frames"]) / fps
+    return {"width": int(stream["width"]), "height": int(stream["height"]), "fps": fps, "duration": duration}
+
+
+def target_size(width: int, height: int, max_pixels: Optional[int]):
+    """Largest even size with width * height <= max_pixels, keeping aspect, None if already within."""
+    if not max_pixels or width * height <= max_pixels:
+        return None
+    scale = math.sqrt(max_pixels / (width * height))
+    return max(2, int(width * scale) // 2 * 2), max(2, int(height * scale) // 2 * 2)
+
+
+def target_fps(fps: Optional[float], duration: Optional[float], max_fps: Optional[float], max_frames: Optional[int]):
+    """Output frame rate within `max_fps` and `max_frames` over the clip, None if already within."""
+    limits = []
+    if max_fps:
+        limits.append(max_fps)
+    if max_frames and duration:
+        limits.append(max_frames / duration)
+    if not limits:
+        return None
+    target = min(limits)
+    if fps is not None and fps <= target:
+        return None
+    return target
+
+
+class VideoDownscaler:
+    def __init__(
+        self,
+        cache_dir: str,
+        max_pixels: Optional[int] = None,
+        max_fps: Optional[float] = None,
+        max_frames: Optional[int] = None,
+    ):
+        self.cache_dir = cache_dir
+        self.max_pixels = max_pixels
+        self.max_fps = max_fps
+        self.max_frames = max_frames
+        settings = json.dumps({"max_pixels": max_pixels, "max_fps": max_fps, "max_frames": max_frames}, sort_keys=True)
+        self.settings_hash = hashlib.sha256(settings.encode()).hexdigest()[:12]
+        self.stats = {"transcoded": 0, "cached": 0, "unchanged": 0, "failed": 0, "source_bytes": 0, "output_bytes": 0}
+        if self.enabled:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.max_pixels or self.max_fps or self.max_frames)
+
+    def filters(self, meta: dict) -> list:
+        filters = []
+        fps = target_fps(meta["fps"], meta["duration"], self.max_fps, self.max_frames)
+        if fps is not None:
+            filters.append(f"fps={fps:.6g}")
+        size = target_size(meta["width"], meta["height"], self.max_pixels)
+        if size is not None:
+            filters.append(f"scale={size[0]}:{size[1]}")
+        return filters
+
+    def transcode(self, path: str, output_path: str, filters: list):
+        fd, tmp_path = tempfile.mkstemp(suffix=".mp4", dir=self.cache_dir)
+        os.close(fd)
+        cmd = [
+            ffmpeg_binary(), "-y", "-loglevel", "error",
+            "-i", path,
+            "-an",
+            "-vf", ",".join(filters),
+            "-c:v", "libx264",
+            "-preset", "veryfast",
+            "-crf", "23",
+            "-pix_fmt", "yuv420p",
+            "-movflags", "+faststart",
+            tmp_path,
+        ]
+        try:
+            subprocess.run(cmd, check=True, capture_output=True, text=True)
+            # Atomic, another process may be writing the same file
+            os.replace(tmp_path, output_path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def __call__(self, path: str) -> str:
+        """Path of the video to upload: a downscaled copy of `path`, or `path` itself
+        when it is already within the limits or cannot be transcoded."""
+        if not self.enabled:
+            return path
+        output_path = os.path.join(self.cache_dir, f"{file_digest(path)}_{self.settings_hash}.mp4")
+        if os.path.exists(output_path):
+            self.stats["cached"] += 1
+            return output_path
+        # Videos within the limits are marked with an empty file, so they are not probed again
+        unchanged_path = f"{output_path}.unchanged"
+        if os.path.exists(unchanged_path):
+            self.stats["unchanged"] += 1
+            return path
+        try:
+            filters = self.filters(probe(path))
+            if not filters:
+                open(unchanged_path, "w").close()
+                self.stats["unchanged"] += 1
+                return path
+            self.transcode(path, output_path, filters)
+        except Exception as e:
+            stderr = getattr(e, "stderr", None)
+            eval_logger.warning(f"Could not downscale {path}, uploading the original: {stderr or str(e)}")
+            self.stats["failed"] += 1
+            return path
+        self.stats["transcoded"] += 1
+        self.stats["source_bytes"] += os.path.getsize(path)
+        self.stats["output_bytes"] += os.path.getsize(output_path)
+        return output_path
@@ -0,0 +1,194 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+# All rights reserved.
+#
+# This source code is licensed under the license found in the
+# LICENSE file in the root directory of this source tree.
+
+import argparse
+import json
+import os
+import tempfile
+import time
+import urllib.request
+
+from mock_gemini_server import add_arguments, start_server
+
+# Load benchmark of the gemini_api wrapper against the mock service (run from
+# lmms-eval/, where `make prep_evals` copies it next to mock_gemini_server.py).
+#
+#   python bench_gemini_api.py --num_pairs 200 --latency 2 --error_rate 0.05 \
+#       --model_args num_concurrent=32,requests_per_minute=600
+#   python bench_gemini_api.py --url http://127.0.0.1:8765 --rounds 2
+#
+# Synthetic mvp docs (pairs of random-byte "videos", `--questions_per_video`
+# docs per video) go through `GeminiAPI.generate_until` as lmms-eval would call
+# it. Per round it reports requests/s, p50/p99 request latency (upload and
+# retries included), the engine's retry counts and what the server saw: uploads,
+# bytes uploaded and injected errors. Without `--url` the mock server runs in
+# this process with the fault injection options below; later rounds reuse the
+# persistent folder, so they show the upload cache (and the response store with
+# continual_mode=True) at work.
+
+TASK, SPLIT = "mvp_bench", "test"
+
+
+def make_docs(video_dir: str, num_pairs: int, questions_per_video: int, video_kb: int):
+    os.makedirs(video_dir, exist_ok=True)
+    docs = []
+    for question in range(questions_per_video):
+        for pair in range(num_pairs):
+            for video in range(2):
+                video_path = os.path.join(video_dir, f"{pair}_{video}.mp4")
+                if not os.path.exists(video_path):
+                    with open(video_path, "wb") as f:
+                        f.write(os.urandom(video_kb * 1024))
+                docs.append(
+                    {
+                        "video_id": f"bench{question}_{pair}_{video}",
+                        "video_path": video_path,
+                        "source": "bench",
+                        "question": f"Question {question} about pair {pair}?",
+                        "candidates": ["yes", "no"],
+                        "answer": ["yes", "no"][video],
+                        "answer_idx": str(video),
+                    }
+                )
+    return docs
+
+
+def make_requests(docs):
+    from lmms_eval.api.instance import Instance
+
+    def doc_to_visual(doc):
+        return [doc["video_path"]]
+
+    return [
+        Instance(
+            request_type="generate_until",
+            arguments=(
+                f"{doc['question']}\n(A) yes\n(B) no\nAnswer with the option's letter.",
+                {"max_new_tokens": 16, "temperature": 0},
+                doc_to_visual,
+                doc_id,
+                TASK,
+                SPLIT,
+            ),
+            idx=0,
+            metadata=(TASK, doc_id, 1),
+        )
+        for doc_id, doc in enumerate(docs)
+    ]
+
+
+def percentile(values, q: float):
+    """Nearest-rank percentile, None without values (batch mode does not go through generate_one)."""
+    if not values:
+        return None
+    values = sorted(values)
+    return round(values[min(len(values) - 1, int(q / 100 * len(values)))], 3)
+
+
+def seconds(value) -> str:
+    return "-" if value is None else f"{value:.2f}s"
+
+
+def server_stats(url: str, reset: bool = False) -> dict:
+    if reset:
+        urllib.request.urlopen(urllib.request.Request(f"{url}/mock/reset", data=b"", method="POST"))
+        return {}
+    with urllib.request.urlopen(f"{url}/mock/stats") as response:
+        return json.load(response)
+
+
+def run_round(model, requests, url: str) -> dict:
+    latencies = []
+    generate_one = model.generate_one
+
+    async def timed(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return await generate_one(*args, **kwargs)
+        finally:
+            latencies.append(time.perf_counter() - start)
+
+    model.generate_one = timed
+    server_stats(url, reset=True)
+    engine_before = dict(model.engine.stats)
+    start = time.perf_counter()
+    try:
+        responses = model.generate_until(requests)
+    finally:
+        model.generate_one = generate_one
+    wall = time.perf_counter() - start
+    server = server_stats(url)
+    engine = {k: v - engine_before[k] for k, v in model.engine.stats.items()}
+    return {
+        "requests": len(requests),
+        "generated": len(latencies),
+        "empty_responses": sum(1 for r in responses if not r),
+        "wall_s": round(wall, 3),
+        "requests_per_s": round(len(requests) / wall, 3),
+        "p50_latency_s": percentile(latencies, 50),
+        "p99_latency_s": percentile(latencies, 99),
+        "api_calls": engine["calls"],
+        "retries": engine["retries"],
+        "throttled": engine["throttled"],
+        "failures": engine["failures"],
+        "uploads": server["uploads"],
+        "upload_mb": round(server["upload_bytes"] / 2**20, 3),
+        "server": server,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark gemini_api against the mock Gemini service")
+    parser.add_argument("--url", default=None, help="running mock server, otherwise one is started here")
+    parser.add_argument("--num_pairs", type=int, default=100)
+    parser.add_argument("--questions_per_video", type=int, default=1)
+    parser.add_argument("--video_kb", type=int, default=512)
+    parser.add_argument("--rounds", type=int, default=1)
+    parser.add_argument("--model_args", default="", help="extra gemini_api model_args, e.g. num_concurrent=32")
+    parser.add_argument("--workdir", default=None, help="videos and persistent folder (default: a temp dir)")
+    parser.add_argument("--output", default=None, help="write the results of every round to this JSON file")
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    url = args.url
+    if url is None:
+        _, _, url = start_server(args)
+    # The module creates a default client on import
+    os.environ.setdefault("GOOGLE_API_KEY", "mock")
+    from lmms_eval.models.gemini_api import GeminiAPI
+    from lmms_eval.utils import simple_parse_args_string
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix="bench_gemini_")
+    docs = make_docs(os.path.join(workdir, "videos"), args.num_pairs, args.questions_per_video, args.video_kb)
+    model_args = {
+        "model_version": "gemini-2.0-flash",
+        "continual_mode": False,
+        "response_persistent_folder": os.path.join(workdir, "persistent"),
+        "base_url": url,
+    }
+    model_args.update(simple_parse_args_string(args.model_args))
+    model = GeminiAPI(**model_args)
+    model.task_dict = {TASK: {SPLIT: docs}}
+
+    results = []
+    for round_idx in range(args.rounds):
+        result = run_round(model, make_requests(docs), url)
+        results.append(result)
+        print(
+            f"round {round_idx}: {result['requests']} requests in {result['wall_s']:.1f}s"
+            f" ({result['requests_per_s']:.2f} req/s), latency p50 {seconds(result['p50_latency_s'])}"
+            f" p99 {seconds(result['p99_latency_s'])}, {result['retries']} retries"
+            f" ({result['throttled']} throttled, {result['failures']} failed),"
+            f" {result['uploads']} uploads ({result['upload_mb']:.1f} MB),"
+            f" {result['empty_responses']} empty responses"
+        )
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"model_args": model_args, "docs": len(docs), "rounds": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,383 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+# All rights reserved.
+#
+# This source code is licensed under the license found in the
+# LICENSE file in the root directory of this source tree.
+
+import argparse
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+# Local stand-in for the Gemini API endpoints used by models/gemini_api.py, to
+# measure and regression-test the wrapper without a key or quota.
+#
+#   python mock_gemini_server.py --port 8765 --latency 2 --error_rate 0.02 \
+#       --throttle_every 60 --throttle_duration 5 --processing_delay 3
+#   ... --model_args model_version=gemini-2.0-flash,base_url=http://127.0.0.1:8765
+#
+# It implements the resumable file upload, files.get / delete / download,
+# generate_content and the batch endpoints, with configurable latency, random
+# 503s, periodic 429 bursts with a retry delay, upload bandwidth and a
+# PROCESSING delay after every upload. Videos are not decoded: answers are drawn
+# at random from `--answers`, and a request referencing an unknown or still
+# processing file fails like on the service. GET /mock/stats returns the
+# counters (requests, bytes uploaded, injected errors, ...) and POST /mock/reset
+# clears them.
+
+API = "/v1beta"
+
+
+def rfc3339(timestamp: float) -> str:
+    return datetime.fromtimestamp(timestamp, timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+
+
+class MockGemini:
+    """State and fault injection of the mock service, shared by the handler threads."""
+
+    def __init__(
+        self,
+        latency: float = 1.0,
+        jitter: float = 0.5,
+        error_rate: float = 0.0,
+        throttle_every: float = 0.0,
+        throttle_duration: float = 0.0,
+        retry_delay: float = 2.0,
+        processing_delay: float = 1.0,
+        upload_mbps: float = 0.0,
+        batch_delay: float = 5.0,
+        answers: str = "A,B",
+        seed: int = 0,
+    ):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.throttle_every = throttle_every
+        self.throttle_duration = throttle_duration
+        self.retry_delay = retry_delay
+        self.processing_delay = processing_delay
+        self.upload_mbps = upload_mbps
+        self.batch_delay = batch_delay
+        self.answers = answers.split(",")
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.started = time.monotonic()
+        self.files = {}
+        self.contents = {}
+        self.uploads = {}
+        self.batches = {}
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.stats = {
+                "generate_content": 0,
+                "uploads": 0,
+                "upload_bytes": 0,
+                "files_get": 0,
+                "files_delete": 0,
+                "batches": 0,
+                "injected_errors": 0,
+                "throttled": 0,
+                "not_active": 0,
+            }
+
+    def count(self, key: str, n: int = 1):
+        with self.lock:
+            self.stats[key] += n
+
+    def draw(self, fn):
+        with self.lock:
+            return fn(self.random)
+
+    def throttled(self) -> bool:
+        """Inside a 429 burst: the first `throttle_duration` seconds of every `throttle_every`."""
+        if self.throttle_every <= 0:
+            return False
+        return (time.monotonic() - self.started) % self.throttle_every < self.throttle_duration
+
+    def file_json(self, file_id: str) -> dict:
+        record = self.files[file_id]
+        state = "ACTIVE" if time.time() >= record["ready"] else "PROCESSING"
+        return dict(record["file"], state=state)
+
+    def create_file(self, base_url: str, meta: dict, data: bytes) -> dict:
+        file_id = uuid.uuid4().hex[:12]
+        now = time.time()
+        mime_type = meta.get("mimeType") or "application/octet-stream"
+        file = {
+            "name": f"files/{file_id}",
+            "displayName": meta.get("displayName", file_id),
+            "mimeType": mime_type,
+            "sizeBytes": str(len(data)),
+            "createTime": rfc3339(now),
+            "updateTime": rfc3339(now),
+            "expirationTime": rfc3339(now + 48 * 3600),
+            "uri": f"{base_url}{API}/files/{file_id}",
+            "source": "UPLOADED",
+        }
+        # Videos only go through processing; batch input files are kept to be read
+        ready = now + self.processing_delay if mime_type.startswith("video") else now
+        with self.lock:
+            self.files[file_id] = {"file": file, "ready": ready}
+            if not mime_type.startswith(("video", "audio", "image")):
+                self.contents[file_id] = data
+        return self.file_json(file_id)
+
+    def check_parts(self, request: dict):
+        """Error of a request referencing an unknown or not yet ACTIVE file, else None."""
+        for content in request.get("contents", []):
+            for part in content.get("parts", []):
+                uri = (part.get("fileData") or {}).get("fileUri")
+                if uri is None:
+                    continue
+                file_id = uri.rsplit("/", 1)[-1]
+                if file_id not in self.files:
+                    return 403, "PERMISSION_DENIED", f"File {file_id} does not exist or you do not have permission to access it."
+                if self.file_json(file_id)["state"] != "ACTIVE":
+                    self.count("not_active")
+                    return 400, "FAILED_PRECONDITION", f"The File {file_id} is not in an ACTIVE state and usage is not allowed."
+        return None
+
+    def response(self, answer: str) -> dict:
+        return {
+            "candidates": [{"content": {"role": "model", "parts": [{"text": answer}]}, "finishReason": "STOP", "index": 0}],
+            "usageMetadata": {"promptTokenCount": 300, "candidatesTokenCount": 1, "totalTokenCount": 301},
+        }
+
+    def generate(self, request: dict):
+        """(status, body, headers) of a generate_content call."""
+        self.count("generate_content")
+        delay = self.draw(lambda r: self.latency * (1 + self.jitter * r.uniform(-1, 1)))
+        if self.throttled():
+            self.count("throttled")
+            return error(429, "RESOURCE_EXHAUSTED", "Resource has been exhausted (e.g. check quota).", self.retry_delay)
+        if self.draw(lambda r: r.random()) < self.error_rate:
+            self.count("injected_errors")
+            time.sleep(delay / 2)
+            return error(503, "UNAVAILABLE", "The model is overloaded. Please try again later.")
+        failure = self.check_parts(request)
+        if failure is not None:
+            return error(*failure)
+        time.sleep(max(delay, 0))
+        return 200, self.response(self.draw(lambda r: r.choice(self.answers))), {}
+
+    def create_batch(self, base_url: str, model: str, batch: dict) -> dict:
+        self.count("batches")
+        input_id = batch["inputConfig"]["fileName"].rsplit("/", 1)[-1]
+        lines = []
+        for line in self.contents[input_id].decode().splitlines():
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            failure = self.check_parts(record["request"])
+            if failure is not None:
+                lines.append({"key": record["key"], "error": {"code": failure[0], "message": failure[2]}})
+            else:
+                answer = self.draw(lambda r: r.choice(self.answers))
+                lines.append({"key": record["key"], "response": self.response(answer)})
+        output = self.create_file(
+            base_url,
+            {"displayName": f"{batch.get('displayName', input_id)}-results", "mimeType": "application/jsonl"},
+            "".join(json.dumps(line) + "\n" for line in lines).encode(),
+        )
+        batch_id = uuid.uuid4().hex[:12]
+        with self.lock:
+            self.batches[batch_id] = {
+                "model": model,
+                "displayName": batch.get("displayName", batch_id),
+                "created": time.time(),
+                "output": output["name"],
+                "count": len(lines),
+            }
+        return self.batch_json(batch_id)
+
+    def batch_json(self, batch_id: str) -> dict:
+        batch = self.batches[batch_id]
+        done = time.time() >= batch["created"] + self.batch_delay
+        metadata = {
+            "@type": "type.googleapis.com/google.ai.generativelanguage.v1main.GenerateContentBatch",
+            "model": batch["model"],
+            "displayName": batch["displayName"],
+            "createTime": rfc3339(batch["created"]),
+            "state": "BATCH_STATE_SUCCEEDED" if done else "BATCH_STATE_RUNNING",
+            "batchStats": {"requestCount": str(batch["count"])},
+        }
+        if done:
+            metadata["output"] = {"responsesFile": batch["output"]}
+        return {"name": f"batches/{batch_id}", "metadata": metadata, "done": done}
+
+
+def error(code: int, status: str, message: str, retry_delay: float = None):
+    body = {"error": {"code": code, "message": message, "status": status}}
+    headers = {}
+    if retry_delay is not None:
+        body["error"]["details"] = [
+            {"@type": "type.googleapis.com/google.rpc.RetryInfo", "retryDelay": f"{retry_delay:g}s"}
+        ]
+        headers["Retry-After"] = f"{retry_delay:g}"
+    return code, body, headers
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    mock: MockGemini = None
+
+    def log_message(self, format, *args):
+        pass
+
+    @property
+    def base_url(self) -> str:
+        return f"http://{self.headers.get('Host', '%s:%d' % self.server.server_address[:2])}"
+
+    def read_body(self) -> bytes:
+        length = int(self.headers.get("Content-Length") or 0)
+        return self.rfile.read(length) if length else b""
+
+    def send(self, status: int, body=None, headers=None, raw: bytes = None):
+        data = raw if raw is not None else json.dumps(body if body is not None else {}).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/octet-stream" if raw is not None else "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        mock = self.mock
+        if url.path == "/mock/stats":
+            with mock.lock:
+                return self.send(200, dict(mock.stats))
+        match = re.fullmatch(rf"{API}/files/(\w+)(:download)?", url.path)
+        if match:
+            file_id, download = match.groups()
+            if file_id not in mock.files:
+                return self.send(*error(404, "NOT_FOUND", f"File {file_id} not found."))
+            if download:
+                return self.send(200, raw=mock.contents.get(file_id, b""))
+            mock.count("files_get")
+            return self.send(200, mock.file_json(file_id))
+        match = re.fullmatch(rf"{API}/batches/(\w+)", url.path)
+        if match and match.group(1) in mock.batches:
+            return self.send(200, mock.batch_json(match.group(1)))
+        self.send(*error(404, "NOT_FOUND", f"Unknown path {url.path}"))
+
+    def do_DELETE(self):
+        match = re.fullmatch(rf"{API}/files/(\w+)", urlparse(self.path).path)
+        if match:
+            self.mock.count("files_delete")
+            with self.mock.lock:
+                self.mock.files.pop(match.group(1), None)
+                self.mock.contents.pop(match.group(1), None)
+            return self.send(200, {})
+        self.send(*error(404, "NOT_FOUND", f"Unknown path {self.path}"))
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        mock = self.mock
+        body = self.read_body()
+        if url.path == "/mock/reset":
+            mock.reset()
+            return self.send(200, {})
+        if url.path == f"/upload{API}/files":
+            return self.upload(url, body)
+        match = re.fullmatch(rf"{API}/models/([\w.\-]+):(generateContent|batchGenerateContent)", url.path)
+        if match:
+            model, method = match.groups()
+            request = json.loads(body or b"{}")
+            if method == "generateContent":
+                return self.send(*mock.generate(request))
+            return self.send(200, mock.create_batch(self.base_url, f"models/{model}", request["batch"]))
+        self.send(*error(404, "NOT_FOUND", f"Unknown path {url.path}"))
+
+    def upload(self, url, body: bytes):
+        """Resumable upload protocol: a `start` call returns the session URL, chunks follow."""
+        mock = self.mock
+        command = self.headers.get("X-Goog-Upload-Command", "")
+        if command == "start":
+            upload_id = uuid.uuid4().hex
+            meta = json.loads(body or b"{}").get("file") or {}
+            meta.setdefault("mimeType", self.headers.get("X-Goog-Upload-Header-Content-Type"))
+            with mock.lock:
+                mock.uploads[upload_id] = {"meta": meta, "data": bytearray()}
+            return self.send(
+                200,
+                {},
+                {
+                    "X-Goog-Upload-URL": f"{self.base_url}/upload{API}/files?upload_id={upload_id}",
+                    "X-Goog-Upload-Status": "active",
+                },
+            )
+        upload_id = parse_qs(url.query).get("upload_id", [None])[0]
+        if upload_id not in mock.uploads:
+            return self.send(*error(404, "NOT_FOUND", "Unknown upload session"))
+        if mock.upload_mbps > 0:
+            time.sleep(len(body) * 8 / (mock.upload_mbps * 1e6))
+        mock.count("upload_bytes", len(body))
+        session = mock.uploads[upload_id]
+        session["data"].extend(body)
+        if "finalize" not in command:
+            return self.send(200, {}, {"X-Goog-Upload-Status": "active"})
+        with mock.lock:
+            del mock.uploads[upload_id]
+        mock.count("uploads")
+        file = mock.create_file(self.base_url, session["meta"], bytes(session["data"]))
+        self.send(200, {"file": file}, {"X-Goog-Upload-Status": "final"})
+
+
+def add_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument("--latency", type=float, default=1.0, help="mean generate_content latency in seconds")
+    parser.add_argument("--jitter", type=float, default=0.5, help="latency varies uniformly by +- this fraction")
+    parser.add_argument("--error_rate", type=float, default=0.0, help="fraction of generate_content calls failing with 503")
+    parser.add_argument("--throttle_every", type=float, default=0.0, help="start a 429 burst every N seconds (0: never)")
+    parser.add_argument("--throttle_duration", type=float, default=0.0, help="length of each 429 burst in seconds")
+    parser.add_argument("--retry_delay", type=float, default=2.0, help="retry delay sent with the 429s")
+    parser.add_argument("--processing_delay", type=float, default=1.0, help="seconds an uploaded video stays PROCESSING")
+    parser.add_argument("--upload_mbps", type=float, default=0.0, help="simulated upload bandwidth (0: unlimited)")
+    parser.add_argument("--batch_delay", type=float, default=5.0, help="seconds until a batch job succeeds")
+    parser.add_argument("--answers", default="A,B", help="answers drawn at random")
+    parser.add_argument("--seed", type=int, default=0)
+
+
+def start_server(args, host: str = "127.0.0.1", port: int = 0):
+    """Serve in a background thread, returns (server, mock state, base url)."""
+    mock = MockGemini(
+        latency=args.latency,
+        jitter=args.jitter,
+        error_rate=args.error_rate,
+        throttle_every=args.throttle_every,
+        throttle_duration=args.throttle_duration,
+        retry_delay=args.retry_delay,
+        processing_delay=args.processing_delay,
+        upload_mbps=args.upload_mbps,
+        batch_delay=args.batch_delay,
+        answers=args.answers,
+        seed=args.seed,
+    )
+    handler = type("MockHandler", (Handler,), {"mock": mock})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, mock, f"http://{host}:{server.server_address[1]}"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local stand-in for the Gemini API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    add_arguments(parser)
+    args = parser.parse_args()
+    server, _, url = start_server(args, args.host, args.port)
+    print(f"Mock Gemini API on {url}, use base_url={url}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
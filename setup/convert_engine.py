@@ -0,0 +1,118 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+# All rights reserved.
+#
+# This source code is licensed under the license found in the
+# LICENSE file in the root directory of this source tree.
+
+import json
+import os
+import shutil
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from tqdm import tqdm
+
+# Shared conversion engine for the setup scripts.
+#
+# Jobs run in a process pool sized to the machine. A marker file is written under
+# `.convert/<name>/` once a job has finished, so an interrupted run resumes with
+# only the unfinished jobs. Failures are collected into `<name>_failures.json`
+# next to the markers instead of being printed and forgotten.
+#
+# Jobs that rewrite a file the user may replace by hand (re-downloading a source
+# without going through `manifest.py --repair`) pass a `stamp_fn`: the marker
+# then records the size and mtime of the finished file and only counts while
+# the file still matches, so a replaced file is converted again.
+
+MARKER_ROOT = '.convert'
+
+
+def _marker_path(name, job_id):
+    return os.path.join(MARKER_ROOT, name, job_id.replace('/', '__') + '.done')
+
+
+def file_stamp(path):
+    """Size and mtime of a file, '' if it does not exist."""
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return ''
+    return f'{st.st_size} {st.st_mtime_ns}'
+
+
+def is_done(name, job_id, stamp=None):
+    """Whether the job has a marker, and one recording `stamp` if given."""
+    marker_path = _marker_path(name, job_id)
+    if not os.path.exists(marker_path):
+        return False
+    if stamp is None:
+        return True
+    with open(marker_path) as f:
+        return f.read() == stamp
+
+
+def mark_done(name, job_id, stamp=''):
+    os.makedirs(os.path.join(MARKER_ROOT, name), exist_ok=True)
+    with open(_marker_path(name, job_id), 'w') as f:
+        f.write(stamp)
+
+
+def write_failure_report(name, failures):
+    """Write `{job_id: failure}` to `.convert/<name>_failures.json`."""
+    os.makedirs(MARKER_ROOT, exist_ok=True)
+    report_path = os.path.join(MARKER_ROOT, f'{name}_failures.json')
+    with open(report_path, 'w') as f:
+        json.dump(failures, f, indent=2)
+    if failures:
+        print(f'{name}: {len(failures)} conversions failed, see {report_path}')
+
+
+def clear_marker(name, job_id):
+    """Forget a finished job so that the next run converts it again."""
+    if is_done(name, job_id):
+        os.remove(_marker_path(name, job_id))
+
+
+def clear_markers(name):
+    """Forget every finished job of a conversion."""
+    shutil.rmtree(os.path.join(MARKER_ROOT, name), ignore_errors=True)
+
+
+def describe_failure(e):
+    return {'error': f'{type(e).__name__}: {e}', 'traceback': traceback.format_exc()}
+
+
+def _run_job(convert_fn, args):
+    try:
+        convert_fn(*args)
+        return None
+    except Exception as e:
+        return describe_failure(e)
+
+
+def run_conversions(name, jobs, convert_fn, num_workers=None, stamp_fn=None):
+    """Run `convert_fn(*args)` for every `(job_id, args)` in `jobs` that is not done yet.
+
+    `convert_fn` must be a module level function so it can be sent to the workers.
+    With `stamp_fn`, `stamp_fn(*args)` is recorded once a job succeeds and a job
+    only counts as done while it still returns the same stamp.
+    Returns the list of failed job ids.
+    """
+    os.makedirs(os.path.join(MARKER_ROOT, name), exist_ok=True)
+    stamp = (lambda args: stamp_fn(*args)) if stamp_fn else (lambda args: None)
+    todo = [(job_id, args) for job_id, args in jobs if not is_done(name, job_id, stamp(args))]
+    print(f'{name}: {len(jobs) - len(todo)} of {len(jobs)} already converted, {len(todo)} to go')
+
+    failures = {}
+    with ProcessPoolExecutor(max_workers=num_workers or os.cpu_count()) as executor:
+        futures = {executor.submit(_run_job, convert_fn, args): (job_id, args) for job_id, args in todo}
+        for future in tqdm(as_completed(futures), total=len(futures), desc=name):
+            job_id, args = futures[future]
+            failure = future.result()
+            if failure is None:
+                mark_done(name, job_id, stamp(args) or '')
+            else:
+                failures[job_id] = failure
+
+    write_failure_report(name, failures)
+    return list(failures)
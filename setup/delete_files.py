@@ -5,21 +5,16 @@
 # LICENSE file in the root directory of this source tree.
 
 import sys
-import json
 import os
 
+from extract_members import wanted_files
+
+# Remove the videos of a fully extracted source that the benchmark does not use.
+# The download targets extract only the needed members (extract_members.py).
+
 source = sys.argv[1]
 
-test = json.load(open('../test.json', 'r'))
-video_ids = []
-for x in test:
-    if x['source'] == source:
-        if source == 'ssv2':
-            video_ids.append(x['video_id1'] + '.webm')
-            video_ids.append(x['video_id2'] + '.webm')
-        else:
-            video_ids.append(x['video_id1'] + '.mp4')
-            video_ids.append(x['video_id2'] + '.mp4')
+video_ids = wanted_files(source)
 
 for file in os.listdir(f'{source}'):
     if file not in video_ids:
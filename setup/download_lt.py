@@ -4,23 +4,55 @@
 # This source code is licensed under the license found in the
 # LICENSE file in the root directory of this source tree.
 
+import argparse
 import os
 import json
+import sys
+import numpy as np
 import tensorflow as tf
 import tensorflow_datasets as tfds
-from PIL import Image
+from moviepy.editor import ImageSequenceClip
 from tqdm import tqdm
 from concurrent.futures import ThreadPoolExecutor
 
+from convert_engine import describe_failure, is_done, mark_done, write_failure_report
+from video_profile import get_profile, write_clip
+
+# Streams the benchmark's Language Table episodes from TFDS and encodes each one
+# straight into `<output_folder>/video_<id>.mp4`, without intermediate JPEGs.
+# Episodes are split over `num_slices` by id so that several processes or
+# machines can share the work; finished videos are recorded with the conversion
+# markers and skipped on the next run. `--check` exits non-zero until every
+# slice has finished, so the download stamp is only written once all are done.
+
 def decode_inst(inst):
     """Utility to decode encoded language instruction"""
     return bytes(inst[np.where(inst != 0)].tolist()).decode("utf-8")
 
-def save_frame(frame, global_video_id, i):
-    """Save a single frame as an image."""
-    Image.fromarray(frame).save(f'language_table/video_{global_video_id}_frame_{i}.jpg')
+def encode_episode(frames, video_path, fps):
+    """Encode the RGB frames of one episode into an mp4."""
+    tmp_path = video_path[:-4] + '.tmp.mp4'
+    write_clip(ImageSequenceClip(frames, fps=fps), tmp_path, get_profile(), threads=1, logger=None)
+    os.replace(tmp_path, video_path)
+
+def benchmark_ids():
+    """Language Table episode ids used by the benchmark."""
+    benchmark = json.load(open('../test.json', 'r'))
+    ids = set()
+    for x in benchmark:
+        if x['source'] == 'language_table':
+            ids.add(int(x['video_id1'].split('_')[1]))
+            ids.add(int(x['video_id2'].split('_')[1]))
+    return ids
+
+def check_all_slices():
+    """True once the episodes of every slice are encoded."""
+    remaining = [i for i in benchmark_ids() if not is_done('language_table', f'video_{i}')]
+    if remaining:
+        print(f'{len(remaining)} Language Table episodes still to encode by other slices')
+    return not remaining
 
-def process_slice(slice_index, num_slices):
+def process_slice(slice_index, num_slices, output_folder='language_table', fps=5, max_pending=8):
     DATASET_VERSION = '0.0.1'
     DATASET_NAME = 'language_table'  # CHANGEME: change this to load another dataset.
 
@@ -36,22 +68,24 @@ def process_slice(slice_index, num_slices):
         'language_table_separate_oracle_sim': 'gs://gresearch/robotics/language_table_separate_oracle_sim',
     }
 
+    os.makedirs(output_folder, exist_ok=True)
+
+    ids = benchmark_ids()
+
+    # This slice's share of the episodes, minus the ones finished by an earlier run
+    slice_ids = sorted(ids)[slice_index::num_slices]
+    todo = [i for i in slice_ids if not is_done('language_table', f'video_{i}')]
+    print(f'Slice {slice_index}/{num_slices}: {len(slice_ids) - len(todo)} of {len(slice_ids)} episodes already encoded')
+    if not todo:
+        return []
+
     dataset_path = os.path.join(dataset_directories[DATASET_NAME], DATASET_VERSION)
     builder = tfds.builder_from_directory(dataset_path)
     builder.download_and_prepare()
     episode_ds = builder.as_dataset(split='train')
 
-    captions = {}
-
-    benchmark = json.load(open('../test.json', 'r'))
-    ids = set()
-    for x in benchmark:
-        if x['source'] == 'language_table':
-            ids.add(int(x['video_id1'].split('_')[1]))
-            ids.add(int(x['video_id2'].split('_')[1]))
-
     # Convert the set of IDs to a TensorFlow constant for efficient comparison
-    ids_tensor = tf.constant(list(ids), dtype=tf.int64)
+    ids_tensor = tf.constant(todo, dtype=tf.int64)
 
     # Filter the dataset to only include episodes with IDs in the `ids` set
     def filter_fn(idx, _):
@@ -60,26 +94,46 @@ def process_slice(slice_index, num_slices):
     filtered_ds = episode_ds.enumerate().filter(filter_fn)
 
     print('START DOWNLOAD')
+    failures = {}
+    pending = {}
+
+    def collect(done_futures):
+        for future in done_futures:
+            job_id = pending.pop(future)
+            try:
+                future.result()
+                mark_done('language_table', job_id)
+            except Exception as e:
+                failures[job_id] = describe_failure(e)
+
+    # Encoding overlaps with reading the next episodes, with at most `max_pending`
+    # decoded episodes held in memory
     with ThreadPoolExecutor() as executor:
-        for local_video_id, episode in tqdm(filtered_ds):
+        for local_video_id, episode in tqdm(filtered_ds, total=len(todo)):
             global_video_id = local_video_id.numpy()
-            frames = []
-            for i, step in enumerate(episode['steps'].as_numpy_iterator()):
-                frame = step['observation']['rgb']
-                frames.append(frame)
-                # Save each frame as an image in parallel
-                executor.submit(save_frame, frame, global_video_id, i)
+            job_id = f'video_{global_video_id}'
+            frames = [step['observation']['rgb'] for step in episode['steps'].as_numpy_iterator()]
+            video_path = os.path.join(output_folder, f'{job_id}.mp4')
+            pending[executor.submit(encode_episode, frames, video_path, fps)] = job_id
+            if len(pending) >= max_pending:
+                collect([next(iter(pending))])
+        collect(list(pending))
 
-            # Decode the instruction
-            # instruction = decode_inst(step['observation']['instruction'])
-            # captions[f'video_{global_video_id}'] = instruction
-
-            # Save captions to a JSON file
-            # with open(f'captions_{slice_index}.json', 'w')
+    write_failure_report(f'language_table_{slice_index}', failures)
+    return list(failures)
 
 
 if __name__ == '__main__':
-    slice_index = 0
-    num_slices = 1
-
-    process_slice(slice_index, num_slices)
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--slice_index', type=int, default=0)
+    parser.add_argument('--num_slices', type=int, default=1)
+    parser.add_argument('--output_folder', default='language_table')
+    parser.add_argument('--fps', type=int, default=5)
+    parser.add_argument('--check', action='store_true', help='only check that all slices are done')
+    args = parser.parse_args()
+
+    if args.check:
+        sys.exit(0 if check_all_slices() else 1)
+
+    failed = process_slice(args.slice_index, args.num_slices, args.output_folder, args.fps)
+    sys.exit(1 if failed else 0)
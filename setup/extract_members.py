@@ -0,0 +1,109 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+# All rights reserved.
+#
+# This source code is licensed under the license found in the
+# LICENSE file in the root directory of this source tree.
+
+import argparse
+import json
+import os
+import shutil
+import sys
+import tarfile
+import zipfile
+
+# Extract only the videos of one source that the benchmark uses, instead of
+# unpacking the full archive and deleting the rest afterwards.
+#
+# Zip archives are filtered through their central directory, tar archives
+# (including `-` for a tar stream on stdin) are streamed and matching members are
+# written as they go by. Members are matched on their file name and written flat
+# into `--dest`. An archive without any of the benchmark's file names is an error
+# rather than a reason to unpack everything.
+#
+#   python3 extract_members.py pt valid_videos.zip --dest pt
+#   { unzip -p part-00; unzip -p part-01; } | python3 extract_members.py ssv2 - --dest ssv2
+
+
+def wanted_files(source, test_file='../test.json'):
+    """File names of the `source` videos listed in the benchmark."""
+    test = json.load(open(test_file, 'r'))
+    ext = '.webm' if source == 'ssv2' else '.mp4'
+    video_ids = set()
+    for x in test:
+        if x['source'] == source:
+            video_ids.add(x['video_id1'] + ext)
+            video_ids.add(x['video_id2'] + ext)
+    return video_ids
+
+
+def _copy_member(src, dest_path):
+    tmp_path = dest_path + '.part'
+    with open(tmp_path, 'wb') as dst:
+        shutil.copyfileobj(src, dst, length=1024 * 1024)
+    os.replace(tmp_path, dest_path)
+
+
+def extract_zip(archive, wanted, dest):
+    found = set()
+    with zipfile.ZipFile(archive) as zf:
+        for info in zf.infolist():
+            name = os.path.basename(info.filename)
+            if info.is_dir() or name not in wanted:
+                continue
+            with zf.open(info) as src:
+                _copy_member(src, os.path.join(dest, name))
+            found.add(name)
+    return found
+
+
+def extract_tar(archive, wanted, dest):
+    found = set()
+    fileobj = sys.stdin.buffer if archive == '-' else None
+    name = None if archive == '-' else archive
+    with tarfile.open(name=name, fileobj=fileobj, mode='r|*') as tf:
+        for member in tf:
+            name = os.path.basename(member.name)
+            if not member.isfile() or name not in wanted:
+                continue
+            _copy_member(tf.extractfile(member), os.path.join(dest, name))
+            found.add(name)
+            # Everything we need has gone by, no need to read the rest of the stream
+            if found >= wanted:
+                break
+    return found
+
+
+def extract_members(source, archive, dest, wanted=None):
+    if wanted is None:
+        wanted = wanted_files(source)
+    os.makedirs(dest, exist_ok=True)
+    is_zip = archive != '-' and zipfile.is_zipfile(archive)
+    extract = extract_zip if is_zip else extract_tar
+
+    found = extract(archive, wanted, dest)
+    missing = sorted(wanted - found)
+    if not found:
+        sys.exit(
+            f'{source}: none of the {len(wanted)} benchmark videos found by name in {archive},'
+            f' expected names like {missing[:5]}'
+        )
+    print(f'{source}: extracted {len(found)} of {len(wanted)} benchmark videos into {dest}')
+    if missing:
+        print(f'{source}: {len(missing)} videos not found in {archive}: {" ".join(missing)}')
+    return found
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('source')
+    parser.add_argument('archive', help="zip or tar archive, `-` for a tar stream on stdin")
+    parser.add_argument('--dest', default=None)
+    parser.add_argument('--members', default=None, help="file with one file name per line, overrides test.json")
+    args = parser.parse_args()
+
+    wanted = None
+    if args.members:
+        with open(args.members) as f:
+            wanted = {line.strip() for line in f if line.strip()}
+    extract_members(args.source, args.archive, args.dest or args.source, wanted)
@@ -0,0 +1,229 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+# All rights reserved.
+#
+# This source code is licensed under the license found in the
+# LICENSE file in the root directory of this source tree.
+
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import cv2
+from tqdm import tqdm
+
+from convert_engine import clear_marker, clear_markers
+
+# Checksummed manifest of the downloaded videos (run from the `videos` folder).
+#
+#   python3 manifest.py build             # record path, size, sha256, fps, frames, ...
+#   python3 manifest.py verify [--full]   # report missing / truncated / corrupt videos
+#   python3 manifest.py verify --repair   # queue only the broken entries for make
+#
+# `verify` checks sizes and that the first and last frame decode; `--full` also
+# re-hashes every file. `--repair` removes the broken files, clears their
+# conversion markers, writes `.repair/<source>.txt` with the members to extract
+# again and removes the stamp of their source, so that `make download_videos`
+# re-fetches or re-converts only what is broken. Sources built video by video
+# from conversion markers (MARKER_SOURCES) need no member list: clearing the
+# marker is what makes their target redo the video. Sources unpacked from a single
+# archive without member selection (WHOLE_SOURCES) cannot be patched in place:
+# their folder and conversion markers are removed and the next run redoes them.
+
+MANIFEST_FILE = 'manifest.json'
+REPAIR_DIR = '.repair'
+
+SOURCES = ['pt', 'ssv2', 'language_table', 'intphys', 'inflevel', 'grasp', 'clevrer', 'star', 'vinoground']
+
+# Sources whose Makefile target unpacks and moves the whole archive into place
+WHOLE_SOURCES = {'grasp', 'inflevel', 'vinoground'}
+
+# Sources whose Makefile target converts (intphys) or downloads (language_table)
+# every video that has no conversion marker
+MARKER_SOURCES = {'intphys', 'language_table'}
+
+# Makefile stamp of each source
+STAMPS = {
+    'pt': 'perception_test',
+    'ssv2': 'ssv2',
+    'language_table': 'language_table',
+    'intphys': 'intphys',
+    'inflevel': 'inflevel',
+    'grasp': 'grasp',
+    'clevrer': 'clevrer',
+    'star': 'star',
+    'vinoground': 'vinoground',
+}
+
+
+def sha256sum(path):
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def probe(path):
+    """Stream metadata of a video, raises if its first or last frame cannot be decoded."""
+    cap = cv2.VideoCapture(path)
+    try:
+        if not cap.isOpened():
+            raise IOError('cannot open video')
+        num_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        fps = cap.get(cv2.CAP_PROP_FPS)
+        width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+        height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        ok, _ = cap.read()
+        if not ok or num_frames <= 0:
+            raise IOError('cannot decode first frame')
+        cap.set(cv2.CAP_PROP_POS_FRAMES, num_frames - 1)
+        ok, _ = cap.read()
+        if not ok:
+            raise IOError('cannot decode last frame, file is likely truncated')
+    finally:
+        cap.release()
+    return {
+        'num_frames': num_frames,
+        'fps': fps,
+        'duration': num_frames / fps if fps else 0.0,
+        'width': width,
+        'height': height,
+    }
+
+
+def describe(path):
+    entry = {'size': os.path.getsize(path), 'sha256': sha256sum(path)}
+    entry.update(probe(path))
+    return entry
+
+
+def check(path, expected, full=False):
+    """None if `path` matches its manifest entry, otherwise the reason it does not."""
+    if not os.path.exists(path):
+        return 'missing'
+    if os.path.getsize(path) != expected['size']:
+        return f"size {os.path.getsize(path)} != {expected['size']}"
+    try:
+        info = probe(path)
+    except Exception as e:
+        return f'undecodable: {e}'
+    if info['num_frames'] != expected['num_frames']:
+        return f"{info['num_frames']} frames != {expected['num_frames']}"
+    if full and sha256sum(path) != expected['sha256']:
+        return 'sha256 mismatch'
+    return None
+
+
+def list_videos(sources):
+    paths = []
+    for source in sources:
+        for root, _, files in os.walk(source):
+            for file in files:
+                if file.endswith('.mp4') and not file.endswith('.tmp.mp4'):
+                    paths.append(os.path.join(root, file))
+    return sorted(paths)
+
+
+def _describe_safe(path):
+    try:
+        return path, describe(path), None
+    except Exception as e:
+        return path, None, str(e)
+
+
+def build(sources, num_workers=None):
+    paths = list_videos(sources)
+    videos, errors = {}, {}
+    with ProcessPoolExecutor(max_workers=num_workers) as executor:
+        for path, entry, error in tqdm(executor.map(_describe_safe, paths, chunksize=16), total=len(paths)):
+            if error is None:
+                videos[path] = entry
+            else:
+                errors[path] = error
+    with open(MANIFEST_FILE, 'w') as f:
+        json.dump({'videos': videos}, f, indent=1, sort_keys=True)
+    print(f'Wrote {len(videos)} videos to {MANIFEST_FILE}')
+    for path, error in errors.items():
+        print(f'Not added, {path}: {error}')
+    return videos
+
+
+def _check_safe(args):
+    path, expected, full = args
+    return path, check(path, expected, full)
+
+
+def verify(full=False, num_workers=None):
+    with open(MANIFEST_FILE, 'r') as f:
+        videos = json.load(f)['videos']
+    jobs = [(path, entry, full) for path, entry in videos.items()]
+    broken = {}
+    with ProcessPoolExecutor(max_workers=num_workers) as executor:
+        for path, reason in tqdm(executor.map(_check_safe, jobs, chunksize=16), total=len(jobs)):
+            if reason is not None:
+                broken[path] = reason
+    for path, reason in sorted(broken.items()):
+        print(f'{path}: {reason}')
+    print(f'{len(videos) - len(broken)} of {len(videos)} videos ok, {len(broken)} broken')
+    return broken
+
+
+def repair(broken):
+    """Queue the broken videos so the next `make download_videos` only redoes them."""
+    by_source = {}
+    for path in broken:
+        by_source.setdefault(path.split('/', 1)[0], []).append(path)
+
+    os.makedirs(REPAIR_DIR, exist_ok=True)
+    for source, paths in by_source.items():
+        stamp = os.path.join('..', f'.download.{STAMPS[source]}')
+        if os.path.exists(stamp):
+            os.remove(stamp)
+        if source in WHOLE_SOURCES:
+            # The target would move the fresh copy inside the existing folder
+            shutil.rmtree(source, ignore_errors=True)
+            clear_markers(f'transcode_{source}')
+            print(f'{source}: removed for {len(paths)} broken videos, run `make download_videos` to fetch it again')
+            continue
+        members = []
+        for path in paths:
+            name = os.path.basename(path)
+            if os.path.exists(path):
+                os.remove(path)
+            clear_marker(f'transcode_{source}', path)
+            if source == 'ssv2':
+                # Converted from webm, extract the webm again and re-convert it
+                members.append(name[:-4] + '.webm')
+                clear_marker('ssv2', name[:-4] + '.webm')
+            else:
+                members.append(name)
+            if source == 'intphys':
+                clear_marker('intphys', path[:-4])
+            if source == 'language_table':
+                clear_marker('language_table', name[:-4])
+        if source not in MARKER_SOURCES:
+            with open(os.path.join(REPAIR_DIR, f'{source}.txt'), 'w') as f:
+                f.write('\n'.join(members) + '\n')
+        print(f'{source}: queued {len(members)} videos, run `make download_videos` to repair')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('command', choices=['build', 'verify'])
+    parser.add_argument('--sources', nargs='+', default=SOURCES)
+    parser.add_argument('--full', action='store_true', help='also compare content hashes')
+    parser.add_argument('--repair', action='store_true')
+    parser.add_argument('--num_workers', type=int, default=None)
+    args = parser.parse_args()
+
+    if args.command == 'build':
+        build(args.sources, args.num_workers)
+    else:
+        broken = verify(args.full, args.num_workers)
+        if broken and args.repair:
+            repair(broken)
+        sys.exit(1 if broken else 0)
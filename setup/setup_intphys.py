@@ -6,8 +6,11 @@
 
 import os
 import csv
+import sys
 from moviepy.editor import ImageSequenceClip
-import json
+
+from convert_engine import run_conversions
+from video_profile import get_profile, write_clip
 
 def make_video(path_to_png, out_path):
     os.makedirs(os.path.dirname(out_path), exist_ok=True)
@@ -20,15 +23,22 @@ def make_video(path_to_png, out_path):
 
     clip = ImageSequenceClip(image_files, fps=24)
 
-    clip.write_videofile(out_path + '.mp4', codec='libx264')
+    write_clip(clip, out_path + '.mp4', get_profile(), threads=1, logger=None)
 
-with open('intphys_pairs.csv',newline='') as csvfile:
-    csvreader = csv.DictReader(csvfile,  delimiter=';')
-    for row in csvreader:
-        path1 = f'dev/{row["Property"]}/{"0" if len(row["id"]) == 1 else ""}{row["id"]}/{int(row["Video1"])+1}/scene'
-        path2 = f'dev/{row["Property"]}/{"0" if len(row["id"]) == 1 else ""}{row["id"]}/{int(row["Video2"])+1}/scene'
-        video_id1 = f'intphys/{path1.replace("scene", "").replace("dev", "").replace("/","_")}'[:-1]
-        video_id2 = f'intphys/{path2.replace("scene", "").replace("dev", "").replace("/","_")}'[:-1]
-        make_video(path1, video_id1)
-        make_video(path2, video_id2)
+if __name__ == '__main__':
+    jobs, seen = [], set()
+    with open('intphys_pairs.csv',newline='') as csvfile:
+        csvreader = csv.DictReader(csvfile,  delimiter=';')
+        for row in csvreader:
+            path1 = f'dev/{row["Property"]}/{"0" if len(row["id"]) == 1 else ""}{row["id"]}/{int(row["Video1"])+1}/scene'
+            path2 = f'dev/{row["Property"]}/{"0" if len(row["id"]) == 1 else ""}{row["id"]}/{int(row["Video2"])+1}/scene'
+            video_id1 = f'intphys/{path1.replace("scene", "").replace("dev", "").replace("/","_")}'[:-1]
+            video_id2 = f'intphys/{path2.replace("scene", "").replace("dev", "").replace("/","_")}'[:-1]
+            # The same clip can appear in several pairs, convert it once
+            for path, video_id in [(path1, video_id1), (path2, video_id2)]:
+                if video_id not in seen:
+                    seen.add(video_id)
+                    jobs.append((video_id, (path, video_id)))
 
+    failed = run_conversions('intphys', jobs, make_video)
+    sys.exit(1 if failed else 0)
@@ -4,21 +4,29 @@
 # This source code is licensed under the license found in the
 # LICENSE file in the root directory of this source tree.
 
-from moviepy.editor import VideoFileClip
-import json
+import sys
 import os
 
+from moviepy.editor import VideoFileClip
+
+from convert_engine import run_conversions
+from video_profile import get_profile, write_clip
+
 def convert_webm_to_mp4(input_file, output_file):
-    try:
-        # Load the video file
-        clip = VideoFileClip(input_file)
-        # Write the video file as mp4
-        clip.write_videofile(output_file, codec='libx264')
-        print(f"Conversion successful: {output_file}")
-    except Exception as e:
-        print(f"An error occurred: {e}")
+    # Load the video file
+    clip = VideoFileClip(input_file)
+    # Write the video file as mp4, one encoder thread per worker process
+    write_clip(clip, output_file, get_profile(), threads=1, logger=None)
+    clip.close()
+
+if __name__ == '__main__':
+    jobs = []
+    for x in sorted(os.listdir('ssv2')):
+        if not x.endswith('.webm'):
+            continue
+        path = f'ssv2/{x}'
+        output_file = f'ssv2/{x[:-4]}mp4'
+        jobs.append((x, (path, output_file)))
 
-for x in os.listdir('ssv2'):
-    path = f'ssv2/{x}'
-    output_file = f'ssv2/{x[:-4]}mp4'
-    convert_webm_to_mp4(path, output_file)
+    failed = run_conversions('ssv2', jobs, convert_webm_to_mp4)
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,41 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+# All rights reserved.
+#
+# This source code is licensed under the license found in the
+# LICENSE file in the root directory of this source tree.
+
+import os
+import sys
+
+from convert_engine import file_stamp, run_conversions
+from video_profile import get_profile, transcode
+
+# Re-encode the mp4s of an already downloaded source in place with the selected
+# video profile. A no-op for the default "source" profile.
+
+def transcode_in_place(path):
+    tmp_path = f'{path[:-4]}.tmp.mp4'
+    # One encoder thread per job, the engine already runs one job per core
+    transcode(path, tmp_path, get_profile(), threads=1)
+    os.replace(tmp_path, path)
+
+if __name__ == '__main__':
+    source = sys.argv[1]
+
+    if get_profile() is None:
+        print(f"Keeping {source} videos as downloaded (MVP_VIDEO_PROFILE=source)")
+        sys.exit(0)
+
+    jobs = []
+    for root, _, files in os.walk(source):
+        for file in files:
+            if file.endswith('.mp4') and not file.endswith('.tmp.mp4'):
+                path = os.path.join(root, file)
+                jobs.append((path, (path,)))
+
+    # An interrupted run resumes with the files that have no marker yet. A crash
+    # between replacing a file and writing its marker re-encodes that one file
+    # a second time. Markers record the size and mtime of the transcoded file,
+    # so a file replaced by a fresh download is transcoded again.
+    failed = run_conversions(f'transcode_{source}', sorted(jobs), transcode_in_place, stamp_fn=file_stamp)
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,99 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+# All rights reserved.
+#
+# This source code is licensed under the license found in the
+# LICENSE file in the root directory of this source tree.
+
+import os
+import subprocess
+
+# Encoder profiles for the videos written by the setup scripts.
+#
+# "source" keeps the original behaviour (native resolution, encoder defaults).
+# "eval" targets what the evaluated models consume: frames capped to
+# `max_pixels` (the max_pixels=151200 used for the open models), one H.264 codec
+# for every source, a short fixed keyframe interval so sampling 16 frames turns
+# into cheap keyframe seeks, and the moov atom at the front of the file.
+#
+# Select with MVP_VIDEO_PROFILE=eval (the Makefile passes VIDEO_PROFILE through).
+
+PROFILES = {
+    "source": None,
+    "eval": {
+        "codec": "libx264",
+        "max_pixels": 151200,
+        "gop": 8,
+        "crf": 20,
+        "preset": "medium",
+    },
+}
+
+
+def get_profile(name=None):
+    name = name or os.getenv("MVP_VIDEO_PROFILE", "source")
+    if name not in PROFILES:
+        raise ValueError(f"Unknown video profile {name}, expected one of {list(PROFILES)}")
+    return PROFILES[name]
+
+
+def scale_filter(max_pixels):
+    # Downscale only, keep aspect ratio and even dimensions for yuv420p
+    factor = f"min(1\\,sqrt({max_pixels}/(iw*ih)))"
+    return f"scale=w=trunc(iw*{factor}/2)*2:h=trunc(ih*{factor}/2)*2"
+
+
+def ffmpeg_params(profile):
+    """Output options of a profile, on top of the codec, preset and pixel format."""
+    gop = str(profile["gop"])
+    return [
+        "-vf", scale_filter(profile["max_pixels"]),
+        "-g", gop,
+        "-keyint_min", gop,
+        "-sc_threshold", "0",
+        "-crf", str(profile["crf"]),
+        "-movflags", "+faststart",
+    ]
+
+
+def ffmpeg_binary():
+    try:
+        from moviepy.config import get_setting
+
+        return get_setting("FFMPEG_BINARY")
+    except Exception:
+        return "ffmpeg"
+
+
+def write_clip(clip, out_path, profile, fps=None, threads=None, logger="bar"):
+    """Write a moviepy clip with the given profile (None keeps the defaults)."""
+    if profile is None:
+        clip.write_videofile(
+            out_path, fps=fps, codec="libx264", threads=threads, logger=logger
+        )
+        return
+    clip.write_videofile(
+        out_path,
+        fps=fps,
+        codec=profile["codec"],
+        preset=profile["preset"],
+        audio=False,
+        threads=threads,
+        logger=logger,
+        ffmpeg_params=ffmpeg_params(profile),
+    )
+
+
+def transcode(input_file, output_file, profile, threads=None):
+    """Re-encode a video file with ffmpeg using the given profile."""
+    cmd = [
+        ffmpeg_binary(), "-y", "-loglevel", "error",
+        "-i", input_file,
+        "-an",
+        "-c:v", profile["codec"],
+        "-preset", profile["preset"],
+        "-pix_fmt", "yuv420p",
+    ] + ffmpeg_params(profile)
+    if threads is not None:
+        cmd += ["-threads", str(threads)]
+    cmd += [output_file]
+    subprocess.run(cmd, check=True)
@@ -0,0 +1,142 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+# All rights reserved.
+#
+# This source code is licensed under the license found in the
+# LICENSE file in the root directory of this source tree.
+
+import math
+import os
+from typing import Dict
+
+from loguru import logger as eval_logger
+
+from lmms_eval.tasks.mvp.pairs import SKIPPED_PREDICTION, UNEVALUATED_PREDICTION, get_pair_id
+from lmms_eval.tasks.mvp.utils import extract_pred, get_answer_idx, get_candidates
+
+# Adaptive sequential evaluation for model wrappers, for checkpoint sweeps that
+# only need pair_accuracy to within a few points.
+#
+# With MVP_DOC_ORDER=adaptive each rank walks a seeded random order of pairs,
+# stratified by data source (see doc_order.adaptive_order); every task (one per
+# subset) is stopped on its own. A wrapper asks `should_stop` before each doc
+# and records every answer. Once the Wilson interval of a task's pair accuracy
+# is narrower than MVP_ADAPTIVE_CI_WIDTH points (default 5), or
+# MVP_ADAPTIVE_MAX_PAIRS pairs were evaluated, its remaining pairs get
+# UNEVALUATED_PREDICTION and are left out of the metrics.
+#
+# Ranks decide independently on their own share of the pairs: the target width
+# of a rank is scaled by sqrt(world_size) and the budget divided by world_size,
+# so the merged interval lands close to the target.
+#
+# Stops happen at whole-pair boundaries. The decision is taken for the first doc
+# of a pair that is asked about and recorded per pair, so the other video gets
+# the same answer wherever and whenever a wrapper schedules it (gemini_api asks
+# when it schedules a request, before earlier answers are in). Pairs that odd
+# rank sizes split across ranks (`pair_split`, see doc_order) are never stopped,
+# since the two ranks could decide differently; mvp_pair_accuracy also drops any
+# pair that still ends up half evaluated.
+
+Z_95 = 1.959964
+
+
+def wilson_interval(correct: int, n: int, z: float = Z_95):
+    """(low, high) in % of a binomial proportion."""
+    if n == 0:
+        return 0.0, 100.0
+    p = correct / n
+    denominator = 1 + z**2 / n
+    center = (p + z**2 / (2 * n)) / denominator
+    half = z * math.sqrt(p * (1 - p) / n + z**2 / (4 * n**2)) / denominator
+    return 100 * max(center - half, 0.0), 100 * min(center + half, 1.0)
+
+
+class _TaskState:
+    def __init__(self):
+        # pair id -> whether the pair was stopped
+        self.decisions: Dict[str, bool] = {}
+        self.answers: Dict[str, list] = {}
+        self.num_pairs = 0
+        self.pair_correct = 0
+        self.stopped = False
+        self.unevaluated = 0
+
+
+class AdaptiveStop:
+    stopped_prediction = UNEVALUATED_PREDICTION
+
+    def __init__(self, target_width: float, max_pairs: int = 0, min_pairs: int = 30, world_size: int = 1):
+        self.target_width = target_width * math.sqrt(world_size)
+        self.max_pairs = math.ceil(max_pairs / world_size) if max_pairs > 0 else 0
+        self.min_pairs = min_pairs
+        self.tasks: Dict[str, _TaskState] = {}
+
+    def _converged(self, state: _TaskState) -> bool:
+        if self.max_pairs and state.num_pairs >= self.max_pairs:
+            return True
+        if state.num_pairs < self.min_pairs:
+            return False
+        low, high = wilson_interval(state.pair_correct, state.num_pairs)
+        return high - low <= self.target_width
+
+    def should_stop(self, task: str, doc) -> bool:
+        state = self.tasks.setdefault(task, _TaskState())
+        pair_id = get_pair_id(doc["video_id"])
+        if pair_id in state.decisions:
+            stop = state.decisions[pair_id]
+            state.unevaluated += int(stop)
+            return stop
+        if doc.get("pair_split", False):
+            state.decisions[pair_id] = False
+            return False
+        if not state.stopped and self._converged(state):
+            state.stopped = True
+            low, high = wilson_interval(state.pair_correct, state.num_pairs)
+            eval_logger.info(
+                f"Adaptive stop of {task} after {state.num_pairs} pairs:"
+                f" pair_accuracy {100 * state.pair_correct / max(state.num_pairs, 1):.2f} [{low:.2f}, {high:.2f}]"
+            )
+        state.decisions[pair_id] = state.stopped
+        state.unevaluated += int(state.stopped)
+        return state.stopped
+
+    def is_stopped(self, task: str, doc) -> bool:
+        """Whether `doc` would be left out as of now, without deciding its pair."""
+        state = self.tasks.get(task)
+        if state is None or doc.get("pair_split", False):
+            return False
+        pair_id = get_pair_id(doc["video_id"])
+        if pair_id in state.decisions:
+            return state.decisions[pair_id]
+        return state.stopped or self._converged(state)
+
+    def record(self, task: str, doc, prediction: str):
+        state = self.tasks.setdefault(task, _TaskState())
+        pair_id = get_pair_id(doc["video_id"])
+        correct = prediction != SKIPPED_PREDICTION and extract_pred(prediction) == get_answer_idx(
+            doc, get_candidates(doc)
+        )
+        answers = state.answers.setdefault(pair_id, [])
+        answers.append(correct)
+        if len(answers) == 2:
+            state.num_pairs += 1
+            state.pair_correct += int(all(answers))
+            del state.answers[pair_id]
+
+    def log_summary(self):
+        for task, state in self.tasks.items():
+            low, high = wilson_interval(state.pair_correct, state.num_pairs)
+            eval_logger.info(
+                f"{task}: {state.num_pairs} pairs evaluated, {state.unevaluated} docs left out,"
+                f" pair_accuracy {100 * state.pair_correct / max(state.num_pairs, 1):.2f} [{low:.2f}, {high:.2f}]"
+            )
+
+
+def get_adaptive_stop() -> AdaptiveStop:
+    if os.getenv("MVP_DOC_ORDER") != "adaptive":
+        eval_logger.warning("Adaptive stopping expects MVP_DOC_ORDER=adaptive to walk a stratified pair order")
+    return AdaptiveStop(
+        target_width=float(os.getenv("MVP_ADAPTIVE_CI_WIDTH", "5")),
+        max_pairs=int(os.getenv("MVP_ADAPTIVE_MAX_PAIRS", "0")),
+        min_pairs=int(os.getenv("MVP_ADAPTIVE_MIN_PAIRS", "30")),
+        world_size=int(os.getenv("WORLD_SIZE", "1")),
+    )
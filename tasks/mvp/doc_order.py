@@ -0,0 +1,307 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+# All rights reserved.
+#
+# This source code is licensed under the license found in the
+# LICENSE file in the root directory of this source tree.
+
+import atexit
+import json
+import os
+import random
+import sys
+import time
+from typing import List, Optional
+
+from loguru import logger as eval_logger
+
+from lmms_eval.tasks.mvp.pairs import get_pair_id, get_source, group_pairs
+from lmms_eval.tasks.mvp.video_index import get_video_metadata
+
+# Doc orderings applied in process_docs (selected with MVP_DOC_ORDER).
+#
+# lmms-eval gives rank r the docs at positions r, r + world_size, r + 2 *
+# world_size, ... of the processed dataset. To control what each rank sees and in
+# which order, an ordering builds one list of doc indices per rank and
+# interleaves them into that stride pattern.
+#
+# Reordered datasets get a `doc_index` column with the original position of each
+# doc, which the leaderboard file is sorted by, and a `pair_split` column. Pairs
+# are placed whole on one rank wherever the rank sizes allow, but a rank with an
+# odd number of docs must hold half of some pair (2250 docs on 8 ranks leave 3
+# pairs split). Docs of split pairs are flagged, and pair early exit and
+# adaptive stopping always run them.
+#
+# MVP_DOC_ORDER=cost balances the predicted work of the ranks, see cost_order.
+# MVP_DOC_ORDER=adaptive walks a seeded, source-stratified random order of pairs
+# for adaptive evaluation, see adaptive_order.
+# MVP_SCHEDULE_REPORT_DIR=<dir> makes each rank write its predicted and measured
+# load there, `python -m lmms_eval.tasks.mvp.doc_order <dir>` compares them.
+
+# Cost of a doc that does not depend on its video (prompt, generation), in the
+# unit of doc_cost: decoded megapixels
+DOC_OVERHEAD = 50.0
+
+
+def get_world_size() -> int:
+    return int(os.getenv("WORLD_SIZE", "1"))
+
+
+def rank_capacities(num_docs: int, world_size: int) -> List[int]:
+    """Number of docs each rank receives under stride sharding."""
+    return [len(range(rank, num_docs, world_size)) for rank in range(world_size)]
+
+
+def interleave_ranks(rank_lists: List[List[int]]) -> List[int]:
+    """Global order such that rank r is handed exactly `rank_lists[r]`, in order."""
+    world_size = len(rank_lists)
+    order = [None] * sum(len(docs) for docs in rank_lists)
+    for rank, docs in enumerate(rank_lists):
+        for k, idx in enumerate(docs):
+            order[k * world_size + rank] = idx
+    return order
+
+
+def fill_ranks(groups: List[List[int]], rank_order: List[int], world_size: int, num_docs: int) -> List[List[int]]:
+    """Place each group of docs on one rank, following `rank_order` per group.
+
+    `rank_order[i]` is the preferred rank of `groups[i]`. Ranks have the fixed
+    capacities of stride sharding; a group that no longer fits whole anywhere is
+    split over the ranks with room left.
+    """
+    capacity = rank_capacities(num_docs, world_size)
+    rank_lists = [[] for _ in range(world_size)]
+    leftovers = []
+    for group, preferred in zip(groups, rank_order):
+        candidates = [preferred] + [r for r in range(world_size) if r != preferred]
+        rank = next((r for r in candidates if capacity[r] >= len(group)), None)
+        if rank is None:
+            leftovers.extend(group)
+            continue
+        rank_lists[rank].extend(group)
+        capacity[rank] -= len(group)
+    for idx in leftovers:
+        rank = max(range(world_size), key=lambda r: capacity[r])
+        rank_lists[rank].append(idx)
+        capacity[rank] -= 1
+    return rank_lists
+
+
+def pair_order(docs, world_size: int) -> List[int]:
+    """Pairs dealt round-robin, both videos on the same rank and back to back,
+    except for the few pairs odd rank sizes force apart (see split_pairs)."""
+    groups = list(group_pairs(docs).values())
+    rank_order = [i % world_size for i in range(len(groups))]
+    rank_lists = fill_ranks(groups, rank_order, world_size, len(docs))
+    return interleave_ranks(rank_lists)
+
+
+def doc_cost(metadata: Optional[dict]) -> Optional[float]:
+    """Predicted cost of a doc from the manifest metadata of its video."""
+    if metadata is None:
+        return None
+    return metadata["num_frames"] * metadata["width"] * metadata["height"] / 1e6 + DOC_OVERHEAD
+
+
+def doc_costs(docs) -> List[float]:
+    costs = [doc_cost(get_video_metadata(doc["video_path"])) for doc in docs]
+    known = [c for c in costs if c is not None]
+    if len(known) < len(costs):
+        eval_logger.warning(
+            f"{len(costs) - len(known)} of {len(costs)} videos have no metadata,"
+            " assuming an average cost for them (run `make manifest`)"
+        )
+    fallback = sum(known) / len(known) if known else 1.0
+    return [fallback if c is None else c for c in costs]
+
+
+def balance_ranks(groups: List[List[int]], costs: List[float], world_size: int, num_docs: int):
+    """Longest processing time first under the stride sharding capacities.
+
+    Groups are placed whole, most expensive first, on the least loaded rank that
+    still has room for them. Returns the doc indices and predicted load per rank.
+    """
+    capacity = rank_capacities(num_docs, world_size)
+    rank_lists = [[] for _ in range(world_size)]
+    loads = [0.0] * world_size
+    group_costs = [sum(costs[idx] for idx in group) for group in groups]
+    leftovers = []
+    for i in sorted(range(len(groups)), key=lambda i: -group_costs[i]):
+        fits = [r for r in range(world_size) if capacity[r] >= len(groups[i])]
+        if not fits:
+            leftovers.extend(groups[i])
+            continue
+        rank = min(fits, key=lambda r: loads[r])
+        rank_lists[rank].extend(groups[i])
+        capacity[rank] -= len(groups[i])
+        loads[rank] += group_costs[i]
+    for idx in leftovers:
+        rank = min((r for r in range(world_size) if capacity[r] > 0), key=lambda r: loads[r])
+        rank_lists[rank].append(idx)
+        capacity[rank] -= 1
+        loads[rank] += costs[idx]
+    return rank_lists, loads
+
+
+def imbalance(loads: List[float]) -> float:
+    """Slowest rank over the mean, 1.0 is a perfect balance."""
+    mean = sum(loads) / len(loads)
+    return max(loads) / mean if mean > 0 else 1.0
+
+
+def cost_order(docs, world_size: int) -> List[int]:
+    """Pairs kept on one rank where rank sizes allow, back to back, with the
+    predicted cost balanced across ranks."""
+    groups = list(group_pairs(docs).values())
+    costs = doc_costs(docs)
+    rank_lists, loads = balance_ranks(groups, costs, world_size, len(docs))
+    dataset_loads = [sum(costs[rank::world_size]) for rank in range(world_size)]
+    eval_logger.info(
+        f"Cost-balanced {len(docs)} docs over {world_size} ranks, predicted imbalance"
+        f" {imbalance(loads):.3f} (dataset order: {imbalance(dataset_loads):.3f})"
+    )
+    track_ranks(loads)
+    return interleave_ranks(rank_lists)
+
+
+def adaptive_order(docs, world_size: int, seed: int = 0) -> List[int]:
+    """Seeded random order of pairs, stratified by data source, pairs back to back.
+
+    Pairs of each source are shuffled and spread evenly over the sequence, so
+    any prefix of it (and of each rank's share) has close to the source mix of
+    the full set. The same seed gives the same order on every run.
+    """
+    rng = random.Random(seed)
+    by_source = {}
+    for pair_id, group in group_pairs(docs).items():
+        by_source.setdefault(get_source(docs[group[0]]["video_path"]), []).append((pair_id, group))
+    keyed = []
+    for source in sorted(by_source):
+        pairs = sorted(by_source[source])
+        rng.shuffle(pairs)
+        offset = rng.random()
+        keyed.extend(((k + offset) / len(pairs), group) for k, (_, group) in enumerate(pairs))
+    groups = [group for _, group in sorted(keyed, key=lambda item: item[0])]
+    rank_order = [i % world_size for i in range(len(groups))]
+    return interleave_ranks(fill_ranks(groups, rank_order, world_size, len(docs)))
+
+
+class RankTimer:
+    """Wall time of this rank from its first to its last visual, against the predicted load."""
+
+    def __init__(self, rank: int, predicted_loads: List[float], report_dir: Optional[str]):
+        self.rank = rank
+        self.predicted_loads = predicted_loads
+        self.report_dir = report_dir
+        self.first = None
+        self.last = None
+        self.count = 0
+
+    def tick(self):
+        now = time.perf_counter()
+        if self.first is None:
+            self.first = now
+        self.last = now
+        self.count += 1
+
+    def report(self):
+        if self.first is None:
+            return
+        elapsed = self.last - self.first
+        predicted = self.predicted_loads[self.rank]
+        eval_logger.info(
+            f"Rank {self.rank}: {self.count} docs in {elapsed:.1f}s,"
+            f" predicted share {predicted / sum(self.predicted_loads):.3f}"
+        )
+        if self.report_dir is not None:
+            os.makedirs(self.report_dir, exist_ok=True)
+            with open(os.path.join(self.report_dir, f"rank_{self.rank}.json"), "w") as f:
+                json.dump(
+                    {
+                        "rank": self.rank,
+                        "predicted_load": predicted,
+                        "predicted_loads": self.predicted_loads,
+                        "num_docs": self.count,
+                        "elapsed": elapsed,
+                    },
+                    f,
+                )
+
+
+_rank_timer = None
+
+
+def track_ranks(predicted_loads: List[float]):
+    global _rank_timer
+    if _rank_timer is None:
+        rank = int(os.getenv("RANK", "0"))
+        _rank_timer = RankTimer(rank, predicted_loads, os.getenv("MVP_SCHEDULE_REPORT_DIR"))
+        atexit.register(_rank_timer.report)
+    else:
+        # Several mvp tasks in one run, their docs are processed one after the other
+        _rank_timer.predicted_loads = [a + b for a, b in zip(_rank_timer.predicted_loads, predicted_loads)]
+
+
+def track_doc():
+    """Called for every doc handed to the model."""
+    if _rank_timer is not None:
+        _rank_timer.tick()
+
+
+def split_pairs(docs, order: List[int], world_size: int) -> List[bool]:
+    """For each position of `order`, whether the pair of that doc is spread over several ranks."""
+    rank_of = {idx: position % world_size for position, idx in enumerate(order)}
+    split = set()
+    for pair_id, group in group_pairs(docs).items():
+        if len({rank_of[idx] for idx in group}) > 1:
+            split.add(pair_id)
+    pair_ids = [get_pair_id(doc["video_id"]) for doc in docs]
+    return [pair_ids[idx] in split for idx in order]
+
+
+def order_docs(dataset, mode: str):
+    """Reorder a datasets.Dataset according to MVP_DOC_ORDER."""
+    if mode in ("", "dataset"):
+        return dataset
+    docs = dataset.select_columns(["video_id", "video_path"]).to_list()
+    if mode == "pairs":
+        order = pair_order(docs, get_world_size())
+    elif mode == "cost":
+        order = cost_order(docs, get_world_size())
+    elif mode == "adaptive":
+        order = adaptive_order(docs, get_world_size(), int(os.getenv("MVP_ADAPTIVE_SEED", "0")))
+    else:
+        raise ValueError(f"Unknown MVP_DOC_ORDER {mode}")
+    if "doc_index" not in dataset.column_names:
+        dataset = dataset.add_column("doc_index", list(range(len(dataset))))
+    dataset = dataset.select(order)
+    pair_split = split_pairs(docs, order, get_world_size())
+    if any(pair_split):
+        eval_logger.info(
+            f"{sum(pair_split)} docs of pairs split across ranks by odd rank sizes,"
+            " pair early exit and adaptive stopping always run them"
+        )
+    if "pair_split" in dataset.column_names:
+        dataset = dataset.remove_columns("pair_split")
+    return dataset.add_column("pair_split", pair_split)
+
+
+def summarize_report(report_dir: str):
+    reports = []
+    for filename in sorted(os.listdir(report_dir)):
+        if filename.startswith("rank_") and filename.endswith(".json"):
+            with open(os.path.join(report_dir, filename), "r") as f:
+                reports.append(json.load(f))
+    if not reports:
+        sys.exit(f"No rank reports in {report_dir}")
+    predicted = reports[0]["predicted_loads"]
+    for report in reports:
+        print(
+            f"rank {report['rank']}: {report['num_docs']} docs, {report['elapsed']:.1f}s,"
+            f" predicted load {report['predicted_load']:.0f}"
+        )
+    print(f"predicted imbalance {imbalance(predicted):.3f}")
+    print(f"actual imbalance {imbalance([r['elapsed'] for r in reports]):.3f}")
+
+
+if __name__ == "__main__":
+    summarize_report(sys.argv[1])
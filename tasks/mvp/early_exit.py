@@ -0,0 +1,41 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+# All rights reserved.
+#
+# This source code is licensed under the license found in the
+# LICENSE file in the root directory of this source tree.
+
+from lmms_eval.tasks.mvp.pairs import SKIPPED_PREDICTION, get_pair_id
+from lmms_eval.tasks.mvp.utils import extract_pred, get_answer_idx, get_candidates
+
+# Pair-only early exit for model wrappers.
+#
+# A pair only counts for pair_accuracy when both of its videos are answered
+# correctly, so once one video is wrong the other inference cannot change the
+# headline metric. With MVP_DOC_ORDER=pairs both videos of a pair reach the same
+# rank back to back; a wrapper records each answer and returns
+# SKIPPED_PREDICTION instead of running inference for the second video when the
+# first one was wrong. The few pairs that odd rank sizes split across ranks
+# (flagged `pair_split` by doc_order) are always run, since the other rank cannot
+# see the first answer. compute_metrics keeps pair_accuracy exact and reports
+# single_accuracy over the answered docs only.
+
+
+class PairEarlyExit:
+    skipped_prediction = SKIPPED_PREDICTION
+
+    def __init__(self):
+        self.failed_pairs = set()
+        self.skipped = 0
+
+    def should_skip(self, doc) -> bool:
+        if doc.get("pair_split", False):
+            return False
+        if get_pair_id(doc["video_id"]) in self.failed_pairs:
+            self.skipped += 1
+            return True
+        return False
+
+    def record(self, doc, prediction: str):
+        answer_pred = extract_pred(prediction)
+        if answer_pred != get_answer_idx(doc, get_candidates(doc)):
+            self.failed_pairs.add(get_pair_id(doc["video_id"]))
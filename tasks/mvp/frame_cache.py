@@ -0,0 +1,315 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+# All rights reserved.
+#
+# This source code is licensed under the license found in the
+# LICENSE file in the root directory of this source tree.
+
+import argparse
+import atexit
+import fcntl
+import hashlib
+import json
+import os
+from contextlib import contextmanager
+from multiprocessing import resource_tracker, shared_memory
+from typing import Callable, Optional
+
+import numpy as np
+from loguru import logger as eval_logger
+
+from lmms_eval.tasks.mvp.video_utils import load_video_frames
+
+# Decoded-frame cache shared by all accelerate ranks on a node.
+#
+# Lookups go RAM (named shared memory segments, LRU across ranks) -> local disk
+# (memory-mapped uint8 .npy files) -> decode. Entries are keyed by the video file
+# (path, size, mtime) and the sampling config (num_frames, max_pixels), so a rerun
+# of the same model config only decodes videos it has never seen.
+#
+# Enable by exporting MVP_FRAME_CACHE_DIR (a local disk path, not NFS);
+# MVP_FRAME_CACHE_RAM_GB bounds the shared RAM tier (default 8). The RAM tier is
+# namespaced by user and cache directory, so runs of other users (or pointed at
+# another cache) never see each other's segments; MVP_FRAME_CACHE_NAMESPACE
+# isolates a single run. The ledger is only rewritten when a segment is added or
+# evicted: lookups read it lock-free (it is replaced atomically) and mark
+# recency by touching the segment, which is what the LRU evicts by. Entries whose
+# segment is gone (e.g. /dev/shm was cleaned) are dropped on lookup.
+#
+# Segments outlive the run on purpose, so the next run starts warm. Release them
+# with `python -m lmms_eval.tasks.mvp.frame_cache clear` (or `make
+# clear_frame_cache`) under the same MVP_FRAME_CACHE_DIR.
+
+SHM_DIR = "/dev/shm"
+
+
+def _untrack(shm):
+    # Segments must outlive the rank that created them; stop the resource tracker
+    # from unlinking them when that process exits.
+    try:
+        resource_tracker.unregister(shm._name, "shared_memory")
+    except Exception:
+        pass
+
+
+class FrameCache:
+    def __init__(
+        self,
+        cache_dir: str,
+        ram_bytes: int = 8 * 1024**3,
+        namespace: Optional[str] = None,
+    ):
+        self.cache_dir = cache_dir
+        self.ram_bytes = ram_bytes
+        self.namespace = namespace or default_namespace(cache_dir)
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self.ledger_path = os.path.join(SHM_DIR, f"{self.namespace}.ledger.json")
+        self.lock_path = os.path.join(SHM_DIR, f"{self.namespace}.lock")
+        self.stats = {"ram_hits": 0, "disk_hits": 0, "decodes": 0}
+        self._ledger_stat = None
+        self._ledger_entries = {}
+
+    @staticmethod
+    def make_key(video_path: str, num_frames: int, max_pixels: Optional[int]) -> str:
+        st = os.stat(video_path)
+        ident = f"{os.path.abspath(video_path)}|{st.st_size}|{st.st_mtime_ns}|{num_frames}|{max_pixels}"
+        return hashlib.sha1(ident.encode()).hexdigest()
+
+    def _disk_path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key[:2], f"{key}.npy")
+
+    def _shm_name(self, key: str) -> str:
+        return f"{self.namespace}_{key[:24]}"
+
+    def _segment_exists(self, entry: dict) -> bool:
+        return os.path.exists(os.path.join(SHM_DIR, entry["shm"]))
+
+    def _last_used(self, entry: dict) -> float:
+        try:
+            return os.stat(os.path.join(SHM_DIR, entry["shm"])).st_mtime
+        except FileNotFoundError:
+            return float("-inf")
+
+    def _read_ledger(self) -> dict:
+        """Current ledger, re-read only when another rank replaced the file."""
+        try:
+            st = os.stat(self.ledger_path)
+        except FileNotFoundError:
+            return {}
+        ledger_stat = (st.st_ino, st.st_mtime_ns, st.st_size)
+        if ledger_stat != self._ledger_stat:
+            with open(self.ledger_path, "r") as f:
+                self._ledger_entries = json.load(f)
+            self._ledger_stat = ledger_stat
+        return self._ledger_entries
+
+    @contextmanager
+    def _ledger(self):
+        """Exclusive access to the cross-rank ledger, written back on exit."""
+        with open(self.lock_path, "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                ledger = dict(self._read_ledger())
+                yield ledger
+                tmp_path = f"{self.ledger_path}.{os.getpid()}"
+                with open(tmp_path, "w") as f:
+                    json.dump(ledger, f)
+                os.replace(tmp_path, self.ledger_path)
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _read_ram(self, key: str) -> Optional[np.ndarray]:
+        entry = self._read_ledger().get(key)
+        if entry is None:
+            return None
+        try:
+            shm = shared_memory.SharedMemory(name=entry["shm"])
+        except FileNotFoundError:
+            self._drop_missing(key)
+            return None
+        _untrack(shm)
+        # Recency for the LRU, so hits never rewrite the ledger
+        try:
+            os.utime(os.path.join(SHM_DIR, entry["shm"]))
+        except OSError:
+            pass
+        try:
+            view = np.ndarray(entry["shape"], dtype=np.uint8, buffer=shm.buf)
+            frames = view.copy()
+            del view
+        finally:
+            shm.close()
+        return frames
+
+    def _drop_missing(self, key: str):
+        """Forget a ledger entry whose segment was removed behind the cache's back."""
+        with self._ledger() as ledger:
+            entry = ledger.get(key)
+            if entry is not None and not self._segment_exists(entry):
+                del ledger[key]
+
+    def _write_ram(self, key: str, frames: np.ndarray):
+        if frames.nbytes == 0 or frames.nbytes > self.ram_bytes:
+            return
+        entry = self._read_ledger().get(key)
+        if entry is not None and self._segment_exists(entry):
+            return
+        name = self._shm_name(key)
+        with self._ledger() as ledger:
+            if key in ledger and self._segment_exists(ledger[key]):
+                return
+            try:
+                shm = shared_memory.SharedMemory(
+                    name=name, create=True, size=frames.nbytes
+                )
+            except FileExistsError:
+                return
+            _untrack(shm)
+            np.ndarray(frames.shape, dtype=np.uint8, buffer=shm.buf)[:] = frames
+            shm.close()
+            ledger[key] = {"shm": name, "shape": list(frames.shape), "nbytes": frames.nbytes}
+
+            used = sum(e["nbytes"] for e in ledger.values())
+            if used <= self.ram_bytes:
+                return
+            # Least recently used first, the new segment was just written
+            for old_key in sorted(ledger, key=lambda k: self._last_used(ledger[k])):
+                if used <= self.ram_bytes:
+                    break
+                old = ledger.pop(old_key)
+                used -= old["nbytes"]
+                try:
+                    evicted = shared_memory.SharedMemory(name=old["shm"])
+                    _untrack(evicted)
+                    evicted.close()
+                    evicted.unlink()
+                except FileNotFoundError:
+                    pass
+
+    def _read_disk(self, key: str) -> Optional[np.ndarray]:
+        path = self._disk_path(key)
+        if not os.path.exists(path):
+            return None
+        try:
+            return np.load(path, mmap_mode="r")
+        except (ValueError, OSError):
+            # Truncated spill file from an interrupted writer, drop and re-decode
+            os.remove(path)
+            return None
+
+    def _write_disk(self, key: str, frames: np.ndarray):
+        path = self._disk_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        out = np.lib.format.open_memmap(
+            tmp_path, mode="w+", dtype=np.uint8, shape=frames.shape
+        )
+        out[:] = frames
+        out.flush()
+        del out
+        os.replace(tmp_path, path)
+
+    def get(
+        self,
+        video_path: str,
+        num_frames: int = 16,
+        max_pixels: Optional[int] = None,
+        loader: Callable = load_video_frames,
+    ) -> np.ndarray:
+        """Return (T, H, W, 3) uint8 frames for a video under a sampling config."""
+        key = self.make_key(video_path, num_frames, max_pixels)
+
+        frames = self._read_ram(key)
+        if frames is not None:
+            self.stats["ram_hits"] += 1
+            return frames
+
+        frames = self._read_disk(key)
+        if frames is not None:
+            self.stats["disk_hits"] += 1
+            self._write_ram(key, frames)
+            return frames
+
+        frames = loader(video_path, num_frames, max_pixels)
+        self.stats["decodes"] += 1
+        self._write_disk(key, frames)
+        self._write_ram(key, frames)
+        return frames
+
+    def clear_ram(self):
+        """Unlink every shared memory segment owned by this cache namespace."""
+        with self._ledger() as ledger:
+            for entry in ledger.values():
+                try:
+                    shm = shared_memory.SharedMemory(name=entry["shm"])
+                    _untrack(shm)
+                    shm.close()
+                    shm.unlink()
+                except FileNotFoundError:
+                    pass
+            ledger.clear()
+
+    def remove(self):
+        """Release the RAM tier and its ledger, the disk tier is kept."""
+        self.clear_ram()
+        for path in (self.ledger_path, self.lock_path):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+
+def default_namespace(cache_dir: str) -> str:
+    """Shared memory prefix for this user and cache directory (MVP_FRAME_CACHE_NAMESPACE overrides)."""
+    namespace = os.getenv("MVP_FRAME_CACHE_NAMESPACE")
+    if namespace:
+        return namespace
+    cache_hash = hashlib.sha1(os.path.abspath(cache_dir).encode()).hexdigest()[:8]
+    return f"mvp_frames_{os.getuid()}_{cache_hash}"
+
+
+def frame_sampling():
+    """(num_frames, max_pixels) of the frames `mvp_doc_to_visual` hands over from the cache."""
+    max_pixels = os.getenv("MVP_FRAME_CACHE_MAX_PIXELS")
+    return int(os.getenv("MVP_FRAME_CACHE_NUM_FRAMES", "16")), int(max_pixels) if max_pixels else None
+
+
+_frame_cache = None
+
+
+def get_frame_cache() -> Optional[FrameCache]:
+    """Process-wide cache configured from the environment, None if disabled."""
+    global _frame_cache
+    cache_dir = os.getenv("MVP_FRAME_CACHE_DIR")
+    if not cache_dir:
+        return None
+    if _frame_cache is None:
+        ram_gb = float(os.getenv("MVP_FRAME_CACHE_RAM_GB", "8"))
+        _frame_cache = FrameCache(cache_dir, ram_bytes=int(ram_gb * 1024**3))
+        atexit.register(
+            lambda: eval_logger.info(f"mvp frame cache stats: {_frame_cache.stats}")
+        )
+    return _frame_cache
+
+
+def load_frames(
+    video_path: str, num_frames: int = 16, max_pixels: Optional[int] = None
+) -> np.ndarray:
+    """Entry point for model wrappers: decoded frames, through the cache if enabled."""
+    cache = get_frame_cache()
+    if cache is None:
+        return load_video_frames(video_path, num_frames, max_pixels)
+    return cache.get(video_path, num_frames, max_pixels)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Manage the shared memory tier of the mvp frame cache")
+    parser.add_argument("command", choices=["clear"])
+    parser.add_argument("--cache_dir", default=os.getenv("MVP_FRAME_CACHE_DIR"), help="default: MVP_FRAME_CACHE_DIR")
+    args = parser.parse_args()
+    if not args.cache_dir:
+        parser.error("set MVP_FRAME_CACHE_DIR or pass --cache_dir")
+
+    cache = FrameCache(args.cache_dir)
+    num_segments = len(cache._read_ledger())
+    cache.remove()
+    print(f"Released {num_segments} shared memory segments of {cache.namespace}")
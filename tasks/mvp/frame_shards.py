@@ -0,0 +1,257 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+# All rights reserved.
+#
+# This source code is licensed under the license found in the
+# LICENSE file in the root directory of this source tree.
+
+import argparse
+import json
+import os
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+from tqdm import tqdm
+
+from lmms_eval.tasks.mvp.pair_dedup import DEFAULT_TOLERANCE, dedupe_pair_frames
+from lmms_eval.tasks.mvp.pairs import SUBSETS, get_pair_id
+from lmms_eval.tasks.mvp.video_utils import load_video_frames
+
+# Packed frame shards: frames pre-sampled for one config (num_frames, max_pixels)
+# and written back to back into large `shard_XXXXX.bin` files, with both videos of
+# a pair stored next to each other. `index.json` maps video_path to
+# (shard, offset, shape) and video_id to video_path. Readers memory-map the shards
+# and hand out zero-copy views, so evaluation does sequential reads of a handful
+# of files instead of opening and seeking thousands of mp4s.
+
+INDEX_FILE = "index.json"
+ALIGN = 4096
+
+
+def _shard_name(shard_idx: int) -> str:
+    return f"shard_{shard_idx:05d}.bin"
+
+
+def collect_videos(
+    dataset_path: str = "facebook/minimal_video_pairs",
+    subsets: Iterable[str] = SUBSETS,
+    splits: Iterable[str] = ("full", "mini"),
+) -> List[dict]:
+    """Unique (video_path, video_id) entries of the benchmark, pairs adjacent."""
+    import datasets
+
+    by_pair = {}
+    for subset in subsets:
+        for split in splits:
+            ds = datasets.load_dataset(dataset_path, subset, split=split)
+            for video_path, video_id in zip(ds["video_path"], ds["video_id"]):
+                pair = by_pair.setdefault(get_pair_id(video_id), {})
+                pair[video_path] = video_id
+    videos = []
+    for pair_id in sorted(by_pair):
+        for video_path, video_id in sorted(by_pair[pair_id].items(), key=lambda x: x[1]):
+            videos.append({"video_path": video_path, "video_id": video_id})
+    return videos
+
+
+def _iter_pairs(videos: List[dict]):
+    """Consecutive runs of videos sharing a pair id."""
+    group = []
+    for video in videos:
+        if group and get_pair_id(video["video_id"]) != get_pair_id(group[0]["video_id"]):
+            yield group
+            group = []
+        group.append(video)
+    if group:
+        yield group
+
+
+def pack_shards(
+    videos: List[dict],
+    video_root: str,
+    output_dir: str,
+    num_frames: int = 16,
+    max_pixels: Optional[int] = None,
+    shard_bytes: int = 4 * 1024**3,
+    dedupe: bool = False,
+    dedupe_tolerance: float = DEFAULT_TOLERANCE,
+):
+    """Write shards for `videos` (ordered with pairs adjacent, see collect_videos).
+
+    With `dedupe`, frames that match between the two videos of a pair (see
+    pair_dedup) are stored once and each video records the indices of its frames
+    in that block; `index["dedupe"]` counts the frames sampled and stored.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    index = {
+        "config": {"num_frames": num_frames, "max_pixels": max_pixels},
+        "shards": [],
+        "videos": {},
+        "video_ids": {},
+        "missing": [],
+    }
+    if dedupe:
+        index["dedupe"] = {"tolerance": dedupe_tolerance, "frames": 0, "stored": 0}
+    shard_idx, offset = 0, 0
+    shard_file = open(os.path.join(output_dir, _shard_name(shard_idx)), "wb")
+    index["shards"].append(_shard_name(shard_idx))
+
+    def write_block(frames):
+        nonlocal offset
+        start = offset
+        shard_file.write(frames.tobytes())
+        offset += frames.nbytes
+        padding = -offset % ALIGN
+        shard_file.write(b"\0" * padding)
+        offset += padding
+        return start
+
+    pbar = tqdm(total=len(videos), desc="Packing frames")
+    for group in _iter_pairs(videos):
+        frames_by_path = {}
+        for video in group:
+            video_path = video["video_path"]
+            index["video_ids"][video["video_id"]] = video_path
+            if video_path in index["videos"] or video_path in frames_by_path:
+                continue
+            try:
+                frames = load_video_frames(os.path.join(video_root, video_path), num_frames, max_pixels)
+            except Exception as e:
+                index["missing"].append({"video_path": video_path, "error": str(e)})
+                continue
+            if len(frames) == 0:
+                index["missing"].append({"video_path": video_path, "error": "no frames decoded"})
+                continue
+            frames_by_path[video_path] = frames
+        pbar.update(len(group))
+        if not frames_by_path:
+            continue
+
+        if dedupe:
+            unique, frame_index = dedupe_pair_frames(frames_by_path, dedupe_tolerance)
+            index["dedupe"]["frames"] += sum(len(frames) for frames in frames_by_path.values())
+            index["dedupe"]["stored"] += len(unique)
+            blocks = [(unique, list(frames_by_path))]
+        else:
+            blocks = [(frames, [path]) for path, frames in frames_by_path.items()]
+
+        # Keep a pair within one shard, roll over before writing its first block
+        pair_bytes = sum(block.nbytes for block, _ in blocks)
+        if offset > 0 and offset + pair_bytes > shard_bytes:
+            shard_file.close()
+            shard_idx, offset = shard_idx + 1, 0
+            shard_file = open(os.path.join(output_dir, _shard_name(shard_idx)), "wb")
+            index["shards"].append(_shard_name(shard_idx))
+
+        for block, video_paths in blocks:
+            start = write_block(block)
+            for video_path in video_paths:
+                entry = {"shard": shard_idx, "offset": start, "shape": list(block.shape)}
+                if dedupe:
+                    entry["frame_index"] = frame_index[video_path].tolist()
+                index["videos"][video_path] = entry
+    pbar.close()
+
+    shard_file.close()
+    with open(os.path.join(output_dir, INDEX_FILE), "w") as f:
+        json.dump(index, f)
+    return index
+
+
+class FrameShards:
+    """Read-only view over a packed shard directory."""
+
+    def __init__(self, shard_dir: str):
+        self.shard_dir = shard_dir
+        with open(os.path.join(shard_dir, INDEX_FILE), "r") as f:
+            self.index = json.load(f)
+        self.config = self.index["config"]
+        self._maps: Dict[int, np.memmap] = {}
+
+    def _shard(self, shard_idx: int) -> np.memmap:
+        if shard_idx not in self._maps:
+            path = os.path.join(self.shard_dir, self.index["shards"][shard_idx])
+            self._maps[shard_idx] = np.memmap(path, dtype=np.uint8, mode="r")
+        return self._maps[shard_idx]
+
+    def __contains__(self, video_path: str) -> bool:
+        return video_path in self.index["videos"]
+
+    def get(self, video_path: str) -> np.ndarray:
+        """(T, H, W, 3) uint8 view of a packed video.
+
+        Zero-copy, unless the video was deduplicated against its pair and its
+        frames are not a contiguous run of the shared block.
+        """
+        entry = self.index["videos"][video_path]
+        shape = entry["shape"]
+        nbytes = int(np.prod(shape))
+        start = entry["offset"]
+        block = self._shard(entry["shard"])[start : start + nbytes].reshape(shape)
+        frame_index = entry.get("frame_index")
+        if frame_index is None:
+            return block
+        if not frame_index:
+            raise ValueError(f"{video_path} was packed without frames in {self.shard_dir}, please repack")
+        first = frame_index[0]
+        if frame_index == list(range(first, first + len(frame_index))):
+            return block[first : first + len(frame_index)]
+        return block[frame_index]
+
+    def get_by_video_id(self, video_id: str) -> np.ndarray:
+        return self.get(self.index["video_ids"][video_id])
+
+
+_frame_shards = None
+
+
+def get_frame_shards() -> Optional[FrameShards]:
+    """Process-wide reader for the shard directory in MVP_FRAME_SHARDS, None if unset."""
+    global _frame_shards
+    shard_dir = os.getenv("MVP_FRAME_SHARDS")
+    if not shard_dir:
+        return None
+    if _frame_shards is None:
+        _frame_shards = FrameShards(shard_dir)
+    return _frame_shards
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Pack pre-sampled mvp frames into shards")
+    parser.add_argument("--video_root", default=str(Path().absolute().parent / "videos"))
+    parser.add_argument("--output_dir", default=str(Path().absolute().parent / "frame_shards"))
+    parser.add_argument("--num_frames", type=int, default=16)
+    parser.add_argument("--max_pixels", type=int, default=None)
+    parser.add_argument("--shard_gb", type=float, default=4)
+    parser.add_argument(
+        "--dedupe", action="store_true", help="store frames shared within a pair once"
+    )
+    parser.add_argument(
+        "--dedupe_tolerance",
+        type=float,
+        default=DEFAULT_TOLERANCE,
+        help="largest mean absolute difference (uint8 levels) of any 8x8 region for frames to count as shared",
+    )
+    args = parser.parse_args()
+
+    videos = collect_videos()
+    index = pack_shards(
+        videos,
+        args.video_root,
+        args.output_dir,
+        num_frames=args.num_frames,
+        max_pixels=args.max_pixels,
+        shard_bytes=int(args.shard_gb * 1024**3),
+        dedupe=args.dedupe,
+        dedupe_tolerance=args.dedupe_tolerance,
+    )
+    print(
+        f"Packed {len(index['videos'])} videos into {len(index['shards'])} shards"
+        f" at {args.output_dir}, {len(index['missing'])} missing"
+    )
+    if args.dedupe:
+        stats = index["dedupe"]
+        print(
+            f"Dedupe stored {stats['stored']} of {stats['frames']} sampled frames"
+            f" ({1 - stats['stored'] / max(stats['frames'], 1):.1%} shared)"
+        )
@@ -0,0 +1,76 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+# All rights reserved.
+#
+# This source code is licensed under the license found in the
+# LICENSE file in the root directory of this source tree.
+
+from typing import Dict, Tuple
+
+import numpy as np
+
+# Minimal pairs (IntPhys, InfLevel, GRASP, CLEVRER, ...) show the same scene for
+# long stretches before the event that differs, but each video is a separately
+# encoded lossy mp4, so decoded frames of the shared stretch almost never match
+# bit for bit. Frames are compared at the same sampled position instead, and
+# frame t of a later video reuses frame t of the first one when every
+# `window` x `window` region of the two frames (at any offset) is within
+# `tolerance` (mean absolute difference in uint8 levels, about the noise of one
+# re-encode). The difference a pair is about is often a small object, so a
+# whole-frame average would hide it; one differing region keeps the frame. Clips
+# of different length are sampled at different times and simply do not match.
+# pack_shards records how many frames were shared, so the hit rate is visible
+# per run.
+#
+# Only storage is shared: frames are rebuilt per video, and reusing encoder
+# features across a pair is left to the model wrapper, none of which in this
+# repo encodes frames itself.
+
+DEFAULT_TOLERANCE = 3.0
+WINDOW = 8
+
+
+def window_differences(reference: np.ndarray, frames: np.ndarray, window: int = WINDOW) -> np.ndarray:
+    """(T, H - window + 1, W - window + 1) mean absolute difference, over the
+    channels, of every `window` x `window` region (the whole frame if smaller)."""
+    diff = np.abs(reference.astype(np.int16) - frames.astype(np.int16)).mean(axis=-1)
+    wy, wx = min(window, diff.shape[1]), min(window, diff.shape[2])
+    # Sliding sums through an integral image
+    integral = np.zeros((diff.shape[0], diff.shape[1] + 1, diff.shape[2] + 1))
+    integral[:, 1:, 1:] = diff.cumsum(axis=1).cumsum(axis=2)
+    sums = integral[:, wy:, wx:] - integral[:, :-wy, wx:] - integral[:, wy:, :-wx] + integral[:, :-wy, :-wx]
+    return sums / (wy * wx)
+
+
+def shared_positions(
+    reference: np.ndarray, frames: np.ndarray, tolerance: float = DEFAULT_TOLERANCE, window: int = WINDOW
+) -> np.ndarray:
+    """Mask of the positions where every region of `frames` matches `reference` within `tolerance`."""
+    if reference.shape != frames.shape or len(frames) == 0:
+        return np.zeros(len(frames), dtype=bool)
+    return window_differences(reference, frames, window).reshape(len(frames), -1).max(axis=1) <= tolerance
+
+def dedupe_pair_frames(
+    frames_by_video: Dict[str, np.ndarray], tolerance: float = DEFAULT_TOLERANCE
+) -> Tuple[np.ndarray, Dict[str, np.ndarray]]:
+    """Store the frames of a pair once.
+
+    Returns the unique frames and, per video, the indices into them that rebuild
+    the clip (`unique[index]`), exactly for the first video and within
+    `tolerance` for the others.
+    """
+    videos = list(frames_by_video)
+    reference = frames_by_video[videos[0]]
+    unique = list(reference)
+    index = {videos[0]: np.arange(len(reference), dtype=np.int64)}
+    for video_id in videos[1:]:
+        frames = frames_by_video[video_id]
+        shared = shared_positions(reference, frames, tolerance)
+        video_index = []
+        for t, frame in enumerate(frames):
+            if shared[t]:
+                video_index.append(t)
+            else:
+                video_index.append(len(unique))
+                unique.append(frame)
+        index[video_id] = np.asarray(video_index, dtype=np.int64)
+    return np.stack(unique), index
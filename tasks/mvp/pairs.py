@@ -0,0 +1,43 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+# All rights reserved.
+#
+# This source code is licensed under the license found in the
+# LICENSE file in the root directory of this source tree.
+
+from collections import OrderedDict
+from typing import Dict, Iterable, List
+
+SUBSETS = [
+    "human_object_interactions",
+    "robot_object_interactions",
+    "intuitive_physics",
+    "temporal_reasoning",
+]
+
+
+def get_pair_id(video_id: str) -> str:
+    """Both videos of a minimal pair share the video_id prefix before the last `_`."""
+    return video_id.rsplit("_", 1)[0]
+
+
+def get_source(video_path: str) -> str:
+    """Data source folder of a video, e.g. `ssv2/123.mp4` -> `ssv2`."""
+    return video_path.split("/", 1)[0]
+
+
+def group_pairs(docs: Iterable[dict]) -> Dict[str, List[int]]:
+    """Map pair id -> doc indices, in order of first appearance."""
+    pairs = OrderedDict()
+    for idx, doc in enumerate(docs):
+        pairs.setdefault(get_pair_id(doc["video_id"]), []).append(idx)
+    return pairs
+
+
+# Prediction recorded for a doc whose inference was skipped because the other
+# video of its pair was already answered incorrectly (see early_exit.py)
+SKIPPED_PREDICTION = "<mvp_pair_early_exit>"
+
+# Prediction recorded for a doc left out by adaptive evaluation once the
+# estimate of its task was precise enough (see adaptive.py), excluded from the
+# metrics
+UNEVALUATED_PREDICTION = "<mvp_adaptive_stop>"
@@ -0,0 +1,158 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+# All rights reserved.
+#
+# This source code is licensed under the license found in the
+# LICENSE file in the root directory of this source tree.
+
+import atexit
+import bisect
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING, Callable, List, Optional
+
+import numpy as np
+from loguru import logger as eval_logger
+
+from lmms_eval.tasks.mvp.frame_cache import load_frames
+
+if TYPE_CHECKING:
+    from concurrent.futures import Future
+
+# Opt-in background decoding of the visuals for the next docs of this rank.
+#
+# lmms-eval shards the docs of each task across ranks with a stride of world_size,
+# so once the docs of a task are registered (through process_docs) the prefetcher
+# knows which docs this rank will see next. Registration hands every doc a
+# position that process_docs stores in the PREFETCH_COLUMN column, so tasks
+# sharing video ids (mvp and mvp_mini) never collide, and the lookahead stops at
+# the end of the task. While the model generates for one doc, a worker pool
+# decodes the following `depth` docs of its task. At most `depth` decoded results are held at
+# once: entries outside the lookahead window are dropped and no new work is
+# submitted while the window is full, so memory stays bounded even when the model
+# wrapper reorders requests.
+#
+# Enabled with MVP_PREFETCH=<depth>; MVP_PREFETCH_WORKERS, MVP_PREFETCH_NUM_FRAMES
+# and MVP_PREFETCH_MAX_PIXELS configure the pool and the sampling config.
+
+PREFETCH_COLUMN = "prefetch_position"
+
+
+class VisualPrefetcher:
+    def __init__(
+        self,
+        load_fn: Callable[[str], np.ndarray],
+        depth: int = 4,
+        num_workers: int = 2,
+        rank: int = 0,
+        world_size: int = 1,
+        log_every: int = 500,
+    ):
+        self.load_fn = load_fn
+        self.depth = depth
+        self.rank = rank
+        self.world_size = world_size
+        self.log_every = log_every
+        self.pool = ThreadPoolExecutor(max_workers=num_workers, thread_name_prefix="mvp_prefetch")
+        self.lock = threading.Lock()
+        self.video_paths: List[str] = []
+        self.task_starts: List[int] = []
+        self.pending: "OrderedDict[int, Future]" = OrderedDict()
+        self.stats = {"docs": 0, "hits": 0, "misses": 0, "wait_s": 0.0}
+
+    def register(self, video_paths: List[str]) -> List[int]:
+        """Register the docs of one task in the order lmms-eval will shard them,
+        returning their positions."""
+        with self.lock:
+            start = len(self.video_paths)
+            self.video_paths.extend(video_paths)
+            self.task_starts.append(start)
+            return list(range(start, len(self.video_paths)))
+
+    def _task_end(self, position: int) -> int:
+        task = bisect.bisect_right(self.task_starts, position)
+        return self.task_starts[task] if task < len(self.task_starts) else len(self.video_paths)
+
+    def _refill(self, position: int):
+        # Lookahead window: the next `depth` docs of the task this rank sees after `position`
+        end = self._task_end(position)
+        targets = [
+            position + step * self.world_size
+            for step in range(1, self.depth + 1)
+            if position + step * self.world_size < end
+        ]
+        for stale in [pos for pos in self.pending if pos not in targets]:
+            self.pending.pop(stale).cancel()
+        for pos in targets:
+            if len(self.pending) >= self.depth:
+                break
+            if pos not in self.pending:
+                self.pending[pos] = self.pool.submit(self.load_fn, self.video_paths[pos])
+
+    def get(self, doc: dict, video_path: str) -> np.ndarray:
+        start = time.perf_counter()
+        with self.lock:
+            position = doc.get(PREFETCH_COLUMN)
+            future = self.pending.pop(position, None) if position is not None else None
+        if future is not None and not future.cancelled():
+            frames = future.result()
+            self.stats["hits"] += 1
+        else:
+            frames = self.load_fn(video_path)
+            self.stats["misses"] += 1
+        self.stats["wait_s"] += time.perf_counter() - start
+        self.stats["docs"] += 1
+
+        if position is not None:
+            with self.lock:
+                self._refill(position)
+        if self.log_every and self.stats["docs"] % self.log_every == 0:
+            self.log_stats()
+        return frames
+
+    def log_stats(self):
+        docs = max(self.stats["docs"], 1)
+        eval_logger.info(
+            f"[rank {self.rank}] visual prefetch: {self.stats['docs']} docs,"
+            f" {self.stats['hits']} prefetched, {self.stats['misses']} decoded inline,"
+            f" model waited {self.stats['wait_s']:.1f}s on visuals"
+            f" ({1000 * self.stats['wait_s'] / docs:.1f} ms/doc)"
+        )
+
+    def shutdown(self):
+        with self.lock:
+            for future in self.pending.values():
+                future.cancel()
+            self.pending.clear()
+        self.pool.shutdown(wait=False)
+
+
+_prefetcher = None
+
+
+def get_prefetcher() -> Optional[VisualPrefetcher]:
+    """Process-wide prefetcher configured from the environment, None if disabled."""
+    global _prefetcher
+    depth = int(os.getenv("MVP_PREFETCH", "0"))
+    if depth <= 0:
+        return None
+    if _prefetcher is None:
+        num_frames = int(os.getenv("MVP_PREFETCH_NUM_FRAMES", "16"))
+        max_pixels = os.getenv("MVP_PREFETCH_MAX_PIXELS")
+        max_pixels = int(max_pixels) if max_pixels else None
+        _prefetcher = VisualPrefetcher(
+            lambda path: load_frames(path, num_frames, max_pixels),
+            depth=depth,
+            num_workers=int(os.getenv("MVP_PREFETCH_WORKERS", "2")),
+            rank=int(os.getenv("RANK", "0")),
+            world_size=int(os.getenv("WORLD_SIZE", "1")),
+        )
+
+        def _close():
+            _prefetcher.log_stats()
+            _prefetcher.shutdown()
+
+        atexit.register(_close)
+    return _prefetcher
@@ -0,0 +1,105 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+# All rights reserved.
+#
+# This source code is licensed under the license found in the
+# LICENSE file in the root directory of this source tree.
+
+from collections import OrderedDict
+from typing import List, Optional
+
+import numpy as np
+import pandas as pd
+
+from lmms_eval.tasks.mvp.pairs import get_pair_id
+
+# Column-oriented view of the per-doc result dicts returned by
+# `mvp_process_results`, built in one pass and shared by every aggregation over
+# the same results: single and pair accuracy, the leaderboard file and the
+# bootstrap statistics all read the same arrays.
+#
+# lmms-eval hands each metric its own list of dicts, so the reduction is
+# memoized on a fingerprint of the values the metrics depend on (video id,
+# rating, prediction, skipped). Building the fingerprint only touches values
+# already in the dicts, the pair id extraction and grouping are done once.
+
+CACHE_SIZE = 8
+
+
+class ResultColumns:
+    def __init__(self, results: List[dict]):
+        self.video_ids = [r["video_id"] for r in results]
+        self.rating = np.fromiter((r["rating"] == 1 for r in results), dtype=bool, count=len(results))
+        self.skipped = np.fromiter(
+            (r.get("skipped", False) for r in results), dtype=bool, count=len(results)
+        )
+        # -1 when no answer could be parsed from the prediction
+        self.prediction_idx = np.fromiter(
+            (int(r["prediction_idx"]) if r["prediction_idx"] is not False else -1 for r in results),
+            dtype=np.int8,
+            count=len(results),
+        )
+        self.pair_ids, self.pair_index = np.unique(
+            [get_pair_id(v) for v in self.video_ids], return_inverse=True
+        )
+        self.pair_index = self.pair_index.reshape(-1)
+        self.pair_size = np.bincount(self.pair_index, minlength=len(self.pair_ids))
+        self.pair_correct = np.bincount(
+            self.pair_index, weights=self.rating, minlength=len(self.pair_ids)
+        ).astype(np.int64)
+        # Docs of each pair that were run, i.e. not skipped by the pair early exit
+        self.pair_answered = np.bincount(
+            self.pair_index, weights=~self.skipped, minlength=len(self.pair_ids)
+        ).astype(np.int64)
+        # Source of each pair, from its first doc
+        first = np.zeros(len(self.pair_ids), dtype=np.int64)
+        first[self.pair_index[::-1]] = np.arange(len(results))[::-1]
+        self.pair_source = np.array(
+            [results[i].get("source", "unknown") for i in first.tolist()], dtype=object
+        )
+        self.model_answers: Optional[List[str]] = None
+        self.doc_index: Optional[np.ndarray] = None
+
+    def __len__(self):
+        return len(self.video_ids)
+
+    @property
+    def num_pairs(self) -> int:
+        return len(self.pair_ids)
+
+    def leaderboard_df(self, results: List[dict], subset: str = "mvp") -> pd.DataFrame:
+        if self.model_answers is None:
+            # Unparsed predictions fall back to the first candidate
+            self.model_answers = [
+                r["candidates"][i] for r, i in zip(results, np.maximum(self.prediction_idx, 0).tolist())
+            ]
+            if results and "doc_index" in results[0]:
+                self.doc_index = np.array([r["doc_index"] for r in results], dtype=np.int64)
+        ldb = pd.DataFrame(
+            {"data_name": subset, "row_id": self.video_ids, "model_answer": self.model_answers}
+        )
+        if self.doc_index is not None:
+            # Rows in original dataset order when MVP_DOC_ORDER reordered the docs
+            ldb = ldb.iloc[np.argsort(self.doc_index, kind="stable")].reset_index(drop=True)
+        return ldb
+
+
+_cache = OrderedDict()
+
+
+def fingerprint(results: List[dict]) -> tuple:
+    return tuple(
+        (r["video_id"], r["rating"], r["prediction_idx"], r.get("skipped", False)) for r in results
+    )
+
+
+def get_result_columns(results: List[dict]) -> ResultColumns:
+    key = fingerprint(results)
+    columns = _cache.get(key)
+    if columns is None:
+        columns = ResultColumns(results)
+        _cache[key] = columns
+        if len(_cache) > CACHE_SIZE:
+            _cache.popitem(last=False)
+    else:
+        _cache.move_to_end(key)
+    return columns
@@ -0,0 +1,69 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+# All rights reserved.
+#
+# This source code is licensed under the license found in the
+# LICENSE file in the root directory of this source tree.
+
+from typing import Dict, List
+
+from lmms_eval.tasks.mvp.result_columns import get_result_columns
+
+# Pair-aware metric aggregation over shards of the results.
+#
+# Each shard (an archived part of a run) is reduced to a few counts
+# plus its "half pairs", the pairs of which it only holds one video, as
+# {pair_id: correct}. Merging sums the counts and matches the half pairs, so
+# the full list of result dicts and prediction strings never has to be in one
+# place. This is an offline utility for combining archived parts of a run: the
+# aggregations do not use it, since lmms-eval gathers every result to rank 0
+# first and compute_metrics works on that list directly.
+#
+#   partials = [reduce_shard(results_of_part) for results_of_part in parts]
+#   single_accuracy, pair_accuracy = finalize(merge(partials))
+
+
+def reduce_shard(results: List[dict]) -> dict:
+    columns = get_result_columns(results)
+    complete = columns.pair_size == 2
+    half = columns.pair_size == 1
+    if (columns.pair_size > 2).any():
+        raise ValueError(f"{int((columns.pair_size > 2).sum())} pairs have more than two results")
+    return {
+        "num_docs": len(columns),
+        "num_skipped": int(columns.skipped.sum()),
+        "single_correct": int(columns.rating[~columns.skipped].sum()),
+        "num_pairs": int(complete.sum()),
+        "pair_correct": int((columns.pair_correct[complete] == 2).sum()),
+        "half_pairs": dict(
+            zip(columns.pair_ids[half].tolist(), (columns.pair_correct[half] == 1).tolist())
+        ),
+    }
+
+
+def merge(partials: List[dict]) -> dict:
+    """Sum the counts of `partials` and match their half pairs."""
+    merged = {key: sum(p[key] for p in partials) for key in partials[0] if key != "half_pairs"}
+    half_pairs: Dict[str, bool] = {}
+    for partial in partials:
+        for pair_id, correct in partial["half_pairs"].items():
+            if pair_id in half_pairs:
+                other_correct = half_pairs.pop(pair_id)
+                merged["num_pairs"] += 1
+                merged["pair_correct"] += int(correct and other_correct)
+            else:
+                half_pairs[pair_id] = correct
+    merged["half_pairs"] = half_pairs
+    return merged
+
+
+def finalize(merged: dict):
+    """(single accuracy, pair accuracy) in % once every pair has been matched."""
+    if merged["half_pairs"]:
+        raise ValueError(
+            f"{len(merged['half_pairs'])} pairs only have one result,"
+            f" e.g. {next(iter(merged['half_pairs']))}"
+        )
+    answered = merged["num_docs"] - merged["num_skipped"]
+    single_accuracy = 100 * merged["single_correct"] / max(answered, 1)
+    pair_accuracy = 100 * merged["pair_correct"] / max(merged["num_pairs"], 1)
+    return single_accuracy, pair_accuracy
@@ -0,0 +1,100 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+# All rights reserved.
+#
+# This source code is licensed under the license found in the
+# LICENSE file in the root directory of this source tree.
+
+import argparse
+import ast
+import os
+import re
+from pathlib import Path
+
+from lmms_eval.tasks.mvp.pairs import SUBSETS, get_pair_id, get_source
+
+# Offline, pre-normalized snapshot of facebook/minimal_video_pairs.
+#
+#   python -m lmms_eval.tasks.mvp.snapshot build --snapshot_dir ../mvp_snapshot
+#   python -m lmms_eval.tasks.mvp.snapshot point --snapshot_dir ../mvp_snapshot
+#
+# `build` writes one Arrow file per subset and split (memory-mapped by
+# `datasets`) with the candidates already parsed into a list, the answer index
+# precomputed and the pair id and data source extracted. `point` rewrites the
+# task YAMLs of an lmms-eval checkout to load those files through the `arrow`
+# builder, so task loading works fully offline and skips the per-doc parsing.
+
+DATASET_PATH = "facebook/minimal_video_pairs"
+SPLITS = ["full", "mini"]
+
+
+def normalize_doc(doc):
+    cands = doc["candidates"]
+    if isinstance(cands, str):
+        cands = ast.literal_eval(cands)
+    return {
+        "candidates": [str(c) for c in cands],
+        "answer_idx": str(cands.index(str(doc["answer"]))),
+        "pair_id": get_pair_id(doc["video_id"]),
+        "source": get_source(doc["video_path"]),
+    }
+
+
+def build(output_dir, dataset_path=DATASET_PATH, subsets=SUBSETS, splits=SPLITS):
+    import datasets
+    import pyarrow as pa
+
+    for subset in subsets:
+        os.makedirs(os.path.join(output_dir, subset), exist_ok=True)
+        for split in splits:
+            ds = datasets.load_dataset(dataset_path, subset, split=split)
+            ds = ds.map(normalize_doc).flatten_indices()
+            table = ds.data.table
+            path = os.path.join(output_dir, subset, f"{split}.arrow")
+            with pa.OSFile(path, "wb") as sink:
+                with pa.ipc.new_stream(sink, table.schema) as writer:
+                    writer.write_table(table)
+            print(f"{subset}/{split}: {len(ds)} docs -> {path}")
+
+
+def point(tasks_dir, snapshot_dir):
+    """Make the task YAMLs in `tasks_dir` load the snapshot instead of the Hub."""
+    snapshot_dir = os.path.abspath(snapshot_dir)
+    for template_name in ["_default_template_yaml", "_default_ll_template_yaml"]:
+        template_path = os.path.join(tasks_dir, template_name)
+        with open(template_path, "r") as f:
+            template = f.read()
+        template = re.sub(r"^dataset_path: .*$", "dataset_path: arrow", template, flags=re.M)
+        with open(template_path, "w") as f:
+            f.write(template)
+
+    for filename in sorted(os.listdir(tasks_dir)):
+        if not filename.endswith(".yaml"):
+            continue
+        path = os.path.join(tasks_dir, filename)
+        with open(path, "r") as f:
+            config = f.read()
+        match = re.search(r"^dataset_name: *(\w+)", config, flags=re.M)
+        if match is None or "dataset_kwargs" in config:
+            continue
+        subset = match.group(1)
+        data_files = "".join(
+            f"    {split}: {os.path.join(snapshot_dir, subset, f'{split}.arrow')}\n"
+            for split in SPLITS
+        )
+        with open(path, "a") as f:
+            f.write(f"\ndataset_kwargs:\n  data_files:\n{data_files}")
+        print(f"{filename} -> {snapshot_dir}/{subset}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Offline snapshot of the mvp dataset")
+    parser.add_argument("command", choices=["build", "point"])
+    parser.add_argument("--snapshot_dir", default=str(Path().absolute().parent / "mvp_snapshot"))
+    parser.add_argument("--tasks_dir", default=str(Path(__file__).parent))
+    parser.add_argument("--dataset_path", default=DATASET_PATH)
+    args = parser.parse_args()
+
+    if args.command == "build":
+        build(args.snapshot_dir, args.dataset_path)
+    else:
+        point(args.tasks_dir, args.snapshot_dir)
@@ -0,0 +1,160 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+# All rights reserved.
+#
+# This source code is licensed under the license found in the
+# LICENSE file in the root directory of this source tree.
+
+import argparse
+import json
+import math
+from typing import List, Optional
+
+import numpy as np
+
+from lmms_eval.tasks.mvp.result_columns import get_result_columns
+
+# Confidence intervals and run comparisons for the mvp metrics.
+#
+# Pairs are the resampling unit. A pair is described by how many of its docs
+# were answered correctly and how many were answered at all (a doc skipped by
+# the pair early exit is not), so a bootstrap resample of n pairs is fully
+# described by how many pairs of each kind it draws: one multinomial draw of
+# shape (num_resamples, kinds) gives single and pair accuracy of every resample
+# at once, which takes a few milliseconds even for the full mvp set. Single
+# accuracy is over the answered docs, as in compute_metrics.
+#
+# The pair accuracy aggregations log the 95% intervals, overall and per source
+# (format_summary). They are not metrics: lmms-eval only fills its stderr column
+# for its own aggregations, so it shows N/A for these.
+#
+#   python -m lmms_eval.tasks.mvp.stats run_a_samples.jsonl [run_b_samples.jsonl]
+
+
+def bootstrap(
+    correct_per_pair: np.ndarray,
+    answered_per_pair: Optional[np.ndarray] = None,
+    num_resamples: int = 10000,
+    confidence: float = 0.95,
+    seed: int = 0,
+) -> dict:
+    """Point estimates and percentile bootstrap CIs (in %) of single and pair accuracy.
+
+    `answered_per_pair` defaults to two answered docs for every pair.
+    """
+    n = len(correct_per_pair)
+    if n == 0:
+        return {}
+    correct = np.clip(correct_per_pair, 0, 2)
+    answered = np.full(n, 2) if answered_per_pair is None else np.clip(answered_per_pair, 0, 2)
+    kind_correct, kind_answered = np.divmod(np.arange(9), 3)
+    kinds = np.bincount(3 * correct + answered, minlength=9)[:9] / n
+    rng = np.random.default_rng(seed)
+    draws = rng.multinomial(n, kinds, size=num_resamples)
+    single = 100 * (draws @ kind_correct) / np.maximum(draws @ kind_answered, 1)
+    pair = 100 * (draws @ (kind_correct == 2)) / n
+    alpha = (1 - confidence) / 2
+    lo, hi = 100 * alpha, 100 * (1 - alpha)
+    return {
+        "num_pairs": n,
+        "single_accuracy": 100 * int(correct.sum()) / max(int(answered.sum()), 1),
+        "single_accuracy_ci": tuple(np.percentile(single, [lo, hi])),
+        "single_accuracy_stderr": float(single.std(ddof=1)),
+        "pair_accuracy": 100 * float(np.mean(correct == 2)),
+        "pair_accuracy_ci": tuple(np.percentile(pair, [lo, hi])),
+        "pair_accuracy_stderr": float(pair.std(ddof=1)),
+    }
+
+
+def overall(results: List[dict], num_resamples: int = 10000, seed: int = 0) -> dict:
+    """Bootstrap statistics of all results together."""
+    columns = get_result_columns(results)
+    return bootstrap(columns.pair_correct, columns.pair_answered, num_resamples, seed=seed)
+
+
+def summarize(results: List[dict], num_resamples: int = 10000, seed: int = 0) -> dict:
+    """Overall and per data source bootstrap statistics for a list of result dicts."""
+    columns = get_result_columns(results)
+    correct, answered, sources = columns.pair_correct, columns.pair_answered, columns.pair_source
+    summary = {"all": overall(results, num_resamples, seed)}
+    for source in sorted(set(sources.tolist())):
+        mask = sources == source
+        summary[source] = bootstrap(correct[mask], answered[mask], num_resamples, seed=seed)
+    return summary
+
+
+def _binom_cdf_half(k: int, n: int) -> float:
+    """P(X <= k) for X ~ Binomial(n, 0.5)."""
+    if n == 0:
+        return 1.0
+    log_terms = [
+        math.lgamma(n + 1) - math.lgamma(i + 1) - math.lgamma(n - i + 1) - n * math.log(2)
+        for i in range(k + 1)
+    ]
+    peak = max(log_terms)
+    return min(1.0, math.exp(peak) * sum(math.exp(t - peak) for t in log_terms))
+
+
+def mcnemar(results_a: List[dict], results_b: List[dict]) -> dict:
+    """Exact McNemar test on pair correctness of two runs over the same pairs."""
+    columns_a, columns_b = get_result_columns(results_a), get_result_columns(results_b)
+    shared, idx_a, idx_b = np.intersect1d(
+        columns_a.pair_ids, columns_b.pair_ids, assume_unique=True, return_indices=True
+    )
+    a = (columns_a.pair_correct == columns_a.pair_size)[idx_a]
+    b = (columns_b.pair_correct == columns_b.pair_size)[idx_b]
+    only_a, only_b = int(np.sum(a & ~b)), int(np.sum(~a & b))
+    p_value = min(1.0, 2 * _binom_cdf_half(min(only_a, only_b), only_a + only_b))
+    return {
+        "num_pairs": len(shared),
+        "pair_accuracy_a": 100 * float(a.mean()) if len(shared) else 0.0,
+        "pair_accuracy_b": 100 * float(b.mean()) if len(shared) else 0.0,
+        "only_a_correct": only_a,
+        "only_b_correct": only_b,
+        "p_value": p_value,
+    }
+
+
+def load_samples(path: str, metric: str = "pair_accuracy") -> List[dict]:
+    """Result dicts of one metric from an lmms-eval `--log_samples` jsonl file."""
+    results = []
+    with open(path, "r") as f:
+        for line in f:
+            if line.strip():
+                results.append(json.loads(line)[metric])
+    return results
+
+
+def format_summary(summary: dict) -> str:
+    lines = []
+    for name, stats in summary.items():
+        if not stats:
+            continue
+        lo, hi = stats["pair_accuracy_ci"]
+        slo, shi = stats["single_accuracy_ci"]
+        lines.append(
+            f"{name:>16}: pairs={stats['num_pairs']:5d}"
+            f"  pair_accuracy={stats['pair_accuracy']:6.2f} [{lo:6.2f}, {hi:6.2f}]"
+            f"  single_accuracy={stats['single_accuracy']:6.2f} [{slo:6.2f}, {shi:6.2f}]"
+        )
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Bootstrap CIs and paired tests for mvp runs")
+    parser.add_argument("samples", nargs="+", help="one or two --log_samples jsonl files")
+    parser.add_argument("--num_resamples", type=int, default=10000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    runs = [load_samples(path) for path in args.samples]
+    for path, results in zip(args.samples, runs):
+        print(path)
+        print(format_summary(summarize(results, args.num_resamples, args.seed)))
+    if len(runs) == 2:
+        test = mcnemar(*runs)
+        print(
+            f"McNemar on {test['num_pairs']} shared pairs: "
+            f"{test['pair_accuracy_a']:.2f} vs {test['pair_accuracy_b']:.2f}, "
+            f"{test['only_a_correct']} vs {test['only_b_correct']} discordant, "
+            f"p={test['p_value']:.4g}"
+        )
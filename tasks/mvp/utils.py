@@ -8,37 +8,120 @@ import ast
 import os
 import re
 import sys
-from pathlib import Path
+from functools import lru_cache
 from typing import Union
 
-import pandas as pd
 from lmms_eval.tasks._task_utils.file_utils import generate_submission_file
+from lmms_eval.tasks.mvp.doc_order import order_docs, track_doc
+from lmms_eval.tasks.mvp.frame_cache import frame_sampling, get_frame_cache, load_frames
+from lmms_eval.tasks.mvp.frame_shards import get_frame_shards
+from lmms_eval.tasks.mvp.pairs import SKIPPED_PREDICTION, UNEVALUATED_PREDICTION, get_pair_id, get_source
+from lmms_eval.tasks.mvp.prefetch import PREFETCH_COLUMN, get_prefetcher
+from lmms_eval.tasks.mvp.result_columns import get_result_columns
+from lmms_eval.tasks.mvp.stats import format_summary, summarize
+from lmms_eval.tasks.mvp.video_index import get_video_index, preflight
+from loguru import logger as eval_logger
 
 idx_map = ["a", "b"]
 
 
+def get_video_path(video_path):
+    # videos/ next to the lmms-eval checkout unless MVP_VIDEO_ROOT is set
+    return get_video_index().path(video_path)
+
+
 # Pass in video path here
 # Can only work correctly with video llm
 # Video location used from absolute paths
 def mvp_doc_to_visual(doc):
-    video_path = doc["video_path"]
-    # dir > lmms-eval (cwd) > lmms-eval > tasks > mvp > util.py
-    video_path = str(Path().absolute().parent / "videos" / video_path)
-    if os.path.exists(video_path):
-        video_path = video_path
-    else:
+    # With MVP_FRAME_SHARDS set, hand over zero-copy (T, H, W, 3) uint8 views of
+    # frames pre-sampled into packed shards (see frame_shards.py)
+    shards = get_frame_shards()
+    if shards is not None:
+        if doc["video_path"] not in shards:
+            sys.exit(f"video path:{doc['video_path']} is not packed in {shards.shard_dir}")
+        track_doc()
+        return [shards.get(doc["video_path"])]
+    video_path = get_video_path(doc["video_path"])
+    if doc["video_path"] not in get_video_index():
         sys.exit(f"video path:{video_path} does not exist, please check")
+    track_doc()
+    # With MVP_PREFETCH set, hand over frames decoded ahead of time instead
+    prefetcher = get_prefetcher()
+    if prefetcher is not None:
+        return [prefetcher.get(doc, video_path)]
+    # With MVP_FRAME_CACHE_DIR set, hand over cached decoded frames
+    if get_frame_cache() is not None:
+        return [load_frames(video_path, *frame_sampling())]
     return [video_path]
 
 
+def mvp_preflight(video_paths):
+    """Fail at task load, before any GPU work, listing every unusable video.
+
+    MVP_PREFLIGHT=exists (default) checks the video index, `decode` additionally
+    decodes the first and last frame of this rank's share of the videos and `off`
+    skips the check. With MVP_FRAME_SHARDS set the mp4s are never read, so the
+    videos only need to be packed in the shards.
+    """
+    mode = os.getenv("MVP_PREFLIGHT", "exists")
+    if mode == "off":
+        return
+    shards = get_frame_shards()
+    if shards is not None:
+        unpacked = sorted({p for p in video_paths if p not in shards})
+        for video_path in unpacked:
+            eval_logger.error(f"{video_path}: not packed")
+        if unpacked:
+            raise FileNotFoundError(f"{len(unpacked)} videos are not packed in {shards.shard_dir}, please check")
+        return
+    if mode == "decode":
+        rank, world_size = int(os.getenv("RANK", "0")), int(os.getenv("WORLD_SIZE", "1"))
+        video_paths = video_paths[rank::world_size]
+    index = get_video_index()
+    problems = preflight(index, video_paths, check_decode=mode == "decode")
+    for video_path, reason in sorted(problems.items()):
+        eval_logger.error(f"{index.path(video_path)}: {reason}")
+    if problems:
+        raise FileNotFoundError(
+            f"{len(problems)} videos are missing or undecodable under {index.root}, please check"
+        )
+
+
+def mvp_process_docs(dataset):
+    mvp_preflight(dataset["video_path"])
+    # MVP_DOC_ORDER=pairs puts both videos of a pair on one rank, back to back
+    # (but for the pairs flagged pair_split, see doc_order.py),
+    # `cost` also balances the predicted decode cost of the ranks and
+    # `adaptive` walks a seeded stratified pair order (see adaptive.py)
+    dataset = order_docs(dataset, os.getenv("MVP_DOC_ORDER", "dataset"))
+    prefetcher = get_prefetcher()
+    if prefetcher is not None:
+        positions = prefetcher.register([get_video_path(p) for p in dataset["video_path"]])
+        dataset = dataset.add_column(PREFETCH_COLUMN, positions)
+    return dataset
+
+
+@lru_cache(maxsize=4096)
+def _parse_candidates(candidates):
+    return ast.literal_eval(candidates)
+
+
 def get_candidates(doc):
+    # Already a list when loading the offline snapshot (see snapshot.py)
     if type(doc["candidates"]) == str:
-        cands = ast.literal_eval(doc["candidates"])
+        cands = list(_parse_candidates(doc["candidates"]))
     else:
         cands = doc["candidates"]
     return cands
 
 
+def get_answer_idx(doc, cands):
+    if "answer_idx" in doc:
+        return doc["answer_idx"]
+    return str(cands.index(str(doc["answer"])))
+
+
 def mvp_doc_to_text(doc, lmms_eval_specific_kwargs=None):
     if lmms_eval_specific_kwargs is None:
         lmms_eval_specific_kwargs = {}
@@ -63,15 +146,20 @@ def mvp_process_results(doc, result):
     pred = result[0]
     rating = 0
     match_success = True
-    answer_pred = extract_pred(pred)
+    # Not run by the model, the other video of the pair was already wrong
+    skipped = pred == SKIPPED_PREDICTION
+    # Not run either, left out by adaptive evaluation and by the metrics
+    unevaluated = pred == UNEVALUATED_PREDICTION
+    answer_pred = False if skipped or unevaluated else extract_pred(pred)
     cand = get_candidates(doc)
-    answer_idx = str(cand.index(str(doc["answer"])))
+    answer_idx = get_answer_idx(doc, cand)
+    source = doc["source"] if "source" in doc else get_source(doc["video_path"])
 
     # Some hand-crafted matching rules
     if answer_pred:
         rating = 1 if answer_pred == answer_idx else 0
 
-    return {
+    processed = {
         "pair_accuracy": {
             "video_id": doc["video_id"],
             "video-llm-prediction": pred,
@@ -79,6 +167,9 @@ def mvp_process_results(doc, result):
             "answer_idx": answer_idx,
             "match_success": match_success,
             "rating": rating,
+            "skipped": skipped,
+            "unevaluated": unevaluated,
+            "source": source,
             "candidates": cand,
         },
         "single_accuracy": {
@@ -88,14 +179,36 @@ def mvp_process_results(doc, result):
             "answer_idx": answer_idx,
             "match_success": match_success,
             "rating": rating,
+            "skipped": skipped,
+            "unevaluated": unevaluated,
+            "source": source,
         },
     }
+    # Original position of the doc when MVP_DOC_ORDER reordered the dataset
+    if "doc_index" in doc:
+        processed["pair_accuracy"]["doc_index"] = doc["doc_index"]
+    return processed
 
 
 def mvp_doc_to_answer(doc):
     return doc["answer"]
 
 
+# Likelihood-based variant (mvp_ll / mvp_mini_ll): the options are scored as
+# continuations of the prompt instead of parsing a generated answer
+
+
+def mvp_ll_doc_to_target(doc):
+    return int(get_answer_idx(doc, get_candidates(doc)))
+
+
+def mvp_ll_process_results(doc, results):
+    # results holds one (loglikelihood, is_greedy) per choice, A then B
+    lls = [result[0] for result in results]
+    pred_idx = max(range(len(lls)), key=lambda i: lls[i])
+    return mvp_process_results(doc, [f"Answer: {idx_map[pred_idx].upper()}"])
+
+
 def extract_pred(video_llm_output) -> Union[str, bool]:
     video_llm_output = video_llm_output.lower()
     pattern = r"(Answer|Assistant)?:?\s*([AB])\b"
@@ -116,35 +229,38 @@ def extract_pred(video_llm_output) -> Union[str, bool]:
 def compute_metrics(results):
     """
     Compute single and paired accuracy metrics
-    """
-    single_correct_count = 0
-    pair_correct_count = 0
-
-    # results is a list of dict
-    result_by_vid = {}
-    for answer_dict in results:
-        if answer_dict["rating"] == 1:
-            single_correct_count += 1
-        video_id = "_".join(answer_dict["video_id"].split("_")[:-1])
-        if video_id not in result_by_vid:
-            result_by_vid[video_id] = [answer_dict]
-        else:
-            result_by_vid[video_id].append(answer_dict)
-
-    for video_id, answer_dict_pair in result_by_vid.items():
-        answer_dict_1, answer_dict_2 = answer_dict_pair
-
-        if answer_dict_1["rating"] == 1 and answer_dict_2["rating"] == 1:
-            pair_correct_count += 1
 
-    single_accuracy = single_correct_count / len(results)
-    pair_accuracy = pair_correct_count / len(result_by_vid)
-
-    return single_accuracy * 100, pair_accuracy * 100
+    Docs skipped by the pair early exit count as wrong for their pair, which was
+    already lost, and are left out of single accuracy, which is then partial.
+    """
+    columns = get_result_columns(results)
+    if (columns.pair_size != 2).any():
+        raise ValueError(f"{int((columns.pair_size != 2).sum())} pairs do not have exactly two results")
+    num_skipped = int(columns.skipped.sum())
+    if num_skipped:
+        eval_logger.info(
+            f"Pair early exit skipped {num_skipped} of {len(results)} docs,"
+            " single_accuracy is computed over the answered docs only"
+        )
+    single_accuracy = 100 * columns.rating[~columns.skipped].sum() / max(len(columns) - num_skipped, 1)
+    pair_accuracy = 100 * (columns.pair_correct == 2).sum() / max(columns.num_pairs, 1)
+    return float(single_accuracy), float(pair_accuracy)
+
+
+def evaluated(results):
+    """Results without the pairs adaptive evaluation left out, in whole or in part."""
+    left_out = {get_pair_id(r["video_id"]) for r in results if r.get("unevaluated", False)}
+    if not left_out:
+        return results
+    kept = [r for r in results if get_pair_id(r["video_id"]) not in left_out]
+    half = len(results) - len(kept) - sum(r.get("unevaluated", False) for r in results)
+    if half:
+        eval_logger.warning(f"Dropped {half} results of pairs whose other video was not evaluated")
+    return kept
 
 
 def mvp_single_accuracy(results, args):
-    sa, _ = compute_metrics(results)
+    sa, _ = compute_metrics(evaluated(results))
     return sa
 
 
@@ -152,23 +268,18 @@ def mvp_single_accuracy(results, args):
 
 
 def generate_leaderboard_submission_df(results, subset="mvp"):
-    ldb_rows = []
-    for row in results:
-        ldb_row = {
-            "data_name": subset,
-            "row_id": row["video_id"],
-            "model_answer": row["candidates"][int(row["prediction_idx"])],
-        }
-        ldb_rows.append(ldb_row)
-    return pd.DataFrame(ldb_rows)
-
-
-def mvp_pair_accuracy(results, args, task="", subset="mvp"):
+    return get_result_columns(results).leaderboard_df(results, subset=subset)
+
+
+def mvp_pair_accuracy(results, args, task="", subset="mvp", suffix=""):
+    results = evaluated(results)
     _, pa = compute_metrics(results)
-    ldb_file = generate_submission_file(f"{subset}_{task}_valid.jsonl", args)
+    ldb_file = generate_submission_file(f"{subset}_{task}{suffix}_valid.jsonl", args)
     ldb = generate_leaderboard_submission_df(results, subset=subset)
     ldb["task"] = task
     ldb.to_json(ldb_file, lines=True, orient="records")
+    # Pair-level bootstrap CIs, overall and per data source (see stats.py)
+    eval_logger.info(f"{subset} {task} 95% bootstrap CIs:\n" + format_summary(summarize(results)))
     return pa
 
 
@@ -212,3 +323,54 @@ def mvp_mini_tr_pair_accuracy(results, args):
     return mvp_pair_accuracy(
         results, args, task="temporal_reasoning", subset="mvp_mini"
     )
+
+
+# Likelihood variants write `*_ll_valid.jsonl`, next to the generative submissions
+
+
+def mvp_ll_hoi_pair_accuracy(results, args):
+    return mvp_pair_accuracy(
+        results, args, task="human_object_interactions", subset="mvp", suffix="_ll"
+    )
+
+
+def mvp_ll_ip_pair_accuracy(results, args):
+    return mvp_pair_accuracy(
+        results, args, task="intuitive_physics", subset="mvp", suffix="_ll"
+    )
+
+
+def mvp_ll_roi_pair_accuracy(results, args):
+    return mvp_pair_accuracy(
+        results, args, task="robot_object_interactions", subset="mvp", suffix="_ll"
+    )
+
+
+def mvp_ll_tr_pair_accuracy(results, args):
+    return mvp_pair_accuracy(
+        results, args, task="temporal_reasoning", subset="mvp", suffix="_ll"
+    )
+
+
+def mvp_mini_ll_hoi_pair_accuracy(results, args):
+    return mvp_pair_accuracy(
+        results, args, task="human_object_interactions", subset="mvp_mini", suffix="_ll"
+    )
+
+
+def mvp_mini_ll_ip_pair_accuracy(results, args):
+    return mvp_pair_accuracy(
+        results, args, task="intuitive_physics", subset="mvp_mini", suffix="_ll"
+    )
+
+
+def mvp_mini_ll_roi_pair_accuracy(results, args):
+    return mvp_pair_accuracy(
+        results, args, task="robot_object_interactions", subset="mvp_mini", suffix="_ll"
+    )
+
+
+def mvp_mini_ll_tr_pair_accuracy(results, args):
+    return mvp_pair_accuracy(
+        results, args, task="temporal_reasoning", subset="mvp_mini", suffix="_ll"
+    )
@@ -0,0 +1,103 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+# All rights reserved.
+#
+# This source code is licensed under the license found in the
+# LICENSE file in the root directory of this source tree.
+
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from loguru import logger as eval_logger
+
+# In-memory index of the video folder, built with a single scan instead of one
+# `os.path.exists` per doc, plus the metadata sidecar written by
+# `setup/manifest.py` (fps, duration, resolution, frame count) so frame samplers
+# do not need to probe files.
+#
+# The root defaults to `videos/` next to the lmms-eval checkout and can be moved
+# with MVP_VIDEO_ROOT.
+
+MANIFEST_FILE = "manifest.json"
+
+
+def get_video_root() -> str:
+    # dir > lmms-eval (cwd) > lmms-eval > tasks > mvp > util.py
+    return os.getenv("MVP_VIDEO_ROOT", str(Path().absolute().parent / "videos"))
+
+
+class VideoIndex:
+    def __init__(self, root: str):
+        self.root = root
+        self.files = set()
+        for dirpath, _, filenames in os.walk(root):
+            rel_dir = os.path.relpath(dirpath, root)
+            for filename in filenames:
+                self.files.add(os.path.normpath(os.path.join(rel_dir, filename)))
+        self.metadata: Dict[str, dict] = {}
+        manifest_path = os.path.join(root, MANIFEST_FILE)
+        if os.path.exists(manifest_path):
+            with open(manifest_path, "r") as f:
+                self.metadata = json.load(f)["videos"]
+
+    def path(self, video_path: str) -> str:
+        return os.path.join(self.root, video_path)
+
+    def __contains__(self, video_path: str) -> bool:
+        return os.path.normpath(video_path) in self.files
+
+    def get_metadata(self, video_path: str) -> Optional[dict]:
+        """fps, duration, width, height, num_frames from the sidecar, None if unknown."""
+        return self.metadata.get(os.path.normpath(video_path))
+
+
+def check_decodable(path: str) -> Optional[str]:
+    """None if the first and last frames decode, otherwise the error."""
+    try:
+        from decord import VideoReader, cpu
+
+        vr = VideoReader(path, ctx=cpu(0), num_threads=1)
+        if len(vr) == 0:
+            return "no frames"
+        vr.get_batch([0, len(vr) - 1])
+    except Exception as e:
+        return str(e)
+    return None
+
+
+def preflight(
+    index: VideoIndex,
+    video_paths: List[str],
+    check_decode: bool = False,
+    num_workers: int = 16,
+) -> Dict[str, str]:
+    """Problems with `video_paths` as {video_path: reason}, empty if all are usable."""
+    problems = {p: "missing" for p in video_paths if p not in index}
+    if check_decode:
+        present = sorted({p for p in video_paths if p not in problems})
+        with ThreadPoolExecutor(max_workers=num_workers) as executor:
+            errors = executor.map(lambda p: check_decodable(index.path(p)), present)
+            for video_path, error in zip(present, errors):
+                if error is not None:
+                    problems[video_path] = f"undecodable: {error}"
+    return problems
+
+
+_video_index = None
+
+
+def get_video_index() -> VideoIndex:
+    global _video_index
+    if _video_index is None:
+        _video_index = VideoIndex(get_video_root())
+        eval_logger.info(
+            f"Indexed {len(_video_index.files)} files under {_video_index.root}"
+            f" ({len(_video_index.metadata)} with metadata)"
+        )
+    return _video_index
+
+
+def get_video_metadata(video_path: str) -> Optional[dict]:
+    return get_video_index().get_metadata(video_path)
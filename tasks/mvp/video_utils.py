@@ -0,0 +1,49 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+# All rights reserved.
+#
+# This source code is licensed under the license found in the
+# LICENSE file in the root directory of this source tree.
+
+import math
+from typing import Optional
+
+import numpy as np
+from PIL import Image
+
+
+def sample_frame_indices(total_frames: int, num_frames: int) -> np.ndarray:
+    """Uniformly spaced frame indices covering the whole clip."""
+    if total_frames <= 0:
+        return np.zeros(0, dtype=np.int64)
+    num_frames = min(num_frames, total_frames)
+    return np.linspace(0, total_frames - 1, num_frames).round().astype(np.int64)
+
+
+def resize_to_max_pixels(frames: np.ndarray, max_pixels: Optional[int]) -> np.ndarray:
+    """Downscale (T, H, W, 3) frames so that H * W <= max_pixels, keeping aspect."""
+    if not max_pixels:
+        return frames
+    _, height, width, _ = frames.shape
+    if height * width <= max_pixels:
+        return frames
+    scale = math.sqrt(max_pixels / (height * width))
+    new_w = max(1, int(width * scale))
+    new_h = max(1, int(height * scale))
+    resized = [
+        np.asarray(Image.fromarray(frame).resize((new_w, new_h), Image.BICUBIC))
+        for frame in frames
+    ]
+    return np.stack(resized)
+
+
+def load_video_frames(
+    video_path: str, num_frames: int = 16, max_pixels: Optional[int] = None
+) -> np.ndarray:
+    """Decode `num_frames` uniformly sampled frames as a (T, H, W, 3) uint8 array."""
+    from decord import VideoReader, cpu
+
+    vr = VideoReader(video_path, ctx=cpu(0), num_threads=1)
+    indices = sample_frame_indices(len(vr), num_frames)
+    frames = vr.get_batch(indices.tolist()).asnumpy()
+    frames = resize_to_max_pixels(frames, max_pixels)
+    return np.ascontiguousarray(frames, dtype=np.uint8)
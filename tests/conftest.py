@@ -0,0 +1,23 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+# All rights reserved.
+#
+# This source code is licensed under the license found in the
+# LICENSE file in the root directory of this source tree.
+
+import pytest
+
+
+def make_result(video_id, correct, skipped=False, source="pt"):
+    return {
+        "video_id": video_id,
+        "rating": int(correct),
+        "prediction_idx": False if skipped else "0",
+        "skipped": skipped,
+        "source": source,
+    }
+
+
+@pytest.fixture
+def result():
+    """Factory of the per-doc result dicts the aggregations receive."""
+    return make_result
@@ -0,0 +1,64 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+# All rights reserved.
+#
+# This source code is licensed under the license found in the
+# LICENSE file in the root directory of this source tree.
+
+from lmms_eval.tasks.mvp.adaptive import AdaptiveStop
+from lmms_eval.tasks.mvp.utils import evaluated
+
+
+def doc(video_id, pair_split=False):
+    return {"video_id": video_id, "candidates": ["yes", "no"], "answer": "yes", "pair_split": pair_split}
+
+
+def converged_stop():
+    # Stops as soon as one pair has been recorded
+    stop = AdaptiveStop(target_width=1, max_pairs=1, min_pairs=0)
+    stop.should_stop("t", doc("p0_0"))
+    stop.should_stop("t", doc("p0_1"))
+    stop.record("t", doc("p0_0"), "Answer: A")
+    stop.record("t", doc("p0_1"), "Answer: A")
+    return stop
+
+
+def test_decision_is_recorded_per_pair():
+    stop = AdaptiveStop(target_width=1, max_pairs=1, min_pairs=0)
+    # Both videos scheduled before any answer is in
+    assert not stop.should_stop("t", doc("p0_0"))
+    assert not stop.should_stop("t", doc("p1_0"))
+    stop.record("t", doc("p0_0"), "Answer: A")
+    stop.record("t", doc("p0_1"), "Answer: A")
+    # Converged now, but started pairs are finished and new ones stopped
+    assert not stop.should_stop("t", doc("p1_1"))
+    assert stop.should_stop("t", doc("p2_0"))
+    assert stop.should_stop("t", doc("p2_1"))
+    assert stop.tasks["t"].unevaluated == 2
+
+
+def test_split_pairs_are_never_stopped():
+    stop = converged_stop()
+    assert not stop.should_stop("t", doc("p5_0", pair_split=True))
+    assert stop.should_stop("t", doc("p6_0"))
+
+
+def test_is_stopped_does_not_decide():
+    stop = converged_stop()
+    assert stop.is_stopped("t", doc("p3_0"))
+    assert not stop.is_stopped("t", doc("p3_0", pair_split=True))
+    assert not stop.is_stopped("other", doc("p3_0"))
+    assert "p3" not in stop.tasks["t"].decisions
+    assert stop.tasks["t"].unevaluated == 0
+
+
+def test_evaluated_drops_half_evaluated_pairs():
+    results = [
+        {"video_id": "p0_0", "unevaluated": False},
+        {"video_id": "p0_1", "unevaluated": False},
+        {"video_id": "p1_0", "unevaluated": False},
+        {"video_id": "p1_1", "unevaluated": True},
+        {"video_id": "p2_0", "unevaluated": True},
+        {"video_id": "p2_1", "unevaluated": True},
+    ]
+    assert [r["video_id"] for r in evaluated(results)] == ["p0_0", "p0_1"]
+    assert evaluated(results[:2]) == results[:2]
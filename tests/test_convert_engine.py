@@ -0,0 +1,39 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+# All rights reserved.
+#
+# This source code is licensed under the license found in the
+# LICENSE file in the root directory of this source tree.
+
+import os
+import sys
+
+# The setup scripts import each other as top-level modules
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "setup"))
+
+import convert_engine  # noqa: E402
+from convert_engine import file_stamp, run_conversions  # noqa: E402
+
+
+def append_converted(path):
+    with open(path, "a") as f:
+        f.write("+converted")
+
+
+def test_replaced_files_are_converted_again(tmp_path, monkeypatch):
+    monkeypatch.setattr(convert_engine, "MARKER_ROOT", str(tmp_path / ".convert"))
+    path = str(tmp_path / "video.mp4")
+    with open(path, "w") as f:
+        f.write("native")
+    jobs = [(path, (path,))]
+
+    assert run_conversions("transcode_test", jobs, append_converted, num_workers=1, stamp_fn=file_stamp) == []
+    run_conversions("transcode_test", jobs, append_converted, num_workers=1, stamp_fn=file_stamp)
+    with open(path) as f:
+        assert f.read() == "native+converted"
+
+    # Downloaded again by hand, markers left in place
+    with open(path, "w") as f:
+        f.write("native again")
+    run_conversions("transcode_test", jobs, append_converted, num_workers=1, stamp_fn=file_stamp)
+    with open(path) as f:
+        assert f.read() == "native again+converted"
@@ -0,0 +1,84 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+# All rights reserved.
+#
+# This source code is licensed under the license found in the
+# LICENSE file in the root directory of this source tree.
+
+from lmms_eval.tasks.mvp.doc_order import (
+    balance_ranks,
+    fill_ranks,
+    imbalance,
+    interleave_ranks,
+    pair_order,
+    rank_capacities,
+    split_pairs,
+)
+from lmms_eval.tasks.mvp.pairs import group_pairs
+
+
+def make_docs(num_pairs):
+    return [
+        {"video_id": f"pair{i // 2}_{i % 2}", "video_path": f"src{i % 3}/{i}.mp4"}
+        for i in range(2 * num_pairs)
+    ]
+
+
+def stride_shards(order, world_size):
+    """What lmms-eval hands each rank from a reordered dataset."""
+    return [order[rank::world_size] for rank in range(world_size)]
+
+
+def test_interleave_ranks_matches_stride_sharding():
+    rank_lists = [[0, 3, 6], [1, 4, 7], [2, 5]]
+    order = interleave_ranks(rank_lists)
+    assert stride_shards(order, 3) == rank_lists
+
+
+def test_fill_ranks_respects_capacities():
+    groups = [[2 * i, 2 * i + 1] for i in range(10)]
+    rank_lists = fill_ranks(groups, [i % 3 for i in range(10)], 3, 20)
+    assert [len(docs) for docs in rank_lists] == rank_capacities(20, 3)
+    assert sorted(idx for docs in rank_lists for idx in docs) == list(range(20))
+
+
+def test_fill_ranks_keeps_pairs_whole_when_capacities_are_even():
+    groups = [[2 * i, 2 * i + 1] for i in range(8)]
+    rank_lists = fill_ranks(groups, [i % 4 for i in range(8)], 4, 16)
+    for group in groups:
+        assert any(set(group) <= set(docs) for docs in rank_lists)
+
+
+def test_pair_order_splits_only_what_odd_capacities_force():
+    docs = make_docs(1125)
+    order = pair_order(docs, 8)
+    assert sorted(order) == list(range(len(docs)))
+    # Capacities [282, 282, 281 x 6]: six odd ranks, three pairs split
+    split = split_pairs(docs, order, 8)
+    assert sum(split) == 6
+    shards = stride_shards(order, 8)
+    for pair_id, group in group_pairs(docs).items():
+        ranks = {rank for rank, docs_of_rank in enumerate(shards) for idx in group if idx in docs_of_rank}
+        flagged = {split[order.index(idx)] for idx in group}
+        assert flagged == {len(ranks) > 1}
+
+
+def test_balance_ranks_balances_cost_within_capacities():
+    groups = [[2 * i, 2 * i + 1] for i in range(16)]
+    # One long pair per four short ones
+    costs = [10.0 if i % 8 < 2 else 1.0 for i in range(32)]
+    rank_lists, loads = balance_ranks(groups, costs, 4, 32)
+    assert [len(docs) for docs in rank_lists] == rank_capacities(32, 4)
+    assert loads == [sum(costs[idx] for idx in docs) for docs in rank_lists]
+    assert imbalance(loads) == 1.0
+    dataset_loads = [sum(costs[rank::4]) for rank in range(4)]
+    assert imbalance(dataset_loads) > 1.0
+
+
+def test_balance_ranks_splits_only_leftover_docs():
+    groups = [[2 * i, 2 * i + 1] for i in range(5)]
+    rank_lists, loads = balance_ranks(groups, [1.0] * 10, 3, 10)
+    assert [len(docs) for docs in rank_lists] == rank_capacities(10, 3)
+    assert sorted(idx for docs in rank_lists for idx in docs) == list(range(10))
+    whole = [group for group in groups if any(set(group) <= set(docs) for docs in rank_lists)]
+    # Capacities [4, 3, 3]: the two odd ranks share one pair
+    assert len(whole) == 4
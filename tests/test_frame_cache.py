@@ -0,0 +1,56 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+# All rights reserved.
+#
+# This source code is licensed under the license found in the
+# LICENSE file in the root directory of this source tree.
+
+import os
+import uuid
+
+import numpy as np
+import pytest
+
+from lmms_eval.tasks.mvp.frame_cache import SHM_DIR, FrameCache
+
+
+def frames(video_path, num_frames, max_pixels):
+    return np.full((num_frames, 4, 4, 3), 7, dtype=np.uint8)
+
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = FrameCache(str(tmp_path / "cache"), ram_bytes=1024**2, namespace=f"mvp_test_{uuid.uuid4().hex[:8]}")
+    yield cache
+    cache.remove()
+
+
+@pytest.fixture
+def video(tmp_path):
+    path = tmp_path / "video.mp4"
+    path.write_bytes(b"video")
+    return str(path)
+
+
+def test_tiers(cache, video):
+    assert cache.get(video, 2, loader=frames).shape == (2, 4, 4, 3)
+    assert cache.get(video, 2, loader=frames).sum() == 2 * 4 * 4 * 3 * 7
+    assert cache.stats == {"ram_hits": 1, "disk_hits": 0, "decodes": 1}
+
+
+def test_missing_segment_is_dropped_and_rewritten(cache, video):
+    cache.get(video, 2, loader=frames)
+    (entry,) = cache._read_ledger().values()
+    os.remove(os.path.join(SHM_DIR, entry["shm"]))
+    cache.get(video, 2, loader=frames)
+    assert cache.stats["disk_hits"] == 1
+    # Back in RAM for the next lookup
+    cache.get(video, 2, loader=frames)
+    assert cache.stats["ram_hits"] == 1
+
+
+def test_remove_releases_segments(cache, video):
+    cache.get(video, 2, loader=frames)
+    (entry,) = cache._read_ledger().values()
+    cache.remove()
+    assert not os.path.exists(os.path.join(SHM_DIR, entry["shm"]))
+    assert not os.path.exists(cache.ledger_path)
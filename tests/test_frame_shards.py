@@ -0,0 +1,52 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+# All rights reserved.
+#
+# This source code is licensed under the license found in the
+# LICENSE file in the root directory of this source tree.
+
+import numpy as np
+import pytest
+
+from lmms_eval.tasks.mvp import frame_shards
+from lmms_eval.tasks.mvp.frame_shards import FrameShards, pack_shards
+
+VIDEOS = [
+    {"video_path": "a/0.mp4", "video_id": "p0_0"},
+    {"video_path": "a/1.mp4", "video_id": "p0_1"},
+    {"video_path": "b/0.mp4", "video_id": "p1_0"},
+    {"video_path": "b/1.mp4", "video_id": "p1_1"},
+]
+
+
+def fake_frames(video_path, num_frames, max_pixels):
+    if video_path.endswith("b/1.mp4"):
+        return np.zeros((0, 4, 4, 3), dtype=np.uint8)
+    value = sum(map(ord, video_path)) % 256
+    return np.full((num_frames, 4, 4, 3), value, dtype=np.uint8)
+
+
+@pytest.fixture
+def packed(tmp_path, monkeypatch):
+    monkeypatch.setattr(frame_shards, "load_video_frames", fake_frames)
+    index = pack_shards(VIDEOS, "/videos", str(tmp_path), num_frames=3, shard_bytes=8192)
+    return index, FrameShards(str(tmp_path))
+
+
+def test_round_trip(packed):
+    _, shards = packed
+    for video in VIDEOS[:3]:
+        expected = fake_frames("/videos/" + video["video_path"], 3, None)
+        np.testing.assert_array_equal(shards.get(video["video_path"]), expected)
+        np.testing.assert_array_equal(shards.get_by_video_id(video["video_id"]), expected)
+
+
+def test_pairs_stay_in_one_shard(packed):
+    index, _ = packed
+    assert len(index["shards"]) == 2
+    assert index["videos"]["a/0.mp4"]["shard"] == index["videos"]["a/1.mp4"]["shard"]
+
+
+def test_empty_videos_are_not_packed(packed):
+    index, shards = packed
+    assert "b/1.mp4" not in shards
+    assert index["missing"] == [{"video_path": "b/1.mp4", "error": "no frames decoded"}]
@@ -0,0 +1,74 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+# All rights reserved.
+#
+# This source code is licensed under the license found in the
+# LICENSE file in the root directory of this source tree.
+
+import json
+
+import pytest
+from google.genai import types
+
+from lmms_eval.models.gemini_batch import build_request, parse_results, write_batch_file
+
+
+class Uploaded:
+    uri = "https://files/abc"
+    mime_type = "video/mp4"
+
+
+SAFETY = [
+    types.SafetySetting(
+        category=types.HarmCategory.HARM_CATEGORY_HATE_SPEECH,
+        threshold=types.HarmBlockThreshold.BLOCK_NONE,
+    )
+]
+
+
+def test_build_request():
+    part = types.Part.from_uri(file_uri="https://files/def", mime_type="video/mp4")
+    request = build_request(["Question?", Uploaded(), part], 16, 0, SAFETY)
+    assert request == {
+        "contents": [
+            {
+                "role": "user",
+                "parts": [
+                    {"text": "Question?"},
+                    {"fileData": {"fileUri": "https://files/abc", "mimeType": "video/mp4"}},
+                    {"fileData": {"fileUri": "https://files/def", "mimeType": "video/mp4"}},
+                ],
+            }
+        ],
+        "generationConfig": {"maxOutputTokens": 16, "temperature": 0},
+        "safetySettings": [{"category": "HARM_CATEGORY_HATE_SPEECH", "threshold": "BLOCK_NONE"}],
+    }
+    # Valid JSON for the batch file
+    json.dumps(request)
+
+
+def test_build_request_rejects_other_inputs():
+    with pytest.raises(TypeError):
+        build_request(["Question?", b"image bytes"], 16, 0, SAFETY)
+
+
+def test_write_and_parse_round_trip(tmp_path):
+    path = tmp_path / "batch.jsonl"
+    write_batch_file(str(path), {"t___test___0": {"contents": []}, "t___test___1": {"contents": []}})
+    lines = [json.loads(line) for line in path.read_text().splitlines()]
+    assert [line["key"] for line in lines] == ["t___test___0", "t___test___1"]
+
+    results = "\n".join(
+        json.dumps(record)
+        for record in [
+            {"key": "t___test___0", "response": {"candidates": [{"content": {"parts": [{"text": "Answer: "}, {"text": "A"}]}}]}},
+            {"key": "t___test___1", "error": {"code": 400, "message": "bad request"}},
+            {"key": "t___test___2", "response": {"promptFeedback": {"blockReason": "SAFETY"}}},
+            {"key": "t___test___3", "response": {"candidates": [{"finishReason": "SAFETY"}]}},
+        ]
+    )
+    assert parse_results((results + "\n\n").encode()) == {
+        "t___test___0": "Answer: A",
+        "t___test___1": "",
+        "t___test___2": "",
+        "t___test___3": "",
+    }
@@ -0,0 +1,38 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+# All rights reserved.
+#
+# This source code is licensed under the license found in the
+# LICENSE file in the root directory of this source tree.
+
+import asyncio
+
+import httpx
+from google.genai import errors
+
+from lmms_eval.models.gemini_engine import is_retryable
+
+
+def api_error(code):
+    return errors.APIError(code, {"error": {"message": "x", "status": "x"}})
+
+
+def test_retries_rate_limits_and_server_errors():
+    assert is_retryable(api_error(429))
+    assert is_retryable(api_error(503))
+    assert not is_retryable(api_error(400))
+    assert not is_retryable(api_error(403))
+
+
+def test_retries_connection_and_timeout_errors():
+    assert is_retryable(ConnectionResetError())
+    assert is_retryable(TimeoutError("still processing"))
+    assert is_retryable(asyncio.TimeoutError())
+    assert is_retryable(httpx.ConnectError("refused"))
+    assert is_retryable(httpx.ReadTimeout("slow"))
+
+
+def test_fails_fast_on_other_errors():
+    assert not is_retryable(RuntimeError("Processing failed"))
+    assert not is_retryable(ValueError())
+    assert not is_retryable(AttributeError())
+    assert not is_retryable(httpx.UnsupportedProtocol("ftp"))
@@ -0,0 +1,50 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+# All rights reserved.
+#
+# This source code is licensed under the license found in the
+# LICENSE file in the root directory of this source tree.
+
+import json
+
+from lmms_eval.models.gemini_store import ResponseStore
+
+
+def test_responses_survive_a_restart(tmp_path):
+    store = ResponseStore(str(tmp_path), "gemini")
+    store.put("a", "Answer: A")
+    # Flushed on put, readable before close
+    assert ResponseStore(str(tmp_path), "gemini", rank=1).get("a") == "Answer: A"
+    store.close()
+    store.close()
+    assert ResponseStore(str(tmp_path), "gemini").get("a") == "Answer: A"
+
+
+def test_ranks_and_legacy_file_are_merged(tmp_path):
+    with open(tmp_path / "gemini_response.json", "w") as f:
+        json.dump({"old": "Answer: B", "a": "stale"}, f)
+    for rank, key in enumerate(["a", "b"]):
+        store = ResponseStore(str(tmp_path), "gemini", rank=rank)
+        store.put(key, f"Answer: {key}")
+        store.close()
+    store = ResponseStore(str(tmp_path), "gemini", rank=0)
+    assert len(store) == 3
+    assert store.get("old") == "Answer: B"
+    assert store.get("a") == "Answer: a"
+    assert store.get("b") == "Answer: b"
+    assert store.get("c") is None
+
+
+def test_torn_last_line_is_skipped(tmp_path):
+    store = ResponseStore(str(tmp_path), "gemini")
+    store.put("a", "Answer: A")
+    store.close()
+    with open(store.path, "a") as f:
+        f.write('{"key": "b", "respo')
+    store = ResponseStore(str(tmp_path), "gemini")
+    assert len(store) == 1
+    store.put("c", "Answer: C")
+    store.close()
+    store = ResponseStore(str(tmp_path), "gemini")
+    assert store.get("a") == "Answer: A"
+    assert store.get("c") == "Answer: C"
+    assert store.get("b") is None
@@ -0,0 +1,156 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+# All rights reserved.
+#
+# This source code is licensed under the license found in the
+# LICENSE file in the root directory of this source tree.
+
+import asyncio
+import hashlib
+import os
+import time
+
+import pytest
+
+from lmms_eval.models.gemini_batch import BATCH_WINDOW
+from lmms_eval.models.gemini_uploads import UploadCache, file_digest, state_name, wait_until_active
+
+
+def sha256(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def test_file_digest_follows_changes(tmp_path):
+    path = tmp_path / "video.mp4"
+    path.write_bytes(b"first")
+    assert file_digest(str(path)) == sha256(b"first")
+    path.write_bytes(b"second")
+    assert file_digest(str(path)) == sha256(b"second")
+    # Same size, rewritten with a later mtime
+    st = os.stat(path)
+    path.write_bytes(b"third!")
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 1))
+    assert file_digest(str(path)) == sha256(b"third!")
+
+
+class Uploaded:
+    def __init__(self, name, state="ACTIVE"):
+        self.name = name
+        self.uri = f"https://files/{name}"
+        self.mime_type = "video/mp4"
+        self.state = state
+
+
+class FakeService:
+    def __init__(self):
+        self.uploads = 0
+        self.files = {}
+
+    async def upload(self, path):
+        self.uploads += 1
+        await asyncio.sleep(0)
+        uploaded = Uploaded(f"files/{self.uploads}")
+        self.files[uploaded.name] = uploaded
+        return uploaded
+
+    async def fetch(self, name):
+        if name not in self.files:
+            raise KeyError(name)
+        return self.files[name]
+
+
+def video(tmp_path, name="video.mp4", data=b"frames"):
+    path = tmp_path / name
+    path.write_bytes(data)
+    return str(path)
+
+
+def test_upload_cache_uploads_once(tmp_path):
+    service = FakeService()
+    cache = UploadCache(str(tmp_path / "uploads.jsonl"))
+    path = video(tmp_path)
+    first = asyncio.run(cache.get(path, service.upload, service.fetch))
+    # Same content under another name is the same upload
+    second = asyncio.run(cache.get(video(tmp_path, "copy.mp4"), service.upload, service.fetch))
+    assert first == second
+    assert service.uploads == 1
+    assert cache.stats["hits"] == 1
+
+
+def test_concurrent_requests_share_an_upload(tmp_path):
+    service = FakeService()
+    cache = UploadCache(str(tmp_path / "uploads.jsonl"))
+    path = video(tmp_path)
+
+    async def both():
+        return await asyncio.gather(*(cache.get(path, service.upload, service.fetch) for _ in range(2)))
+
+    first, second = asyncio.run(both())
+    assert first["name"] == second["name"]
+    assert service.uploads == 1
+
+
+def test_ledger_is_shared_between_processes(tmp_path):
+    service = FakeService()
+    ledger_path = str(tmp_path / "uploads.jsonl")
+    path = video(tmp_path)
+    writer, reader = UploadCache(ledger_path), UploadCache(ledger_path)
+    entry = asyncio.run(writer.get(path, service.upload, service.fetch))
+    # Appended after `reader` compacted the ledger at startup
+    assert asyncio.run(reader.get(path, service.upload, service.fetch)) == entry
+    assert service.uploads == 1
+
+
+def test_expired_entries_are_dropped(tmp_path):
+    service = FakeService()
+    ledger_path = str(tmp_path / "uploads.jsonl")
+    path = video(tmp_path)
+    asyncio.run(UploadCache(ledger_path, ttl=-1).get(path, service.upload, service.fetch))
+    cache = UploadCache(ledger_path)
+    assert cache.stats["evicted"] == 1
+    with open(ledger_path) as f:
+        assert f.read() == ""
+    asyncio.run(cache.get(path, service.upload, service.fetch))
+    assert service.uploads == 2
+
+
+def test_gone_uploads_are_uploaded_again(tmp_path):
+    service = FakeService()
+    cache = UploadCache(str(tmp_path / "uploads.jsonl"), revalidate_after=-1)
+    path = video(tmp_path)
+    first = asyncio.run(cache.get(path, service.upload, service.fetch))
+    # Still on the service: checked and reused
+    assert asyncio.run(cache.get(path, service.upload, service.fetch))["name"] == first["name"]
+    service.files.clear()
+    second = asyncio.run(cache.get(path, service.upload, service.fetch))
+    assert second["name"] != first["name"]
+    assert cache.stats["revalidated"] == 2
+    assert service.uploads == 2
+    # The ledger holds the new upload only
+    assert UploadCache(cache.ledger_path, revalidate_after=-1).entries == {second["digest"]: second}
+
+
+def test_wait_until_active_polls_and_fails_on_failed_processing():
+    service = FakeService()
+    service.files["files/a"] = Uploaded("files/a")
+    ready = asyncio.run(wait_until_active(Uploaded("files/a", "PROCESSING"), service.fetch))
+    assert state_name(ready) == "ACTIVE"
+    service.files["files/b"] = Uploaded("files/b", "FAILED")
+    with pytest.raises(RuntimeError):
+        asyncio.run(wait_until_active(Uploaded("files/b", "PROCESSING"), service.fetch))
+
+
+def test_min_lifetime_replaces_uploads_expiring_soon(tmp_path):
+    service = FakeService()
+    ledger_path = str(tmp_path / "uploads.jsonl")
+    path = video(tmp_path)
+    # Uploaded 46h ago: one hour left of the 47h ledger lifetime
+    first = asyncio.run(UploadCache(ledger_path, ttl=3600).get(path, service.upload, service.fetch))
+    cache = UploadCache(ledger_path)
+    assert asyncio.run(cache.get(path, service.upload, service.fetch))["name"] == first["name"]
+    batch = asyncio.run(cache.get(path, service.upload, service.fetch, min_lifetime=BATCH_WINDOW))
+    assert batch["name"] != first["name"]
+    assert batch["expires"] - time.time() > BATCH_WINDOW
+    assert cache.stats["expiring"] == 1
+    # The fresh upload is what later lookups get
+    assert asyncio.run(cache.get(path, service.upload, service.fetch, min_lifetime=BATCH_WINDOW)) == batch
+    assert service.uploads == 2
@@ -0,0 +1,43 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+# All rights reserved.
+#
+# This source code is licensed under the license found in the
+# LICENSE file in the root directory of this source tree.
+
+from types import SimpleNamespace
+
+from lmms_eval.tasks.mvp.utils import mvp_ll_hoi_pair_accuracy, mvp_ll_process_results, mvp_single_accuracy
+
+
+def doc(video_id, answer):
+    return {
+        "video_id": video_id,
+        "video_path": f"pt/{video_id}.mp4",
+        "source": "pt",
+        "candidates": "['yes', 'no']",
+        "answer": answer,
+    }
+
+
+def scored(video_id, answer, ll_a, ll_b):
+    # One (loglikelihood, is_greedy) per choice, A then B
+    return mvp_ll_process_results(doc(video_id, answer), [(ll_a, False), (ll_b, True)])
+
+
+def test_the_likelier_option_is_the_prediction():
+    processed = scored("p0_0", "no", -3.0, -0.5)
+    assert processed["pair_accuracy"]["prediction_idx"] == "1"
+    assert processed["pair_accuracy"]["rating"] == 1
+    assert scored("p0_0", "yes", -3.0, -0.5)["single_accuracy"]["rating"] == 0
+
+
+def test_pair_aggregation(tmp_path):
+    processed = [
+        scored("p0_0", "yes", -0.1, -2.0),
+        scored("p0_1", "no", -2.0, -0.1),
+        scored("p1_0", "yes", -0.1, -2.0),
+        scored("p1_1", "no", -0.1, -2.0),
+    ]
+    args = SimpleNamespace(output_path=str(tmp_path))
+    assert mvp_ll_hoi_pair_accuracy([p["pair_accuracy"] for p in processed], args) == 50
+    assert mvp_single_accuracy([p["single_accuracy"] for p in processed], args) == 75
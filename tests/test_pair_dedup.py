@@ -0,0 +1,65 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+# All rights reserved.
+#
+# This source code is licensed under the license found in the
+# LICENSE file in the root directory of this source tree.
+
+import numpy as np
+
+from lmms_eval.tasks.mvp import frame_shards
+from lmms_eval.tasks.mvp.frame_shards import FrameShards, pack_shards
+from lmms_eval.tasks.mvp.pair_dedup import dedupe_pair_frames, shared_positions
+
+
+def clip(seed=0):
+    return np.random.default_rng(seed).integers(0, 256, (4, 224, 224, 3), dtype=np.uint8)
+
+
+def reencoded(frames, seed=1):
+    # Compression-like noise of one level
+    noise = np.random.default_rng(seed).integers(-1, 2, frames.shape)
+    return np.clip(frames.astype(np.int16) + noise, 0, 255).astype(np.uint8)
+
+
+def test_reencoded_frames_are_shared():
+    first = clip()
+    unique, index = dedupe_pair_frames({"a": first, "b": reencoded(first)})
+    assert len(unique) == 4
+    assert index["b"].tolist() == [0, 1, 2, 3]
+
+
+def test_small_local_difference_is_kept():
+    first = clip()
+    second = reencoded(first)
+    # A 20x20 object only in the last two frames of the second video
+    second[2:, 100:120, 50:70] = 255
+    assert shared_positions(first, second).tolist() == [True, True, False, False]
+    unique, index = dedupe_pair_frames({"a": first, "b": second})
+    assert index["b"].tolist() == [0, 1, 4, 5]
+    np.testing.assert_array_equal(unique[index["b"]][2:], second[2:])
+
+
+def test_faint_small_object_is_kept():
+    first = np.full((1, 224, 224, 3), 128, dtype=np.uint8)
+    second = first.copy()
+    second[0, 30:36, 30:36] += 24
+    assert not shared_positions(first, second)[0]
+
+
+def test_different_lengths_do_not_match():
+    first = clip()
+    assert not shared_positions(first, first[:3]).any()
+
+
+def test_packed_pair_rebuilds_each_video(tmp_path, monkeypatch):
+    first = clip()
+    second = reencoded(first)
+    second[3, :20, :20] = 255
+    monkeypatch.setattr(frame_shards, "load_video_frames", lambda path, *_: {"/v/a": first, "/v/b": second}[path])
+    videos = [{"video_path": "a", "video_id": "p0_0"}, {"video_path": "b", "video_id": "p0_1"}]
+    index = pack_shards(videos, "/v", str(tmp_path), num_frames=4, dedupe=True)
+    assert index["dedupe"]["frames"] == 8 and index["dedupe"]["stored"] == 5
+    shards = FrameShards(str(tmp_path))
+    np.testing.assert_array_equal(shards.get("a"), first)
+    np.testing.assert_array_equal(shards.get("b")[3], second[3])
+    np.testing.assert_array_equal(shards.get("b")[:3], first[:3])
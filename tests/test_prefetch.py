@@ -0,0 +1,47 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+# All rights reserved.
+#
+# This source code is licensed under the license found in the
+# LICENSE file in the root directory of this source tree.
+
+from lmms_eval.tasks.mvp.prefetch import PREFETCH_COLUMN, VisualPrefetcher
+
+
+def make_prefetcher(**kwargs):
+    loaded = []
+
+    def load(path):
+        loaded.append(path)
+        return path
+
+    prefetcher = VisualPrefetcher(load, num_workers=1, log_every=0, **kwargs)
+    return prefetcher, loaded
+
+
+def test_lookahead_stays_within_the_task():
+    prefetcher, loaded = make_prefetcher(depth=4)
+    first = prefetcher.register(["a0", "a1", "a2"])
+    second = prefetcher.register(["b0", "b1"])
+    assert first == [0, 1, 2] and second == [3, 4]
+    assert prefetcher.get({PREFETCH_COLUMN: 1}, "a1") == "a1"
+    assert sorted(prefetcher.pending) == [2]
+    assert prefetcher.get({PREFETCH_COLUMN: 2}, "a2") == "a2"
+    assert prefetcher.stats["hits"] == 1 and prefetcher.stats["misses"] == 1
+    assert not prefetcher.pending
+    prefetcher.shutdown()
+
+
+def test_lookahead_follows_the_rank_stride():
+    prefetcher, _ = make_prefetcher(depth=2, rank=1, world_size=2)
+    prefetcher.register([f"v{i}" for i in range(8)])
+    prefetcher.get({PREFETCH_COLUMN: 1}, "v1")
+    assert list(prefetcher.pending) == [3, 5]
+    prefetcher.shutdown()
+
+
+def test_docs_without_a_position_decode_inline():
+    prefetcher, loaded = make_prefetcher(depth=2)
+    prefetcher.register(["a0", "a1"])
+    assert prefetcher.get({}, "a0") == "a0"
+    assert loaded == ["a0"] and not prefetcher.pending
+    prefetcher.shutdown()
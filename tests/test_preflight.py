@@ -0,0 +1,43 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+# All rights reserved.
+#
+# This source code is licensed under the license found in the
+# LICENSE file in the root directory of this source tree.
+
+import pytest
+
+from lmms_eval.tasks.mvp import utils, video_index
+from lmms_eval.tasks.mvp.video_index import VideoIndex
+
+
+class Shards:
+    shard_dir = "/shards"
+
+    def __init__(self, video_paths):
+        self.video_paths = set(video_paths)
+
+    def __contains__(self, video_path):
+        return video_path in self.video_paths
+
+
+@pytest.fixture
+def video_root(tmp_path, monkeypatch):
+    (tmp_path / "pt").mkdir()
+    (tmp_path / "pt" / "a.mp4").write_bytes(b"video")
+    monkeypatch.setattr(video_index, "_video_index", VideoIndex(str(tmp_path)))
+    monkeypatch.setattr(utils, "get_frame_shards", lambda: None)
+    return tmp_path
+
+
+def test_missing_videos_fail_at_load(video_root):
+    utils.mvp_preflight(["pt/a.mp4"])
+    with pytest.raises(FileNotFoundError, match="1 videos"):
+        utils.mvp_preflight(["pt/a.mp4", "pt/b.mp4"])
+
+
+def test_shards_replace_the_video_folder(video_root, monkeypatch):
+    # Neither video has to be on disk when both are packed
+    monkeypatch.setattr(utils, "get_frame_shards", lambda: Shards(["pt/b.mp4", "pt/c.mp4"]))
+    utils.mvp_preflight(["pt/b.mp4", "pt/c.mp4"])
+    with pytest.raises(FileNotFoundError, match="not packed"):
+        utils.mvp_preflight(["pt/a.mp4", "pt/b.mp4"])
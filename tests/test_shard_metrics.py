@@ -0,0 +1,48 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+# All rights reserved.
+#
+# This source code is licensed under the license found in the
+# LICENSE file in the root directory of this source tree.
+
+import pytest
+
+from lmms_eval.tasks.mvp.shard_metrics import finalize, merge, reduce_shard
+
+
+@pytest.fixture
+def results(result):
+    return [
+        result("a_0", True),
+        result("a_1", True),
+        result("b_0", True),
+        result("b_1", False),
+        result("c_0", False),
+        result("c_1", False, skipped=True),
+        result("d_0", True),
+        result("d_1", True),
+    ]
+
+
+def test_single_shard(results):
+    single_accuracy, pair_accuracy = finalize(merge([reduce_shard(results)]))
+    assert single_accuracy == pytest.approx(100 * 5 / 7)
+    assert pair_accuracy == 50
+
+
+def test_merge_matches_pairs_split_across_shards(results):
+    # Every pair split over the two shards
+    partials = [reduce_shard(results[0::2]), reduce_shard(results[1::2])]
+    assert len(partials[0]["half_pairs"]) == 4
+    merged = merge(partials)
+    assert merged["half_pairs"] == {}
+    assert finalize(merged) == finalize(merge([reduce_shard(results)]))
+
+
+def test_finalize_rejects_unmatched_half_pairs(results):
+    with pytest.raises(ValueError, match="only have one result"):
+        finalize(merge([reduce_shard(results[:3])]))
+
+
+def test_reduce_shard_rejects_pairs_with_more_than_two_results(results, result):
+    with pytest.raises(ValueError):
+        reduce_shard(results + [result("a_2", True)])
@@ -0,0 +1,55 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+# All rights reserved.
+#
+# This source code is licensed under the license found in the
+# LICENSE file in the root directory of this source tree.
+
+import numpy as np
+import pytest
+
+from lmms_eval.tasks.mvp.stats import bootstrap, overall, summarize
+from lmms_eval.tasks.mvp.utils import compute_metrics
+
+
+@pytest.fixture
+def results(result):
+    # pair0 both right, pair1 one right, pair2 first wrong and second skipped
+    return [
+        result("pair0_0", True),
+        result("pair0_1", True),
+        result("pair1_0", True),
+        result("pair1_1", False, source="pt"),
+        result("pair2_0", False, source="ssv2"),
+        result("pair2_1", False, skipped=True, source="ssv2"),
+    ]
+
+
+def test_bootstrap_point_estimates_and_ci():
+    correct = np.array([2] * 60 + [1] * 30 + [0] * 10)
+    stats = bootstrap(correct, num_resamples=2000)
+    assert stats["num_pairs"] == 100
+    assert stats["pair_accuracy"] == 60
+    assert stats["single_accuracy"] == 75
+    lo, hi = stats["pair_accuracy_ci"]
+    assert lo < 60 < hi
+    assert 2 < stats["pair_accuracy_stderr"] < 8
+
+
+def test_bootstrap_is_seeded():
+    correct = np.array([2, 1, 0, 2, 2, 1])
+    assert bootstrap(correct, seed=3) == bootstrap(correct, seed=3)
+
+
+def test_bootstrap_matches_compute_metrics_with_skipped_docs(results):
+    single_accuracy, pair_accuracy = compute_metrics(results)
+    stats = overall(results)
+    # The skipped doc is left out of single accuracy, as in compute_metrics
+    assert stats["single_accuracy"] == single_accuracy == 60
+    assert np.isclose(stats["pair_accuracy"], pair_accuracy)
+    summary = summarize(results)
+    assert set(summary) == {"all", "pt", "ssv2"}
+    assert summary["ssv2"]["single_accuracy"] == 0
+
+
+def test_bootstrap_empty():
+    assert bootstrap(np.array([], dtype=np.int64)) == {}